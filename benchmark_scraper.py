@@ -0,0 +1,187 @@
+"""
+Benchmark del scraper del paso 2 contra la réplica local de SUNARP.
+
+Levanta sunarp_replay_server.py en segundo plano (o usa --base-url), consulta
+un número fijo de placas con scrape_plates en modo desatendido y reporta
+placas por minuto y la latencia por etapa, para medir cambios del scraper
+sin acceder al sitio real.
+
+Uso:
+    python benchmark_scraper.py --plates 30 --latency 1.5 --error-rate 0.05
+    python benchmark_scraper.py --profile default --reload-page --json base.json
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import step2_scrape_sunarp as step2
+from sunarp_replay_server import ReplayConfig, start_server
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano (values ordenados)"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def benchmark_plates(count, recordings_folder):
+    """
+    Arma la lista de placas del benchmark: primero las grabadas y luego sintéticas
+
+    Args:
+        count: Número de placas
+        recordings_folder: Carpeta con los *_resultado.png grabados
+
+    Returns:
+        Lista de registros con el formato de plates_data.json
+    """
+    recorded = []
+    if os.path.isdir(recordings_folder):
+        recorded = sorted(
+            name[:-len('_resultado.png')] for name in os.listdir(recordings_folder)
+            if name.lower().endswith('_resultado.png')
+        )
+    plates = recorded[:count]
+    plates += [f"BEN{i:03d}" for i in range(count - len(plates))]
+    return [{'PLACA': plate, 'RUC': 'N/A', 'MARCA': 'N/A', 'ANIO_FAB': 'N/A'} for plate in plates]
+
+def run_benchmark(args):
+    """
+    Ejecuta el benchmark
+
+    Args:
+        args: Argumentos retornados por parse_args
+
+    Returns:
+        Tupla (diccionario con los resultados, ScrapeTimings)
+    """
+    server = None
+    config = None
+    base_url = args.base_url
+    if not base_url:
+        config = ReplayConfig(args.recordings, args.latency, args.jitter, args.page_latency,
+                              args.error_rate, seed=args.seed)
+        server, base_url = start_server(config)
+        print(f"✓ Réplica local en {base_url} ({len(config.recordings)} imágenes grabadas)")
+
+    step2.INTERACTIVE = False
+    step2.SUNARP_BASE_URL = base_url
+    step2.REUSE_PAGE = not args.reload_page
+    step2.RESULT_IMAGE_MODE = args.result_image
+
+    plates_data = benchmark_plates(args.plates, args.recordings)
+    output_folder = args.output_folder or tempfile.mkdtemp(prefix='benchmark_scraper_')
+    timings = step2.ScrapeTimings()
+    # scrape_plate también retorna True si no obtuvo la imagen; se cuentan
+    # las imágenes de resultado efectivamente guardadas
+    saved = []
+    rate_limiter = step2.RateLimiter(args.interval)
+
+    driver = None
+    try:
+        if args.browsers > 1:
+            start = time.perf_counter()
+            successful, failed = step2.scrape_plates_parallel(
+                plates_data, output_folder, args.browsers, on_result=saved.append,
+                rate_limiter=rate_limiter, timings=timings, headless=True, profile=args.profile
+            )
+        else:
+            with timings.step('iniciar_navegador'):
+                driver = step2.setup_driver(headless=True, profile=args.profile)
+
+            start = time.perf_counter()
+            successful, failed = step2.scrape_plates(
+                driver, plates_data, output_folder,
+                on_result=saved.append, rate_limiter=rate_limiter, timings=timings
+            )
+        elapsed = time.perf_counter() - start
+    finally:
+        if driver is not None:
+            driver.quit()
+        if server is not None:
+            server.shutdown()
+        if not args.output_folder:
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+    latencies = sorted(timings.plates)
+    return {
+        'config': {
+            'plates': len(plates_data), 'browsers': args.browsers, 'profile': args.profile, 'reuse_page': not args.reload_page,
+            'result_image': args.result_image, 'interval': args.interval,
+            'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+            'base_url': args.base_url or 'local',
+        },
+        'successful': successful,
+        'failed': failed,
+        'results_saved': len(saved),
+        'elapsed_seconds': elapsed,
+        'plates_per_minute': len(plates_data) * 60 / elapsed if elapsed else 0.0,
+        'plate_latency': {
+            'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+            'p50': percentile(latencies, 0.5),
+            'p90': percentile(latencies, 0.9),
+            'max': latencies[-1] if latencies else 0.0,
+        },
+        'stages': {
+            stage: {'calls': calls, 'seconds': seconds, 'mean': seconds / calls}
+            for stage, (seconds, calls) in timings.stages.items()
+        },
+        'server': config.counts if config else None,
+    }, timings
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmark del scraper del paso 2 contra la réplica local de SUNARP")
+    parser.add_argument('--plates', type=int, default=20, help="Número de placas a consultar")
+    parser.add_argument('--recordings', default='output_images',
+                        help="Carpeta con los *_resultado.png que sirve la réplica")
+    parser.add_argument('--base-url', default=None,
+                        help="Usar una réplica ya iniciada en lugar de levantar una local")
+    parser.add_argument('--latency', type=float, default=1.0, help="Segundos promedio por consulta")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Variación (±) de la latencia en segundos")
+    parser.add_argument('--page-latency', type=float, default=0.0, help="Segundos para servir la página")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de consultas que fallan")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla aleatoria de la réplica")
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help="Segundos mínimos entre consultas (0: sin límite de cortesía)")
+    parser.add_argument('--browsers', type=int, default=1, help="Navegadores en paralelo")
+    parser.add_argument('--profile', choices=step2.SCRAPE_PROFILES, default='light',
+                        help="Perfil del navegador")
+    parser.add_argument('--reload-page', action='store_true',
+                        help="Recargar la página en cada placa")
+    parser.add_argument('--result-image', choices=step2.RESULT_IMAGE_MODES, default=step2.RESULT_IMAGE_MODE,
+                        help="Cómo guardar la imagen de resultado")
+    parser.add_argument('--output-folder', default=None,
+                        help="Carpeta donde guardar las imágenes (por defecto, temporal y se borra)")
+    parser.add_argument('--json', default=None, help="Guardar los resultados en un archivo JSON")
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    results, timings = run_benchmark(args)
+
+    print("\n" + "="*60)
+    print("BENCHMARK DEL SCRAPER")
+    print("="*60)
+    print(f"Placas: {results['config']['plates']} (✓ {results['successful']}, ❌ {results['failed']}, "
+          f"imágenes de resultado: {results['results_saved']})")
+    print(f"Tiempo total: {results['elapsed_seconds']:.1f} s")
+    print(f"🚀 Placas por minuto: {results['plates_per_minute']:.1f}")
+    latency = results['plate_latency']
+    print(f"Latencia por placa: media {latency['mean']:.2f} s, p50 {latency['p50']:.2f} s, "
+          f"p90 {latency['p90']:.2f} s, máxima {latency['max']:.2f} s")
+    timings.report()
+    if results['server']:
+        counts = results['server']
+        print(f"\nRéplica: {counts['pages']} páginas, {counts['queries']} consultas, "
+              f"{counts['errors']} errores simulados")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main()
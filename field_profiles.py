@@ -0,0 +1,204 @@
+"""
+Perfiles de reconocimiento por campo para el modo plantilla del paso 3.
+
+Cada campo de la imagen de SUNARP tiene un formato conocido (placa peruana,
+VIN, año, números de serie/motor en mayúsculas y dígitos). Para cada perfil:
+- allowlist: caracteres que el reconocedor de EasyOCR puede emitir en la
+  región (los demás se descartan al decodificar). Incluye los caracteres de
+  la etiqueta, porque la región de la plantilla contiene la etiqueta.
+- normalize: corrige las confusiones típicas del OCR (O/0, I/1, S/5, ...)
+  según la posición, y valida el formato.
+"""
+import re
+import datetime
+from layout_template import FIELD_DISPLAY_LABELS
+
+# Versión de los perfiles; cambiarla invalida la caché del modo plantilla
+PROFILES_VERSION = 2
+
+DIGITS = '0123456789'
+UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Letras del español fuera de A-Z (marcas, modelos y sedes como CAÑETE o HUÁNUCO)
+UPPER_ES = 'ÑÁÉÍÓÚÜ'
+
+# Confusiones típicas del OCR cuando la posición solo admite dígitos o letras
+TO_DIGIT = {'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'B': '8', 'G': '6'}
+TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '5': 'S', '8': 'B', '6': 'G'}
+
+# Placa peruana: una letra, dos letras o dígitos y tres dígitos (ABC123, A0B975, AB1234)
+PLATE_REGEX = re.compile(r'[A-Z][A-Z0-9]{2}\d{3}')
+
+# VIN (ISO 3779): 17 caracteres, sin I, O ni Q
+VIN_LENGTH = 17
+VIN_CHARS = ''.join(c for c in UPPER + DIGITS if c not in 'IOQ')
+VIN_TRANSLITERATION = {
+    **{str(d): d for d in range(10)},
+    'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8,
+    'J': 1, 'K': 2, 'L': 3, 'M': 4, 'N': 5, 'P': 7, 'R': 9,
+    'S': 2, 'T': 3, 'U': 4, 'V': 5, 'W': 6, 'X': 7, 'Y': 8, 'Z': 9,
+}
+VIN_WEIGHTS = [8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2]
+# Confusiones entre caracteres válidos de un VIN
+VIN_CONFUSIONS = {'S': '5', '5': 'S', 'B': '8', '8': 'B', 'Z': '2', '2': 'Z', 'G': '6', '6': 'G'}
+
+def _compact(value):
+    """Quita espacios y guiones"""
+    return re.sub(r'[\s\-]+', '', value)
+
+def normalize_plate(value):
+    """
+    Normaliza una placa al formato peruano (ABC123)
+
+    Args:
+        value: Texto reconocido
+
+    Returns:
+        Tupla (valor, válido)
+    """
+    compact = _compact(value)
+    if compact == 'NINGUNA':
+        return compact, True
+    if len(compact) != 6:
+        return value, False
+
+    chars = list(compact)
+    chars[0] = TO_LETTER.get(chars[0], chars[0])
+    for i in range(3, 6):
+        chars[i] = TO_DIGIT.get(chars[i], chars[i])
+    plate = ''.join(chars)
+
+    if PLATE_REGEX.fullmatch(plate):
+        return plate, True
+    return value, False
+
+def vin_check_digit_ok(vin):
+    """Verifica el dígito de control (posición 9) de un VIN"""
+    total = sum(VIN_TRANSLITERATION[c] * w for c, w in zip(vin, VIN_WEIGHTS))
+    check = total % 11
+    return vin[8] == ('X' if check == 10 else str(check))
+
+def normalize_vin(value):
+    """
+    Normaliza un VIN: 17 caracteres sin I, O ni Q
+
+    El dígito de control solo es obligatorio en los VIN norteamericanos
+    (primer carácter 1-5); en esos, si no cuadra, se prueba una sola
+    sustitución entre caracteres confundibles y se acepta si hay exactamente
+    una que lo corrige.
+
+    Args:
+        value: Texto reconocido
+
+    Returns:
+        Tupla (valor, válido)
+    """
+    vin = _compact(value).replace('I', '1').replace('O', '0').replace('Q', '0')
+    if len(vin) != VIN_LENGTH or any(c not in VIN_CHARS for c in vin):
+        return value, False
+
+    if vin[0] in '12345' and not vin_check_digit_ok(vin):
+        candidates = [
+            vin[:i] + VIN_CONFUSIONS[c] + vin[i + 1:]
+            for i, c in enumerate(vin) if c in VIN_CONFUSIONS
+        ]
+        candidates = [candidate for candidate in candidates if vin_check_digit_ok(candidate)]
+        if len(candidates) == 1:
+            vin = candidates[0]
+
+    return vin, True
+
+def normalize_year(value):
+    """
+    Normaliza un año de modelo (cuatro dígitos entre 1900 y el año siguiente)
+
+    Args:
+        value: Texto reconocido
+
+    Returns:
+        Tupla (valor, válido)
+    """
+    compact = ''.join(TO_DIGIT.get(c, c) for c in _compact(value))
+    if len(compact) == 4 and compact.isdigit() and 1900 <= int(compact) <= datetime.date.today().year + 1:
+        return compact, True
+    return value, False
+
+def normalize_alnum(value):
+    """
+    Normaliza un número de serie o de motor (mayúsculas y dígitos, sin espacios)
+
+    Args:
+        value: Texto reconocido
+
+    Returns:
+        Tupla (valor, válido)
+    """
+    compact = re.sub(r'[^A-Z0-9]', '', value)
+    if len(compact) >= 5:
+        return compact, True
+    return value, False
+
+def normalize_text(value):
+    """Texto libre en mayúsculas (color, marca, estado, ...): solo se valida que no esté vacío, se conservan Ñ y tildes"""
+    return value, bool(value)
+
+# Perfiles: caracteres del valor y normalizador
+PROFILES = {
+    'plate': {'charset': UPPER + DIGITS + '-', 'normalize': normalize_plate},
+    'vin': {'charset': UPPER + DIGITS, 'normalize': normalize_vin},
+    'alnum': {'charset': UPPER + DIGITS + '-', 'normalize': normalize_alnum},
+    'year': {'charset': DIGITS, 'normalize': normalize_year},
+    'text': {'charset': UPPER + UPPER_ES + DIGITS + ' -./&', 'normalize': normalize_text},
+}
+
+FIELD_PROFILES = {
+    'placa': 'plate',
+    'placa_vigente': 'plate',
+    'placa_anterior': 'plate',
+    'n_vin': 'vin',
+    'n_serie': 'alnum',
+    'n_motor': 'alnum',
+    'año_modelo': 'year',
+    'color': 'text',
+    'marca': 'text',
+    'modelo': 'text',
+    'estado': 'text',
+    'anotaciones': 'text',
+    'sede': 'text',
+}
+
+def profile_allowlist(profile):
+    """
+    Caracteres permitidos al reconocer los campos de un perfil
+
+    Incluye los caracteres del valor y los de las etiquetas de los campos del
+    perfil (la región de la plantilla contiene la etiqueta).
+
+    Args:
+        profile: Nombre del perfil
+
+    Returns:
+        Cadena con los caracteres permitidos
+    """
+    chars = set(PROFILES[profile]['charset']) | set(' :')
+    for field, field_profile in FIELD_PROFILES.items():
+        if field_profile == profile:
+            chars |= set(FIELD_DISPLAY_LABELS[field])
+    return ''.join(sorted(chars))
+
+def normalize_field(field, value):
+    """
+    Aplica el perfil del campo al valor ya limpio (sin etiqueta)
+
+    Si el valor no cumple el formato del perfil se retorna sin cambios.
+
+    Args:
+        field: Nombre del campo
+        value: Valor limpio (layout_template.clean_value)
+
+    Returns:
+        Tupla (valor, válido)
+    """
+    profile = FIELD_PROFILES.get(field)
+    if profile is None or not value:
+        return value, bool(value)
+    return PROFILES[profile]['normalize'](value)
@@ -0,0 +1,119 @@
+"""
+Estado persistente de un trabajo por lotes (run_all.py --batch).
+
+Registra, por placa, el estado de cada etapa del flujo:
+- extracted: la placa está en plates_data.json (paso 1)
+- scraped: se guardó el *_resultado.png de SUNARP (paso 2)
+- ocr: se extrajo texto de la imagen (paso 3)
+- parsed: el registro estructurado está en las salidas (paso 3)
+
+El archivo es JSON Lines de solo agregado (la última entrada de cada placa y
+etapa gana), así que una caída a mitad de escritura pierde como máximo una
+línea y al reiniciar se retoma exactamente donde se quedó.
+"""
+import os
+import json
+import time
+
+STAGES = ['extracted', 'scraped', 'ocr', 'parsed']
+
+class JobState:
+    """
+    Estado por placa y etapa de un trabajo por lotes
+
+    Args:
+        state_file: Archivo JSON Lines del estado
+    """
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.plates = {}
+        self._file = None
+        self._load()
+
+    def _load(self):
+        """Carga el estado existente (las líneas truncadas se omiten)"""
+        if not os.path.exists(self.state_file):
+            return
+
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.plates.setdefault(entry['plate'], {})[entry['stage']] = entry
+
+    def mark(self, plate, stage, status, **info):
+        """
+        Registra el estado de una etapa para una placa
+
+        Args:
+            plate: Número de placa
+            stage: Etapa (ver STAGES)
+            status: Estado ('ok', 'error', 'empty', ...)
+            **info: Datos adicionales (por ejemplo, el intento o el mensaje de error)
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Etapa desconocida: {stage}")
+
+        previous = self.plates.get(plate, {}).get(stage)
+        entry = {
+            'plate': plate,
+            'stage': stage,
+            'status': status,
+            'attempts': (previous['attempts'] if previous else 0) + 1,
+            'time': time.time(),
+            **info,
+        }
+        self.plates.setdefault(plate, {})[stage] = entry
+
+        if self._file is None:
+            self._file = open(self.state_file, 'a', encoding='utf-8', buffering=1)
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def entry(self, plate, stage):
+        """Retorna la última entrada de una etapa para una placa (None si no se ejecutó)"""
+        return self.plates.get(plate, {}).get(stage)
+
+    def status(self, plate, stage):
+        """Retorna el estado de una etapa para una placa (None si no se ejecutó)"""
+        entry = self.plates.get(plate, {}).get(stage)
+        return entry['status'] if entry else None
+
+    def attempts(self, plate, stage):
+        """Retorna cuántas veces se ejecutó una etapa para una placa"""
+        entry = self.plates.get(plate, {}).get(stage)
+        return entry['attempts'] if entry else 0
+
+    def is_done(self, plate, stage):
+        """Indica si la etapa terminó con éxito para la placa"""
+        return self.status(plate, stage) == 'ok'
+
+    def summary(self):
+        """
+        Cuenta las placas por etapa y estado
+
+        Returns:
+            Diccionario {etapa: {estado: cantidad}}
+        """
+        counts = {stage: {} for stage in STAGES}
+        for stages in self.plates.values():
+            for stage, entry in stages.items():
+                counts[stage][entry['status']] = counts[stage].get(entry['status'], 0) + 1
+        return counts
+
+    def close(self):
+        """Cierra el archivo de estado"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,231 @@
+"""
+Plantilla de diseño para la imagen de resultado de SUNARP.
+
+La imagen `div.container-data-vehiculo img` siempre tiene el mismo diseño, así
+que las regiones de cada valor (placa, serie, VIN, motor, ...) se calibran una
+sola vez a partir de una imagen de referencia. Luego, en cada imagen, solo esas
+regiones pasan por el reconocedor de EasyOCR, sin ejecutar el detector ni
+reconstruir los campos con expresiones regulares.
+
+Las coordenadas se guardan sobre la imagen ya recortada (crop_image) y se
+escalan si una imagen tiene un tamaño ligeramente distinto.
+"""
+import re
+import json
+
+LAYOUT_VERSION = 1
+
+# Etiquetas de cada campo en la imagen, en orden de prioridad (las más
+# específicas primero: "PLACA VIGENTE" antes que "PLACA", "AÑO DE MODELO"
+# antes que "MODELO")
+FIELD_LABELS = [
+    ('placa_vigente', r'PLACA\s+VIGENTE'),
+    ('placa_anterior', r'PLACA\s+ANTERIOR'),
+    ('año_modelo', r'A[ÑN]O\s+(?:DE\s+)?MODELO'),
+    ('placa', r'N?[°º]?\s*PLACA'),
+    ('n_serie', r'N?[°º]?\s*SERIE'),
+    ('n_vin', r'N?[°º]?\s*VIN'),
+    ('n_motor', r'N?[°º]?\s*MOTOR'),
+    ('color', r'COLOR'),
+    ('marca', r'MARCA'),
+    ('modelo', r'MODELO'),
+    ('estado', r'ESTADO'),
+    ('anotaciones', r'ANOTACIONES'),
+    ('sede', r'SEDE'),
+    ('propietarios', r'PROPIETARIO\s*(?:\(\s*S\s*\)|S)?'),
+]
+
+# Campos cuyo valor puede ocupar varias líneas
+MULTILINE_FIELDS = {'propietarios'}
+
+# Texto de la etiqueta tal como se escribe en raw_text
+FIELD_DISPLAY_LABELS = {
+    'placa': 'N° PLACA',
+    'n_serie': 'N° SERIE',
+    'n_vin': 'N° VIN',
+    'n_motor': 'N° MOTOR',
+    'color': 'COLOR',
+    'marca': 'MARCA',
+    'modelo': 'MODELO',
+    'placa_vigente': 'PLACA VIGENTE',
+    'placa_anterior': 'PLACA ANTERIOR',
+    'estado': 'ESTADO',
+    'anotaciones': 'ANOTACIONES',
+    'sede': 'SEDE',
+    'año_modelo': 'AÑO DE MODELO',
+    'propietarios': 'PROPIETARIO(S)',
+}
+
+_LABEL_REGEXES = [
+    (field, re.compile(r'^\s*(' + label + r')\s*[:;.]?\s*(.*)$', re.DOTALL))
+    for field, label in FIELD_LABELS
+]
+
+def match_label(text):
+    """
+    Identifica la etiqueta de campo al inicio del texto
+
+    Args:
+        text: Texto de una caja de OCR
+
+    Returns:
+        Tupla (campo, valor_restante) o (None, None) si no es una etiqueta
+    """
+    text_upper = text.upper()
+    for field, regex in _LABEL_REGEXES:
+        match = regex.match(text_upper)
+        if match:
+            return field, match.group(2).strip()
+    return None, None
+
+def calibrate(ocr_results, width, height):
+    """
+    Calcula las regiones de cada valor a partir del OCR de una imagen de referencia
+
+    Args:
+        ocr_results: Resultado de reader.readtext(detail=1): lista de (caja, texto, confianza)
+        width: Ancho de la imagen de referencia (recortada)
+        height: Alto de la imagen de referencia (recortada)
+
+    Returns:
+        Diccionario de la plantilla (ver save_layout)
+    """
+    labels = []
+    for box, text, _confidence in ocr_results:
+        field, _value = match_label(text)
+        if field is None or any(field == found for found, _ in labels):
+            continue
+        xs = [point[0] for point in box]
+        ys = [point[1] for point in box]
+        labels.append((field, (int(min(xs)), int(max(xs)), int(min(ys)), int(max(ys)))))
+
+    fields = {}
+    for field, (x_min, x_max, y_min, y_max) in labels:
+        line_height = y_max - y_min
+        pad = max(2, int(line_height * 0.25))
+
+        # El valor termina donde empieza la siguiente etiqueta de la misma línea
+        right = width
+        for other, (ox_min, _ox_max, oy_min, oy_max) in labels:
+            same_line = oy_min < y_max and oy_max > y_min
+            if other != field and same_line and ox_min > x_max:
+                right = min(right, ox_min - pad)
+
+        # La región incluye la etiqueta; el texto de la etiqueta se quita al
+        # limpiar el valor. Así funciona tanto si EasyOCR separó etiqueta y
+        # valor en dos cajas como si los unió en una.
+        fields[field] = {
+            'box': [
+                max(0, x_min - pad), right,
+                max(0, y_min - pad),
+                height if field in MULTILINE_FIELDS else min(height, y_max + pad)
+            ],
+            'multiline': field in MULTILINE_FIELDS,
+        }
+
+    return {
+        'version': LAYOUT_VERSION,
+        'width': width,
+        'height': height,
+        'fields': fields,
+    }
+
+def save_layout(layout, layout_file):
+    """
+    Guarda la plantilla en un archivo JSON
+
+    Args:
+        layout: Diccionario de la plantilla
+        layout_file: Ruta del archivo JSON
+    """
+    with open(layout_file, 'w', encoding='utf-8') as f:
+        json.dump(layout, f, ensure_ascii=False, indent=2)
+
+def load_layout(layout_file):
+    """
+    Carga una plantilla desde un archivo JSON
+
+    Args:
+        layout_file: Ruta del archivo JSON
+
+    Returns:
+        Diccionario de la plantilla
+    """
+    with open(layout_file, 'r', encoding='utf-8') as f:
+        layout = json.load(f)
+
+    if layout.get('version') != LAYOUT_VERSION:
+        raise ValueError(f"Versión de plantilla no soportada en {layout_file}: {layout.get('version')}")
+
+    return layout
+
+def scaled_regions(layout, width, height):
+    """
+    Escala las regiones de la plantilla al tamaño de una imagen
+
+    Args:
+        layout: Diccionario de la plantilla
+        width: Ancho de la imagen (recortada)
+        height: Alto de la imagen (recortada)
+
+    Returns:
+        Diccionario {campo: (x_min, x_max, y_min, y_max, multiline)}
+    """
+    sx = width / layout['width']
+    sy = height / layout['height']
+    regions = {}
+    for field, spec in layout['fields'].items():
+        x_min, x_max, y_min, y_max = spec['box']
+        regions[field] = (
+            max(0, int(x_min * sx)), min(width, int(x_max * sx)),
+            max(0, int(y_min * sy)), min(height, int(y_max * sy)),
+            spec.get('multiline', False),
+        )
+    return regions
+
+def clean_value(field, text):
+    """
+    Limpia el texto reconocido en la región de un campo
+
+    Args:
+        field: Nombre del campo
+        text: Texto reconocido (puede incluir la etiqueta)
+
+    Returns:
+        Valor del campo
+    """
+    value = text.upper().strip()
+    matched, rest = match_label(value)
+    if matched == field:
+        value = rest
+    value = value.lstrip(':;. ')
+    return re.sub(r'\s+', ' ', value).strip()
+
+def build_record(values, plate_number):
+    """
+    Arma el registro con las mismas claves que parse_vehicle_data
+
+    raw_text se reconstruye como "ETIQUETA: VALOR" por línea para que el
+    registro pueda volver a parsearse con parse_vehicle_data.
+
+    Args:
+        values: Diccionario {campo: valor}
+        plate_number: Número de placa (nombre del archivo)
+
+    Returns:
+        Diccionario con información estructurada
+    """
+    data = {field: '' for field in FIELD_DISPLAY_LABELS}
+    data['placa'] = plate_number
+    data.update({field: value for field, value in values.items() if value})
+
+    data['raw_text'] = '\n'.join(
+        f"{FIELD_DISPLAY_LABELS[field]}: {values[field]}"
+        for field in FIELD_DISPLAY_LABELS if values.get(field)
+    )
+
+    # Mismo orden de claves que parse_vehicle_data
+    ordered = ['placa', 'n_serie', 'n_vin', 'n_motor', 'color', 'marca', 'modelo',
+               'placa_vigente', 'placa_anterior', 'estado', 'anotaciones', 'sede',
+               'año_modelo', 'propietarios', 'raw_text']
+    return {key: data[key] for key in ordered}
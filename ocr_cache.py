@@ -0,0 +1,199 @@
+"""
+Caché persistente de resultados OCR (SQLite).
+
+Las entradas se indexan por el hash SHA-256 de los bytes de la imagen, la
+variante de preprocesamiento y un hash de los parámetros de reader.readtext.
+Así, una imagen que no cambió no vuelve a pasar por EasyOCR.
+
+Para no volver a hashear miles de imágenes en cada ejecución, también se
+guarda un índice (ruta, mtime, tamaño) -> hash.
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+# Conexión a la caché (se abre una sola vez por proceso)
+_connection = None
+_connection_path = None
+_connection_pid = None
+
+def params_hash(*params):
+    """
+    Calcula un hash estable de los parámetros de OCR
+
+    Args:
+        *params: Diccionarios/valores que afectan el resultado del OCR
+
+    Returns:
+        Hash hexadecimal (16 caracteres)
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def get_connection(cache_file):
+    """
+    Abre (o reutiliza) la conexión SQLite de la caché y crea las tablas
+
+    Args:
+        cache_file: Ruta al archivo SQLite
+
+    Returns:
+        Conexión sqlite3
+    """
+    global _connection, _connection_path, _connection_pid
+
+    # Una conexión heredada por fork no debe reutilizarse en el proceso hijo
+    if _connection is not None and _connection_path == cache_file and _connection_pid == os.getpid():
+        return _connection
+
+    conn = sqlite3.connect(cache_file, timeout=30, isolation_level=None)
+    # WAL permite que varios procesos worker lean y escriban a la vez
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_results (
+            image_hash TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            params_hash TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (image_hash, variant, params_hash)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_last_access ON ocr_results(last_access)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL,
+            image_hash TEXT NOT NULL
+        )
+    """)
+
+    _connection = conn
+    _connection_path = cache_file
+    _connection_pid = os.getpid()
+    return conn
+
+def image_hash(cache_file, image_path):
+    """
+    Retorna el SHA-256 de los bytes de la imagen, reutilizando el índice
+    (ruta, mtime, tamaño) si el archivo no cambió
+
+    Args:
+        cache_file: Ruta al archivo SQLite
+        image_path: Ruta a la imagen
+
+    Returns:
+        Hash hexadecimal de la imagen
+    """
+    conn = get_connection(cache_file)
+    stat = os.stat(image_path)
+    path = os.path.abspath(image_path)
+
+    row = conn.execute(
+        "SELECT mtime, size, image_hash FROM file_hashes WHERE path = ?", (path,)
+    ).fetchone()
+    if row and row[0] == stat.st_mtime and row[1] == stat.st_size:
+        return row[2]
+
+    with open(image_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    conn.execute(
+        "INSERT OR REPLACE INTO file_hashes (path, mtime, size, image_hash) VALUES (?, ?, ?, ?)",
+        (path, stat.st_mtime, stat.st_size, digest)
+    )
+    return digest
+
+def get_cached_text(cache_file, digest, variant, params_key):
+    """
+    Busca el texto OCR en la caché
+
+    Args:
+        cache_file: Ruta al archivo SQLite
+        digest: Hash de la imagen
+        variant: Variante de preprocesamiento
+        params_key: Hash de los parámetros de OCR
+
+    Returns:
+        Texto guardado, o None si no está en la caché
+    """
+    conn = get_connection(cache_file)
+    row = conn.execute(
+        "SELECT text FROM ocr_results WHERE image_hash = ? AND variant = ? AND params_hash = ?",
+        (digest, variant, params_key)
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    conn.execute(
+        "UPDATE ocr_results SET last_access = ? WHERE image_hash = ? AND variant = ? AND params_hash = ?",
+        (time.time(), digest, variant, params_key)
+    )
+    return row[0]
+
+def store_text(cache_file, digest, variant, params_key, text):
+    """
+    Guarda el texto OCR en la caché
+
+    Args:
+        cache_file: Ruta al archivo SQLite
+        digest: Hash de la imagen
+        variant: Variante de preprocesamiento
+        params_key: Hash de los parámetros de OCR
+        text: Texto extraído
+    """
+    conn = get_connection(cache_file)
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO ocr_results "
+        "(image_hash, variant, params_hash, text, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+        (digest, variant, params_key, text, now, now)
+    )
+
+def evict(cache_file, max_age_days=None, max_entries=None):
+    """
+    Elimina entradas antiguas de la caché por edad y/o por tamaño
+
+    Args:
+        cache_file: Ruta al archivo SQLite
+        max_age_days: Días sin acceso tras los cuales se elimina una entrada
+        max_entries: Número máximo de entradas (se eliminan las menos usadas)
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    if not os.path.exists(cache_file):
+        return 0
+
+    conn = get_connection(cache_file)
+    removed = 0
+
+    if max_age_days:
+        cutoff = time.time() - max_age_days * 86400
+        removed += conn.execute("DELETE FROM ocr_results WHERE last_access < ?", (cutoff,)).rowcount
+
+    if max_entries:
+        total = conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+        excess = total - max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM ocr_results WHERE rowid IN "
+                "(SELECT rowid FROM ocr_results ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            ).rowcount
+
+    # Limpiar el índice de archivos que ya no existen
+    stale = [
+        (path,) for (path,) in conn.execute("SELECT path FROM file_hashes")
+        if not os.path.exists(path)
+    ]
+    if stale:
+        conn.executemany("DELETE FROM file_hashes WHERE path = ?", stale)
+
+    return removed
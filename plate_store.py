@@ -0,0 +1,269 @@
+"""
+Almacén de placas indexado (SQLite) para pasar las placas entre los pasos.
+
+Reemplaza a plates_data.json cuando el archivo de placas termina en .db o
+.sqlite:
+- El paso 1 escribe las placas por bloques (sin cargarlas todas en memoria).
+- Los pasos 2 y 3 lo abren sin leerlo completo: recorren las placas por
+  páginas, con filtros por RUC o marca, y consultan una placa por su número.
+- El estado por placa y etapa del flujo (ver job_state.STAGES) se guarda en
+  la misma base, con la misma interfaz que JobState, así que "placas de un
+  RUC sin consultar" es una consulta por índice y no un recorrido completo.
+"""
+import time
+import sqlite3
+import threading
+from job_state import STAGES
+
+# Columnas de plates_data.json y su nombre en la tabla
+PLATE_FIELDS = {'PLACA': 'placa', 'TENENCIA': 'tenencia', 'MARCA': 'marca', 'RUC': 'ruc', 'ANIO_FAB': 'anio_fab'}
+
+# Registros por página al recorrer el almacén
+PAGE_SIZE = 1000
+
+# Placas por consulta en get_many (SQLite antiguo admite hasta 999 parámetros)
+LOOKUP_SIZE = 500
+
+def is_store_file(path):
+    """Indica si la ruta corresponde a un almacén de placas (y no a un JSON)"""
+    return path.endswith(('.db', '.sqlite', '.sqlite3'))
+
+class PlateStore:
+    """
+    Placas del dataset y su estado en el flujo, en una base SQLite
+
+    Args:
+        db_file: Ruta al archivo SQLite (se crea si no existe)
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        # Una sola conexión compartida por los hilos (con --browsers N, cada
+        # navegador registra sus placas): toda consulta pasa por el candado
+        self.conn = sqlite3.connect(db_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        # WAL: el OCR (otro proceso) puede leer mientras el scraper escribe
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS plates (
+                id INTEGER PRIMARY KEY,
+                placa TEXT NOT NULL UNIQUE,
+                tenencia TEXT,
+                marca TEXT,
+                ruc TEXT,
+                anio_fab
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_plates_ruc ON plates(ruc)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_plates_marca ON plates(marca)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS plate_status (
+                placa TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                time REAL NOT NULL,
+                info TEXT,
+                PRIMARY KEY (placa, stage)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_status_stage ON plate_status(stage, status)")
+
+    def add_plates(self, records):
+        """
+        Agrega registros con el formato de plates_data.json en una sola transacción
+
+        Las placas que ya existen se ignoran (se conserva la primera).
+
+        Args:
+            records: Iterable de diccionarios con PLACA, TENENCIA, MARCA, RUC, ANIO_FAB
+
+        Returns:
+            Número de placas agregadas
+        """
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO plates (placa, tenencia, marca, ruc, anio_fab) VALUES (?, ?, ?, ?, ?)",
+                    ((r.get('PLACA'), r.get('TENENCIA', ''), r.get('MARCA', ''), r.get('RUC', ''), r.get('ANIO_FAB', ''))
+                     for r in records)
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            return self.conn.total_changes - before
+
+    def _query(self, sql, params=()):
+        """Ejecuta una consulta con el candado de la conexión y retorna todas sus filas"""
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _record(row):
+        """Convierte una fila (placa, tenencia, marca, ruc, anio_fab) al formato de plates_data.json"""
+        return dict(zip(PLATE_FIELDS, row))
+
+    def get(self, plate):
+        """Retorna el registro de una placa, o None si no está en el almacén"""
+        rows = self._query("SELECT placa, tenencia, marca, ruc, anio_fab FROM plates WHERE placa = ?", (plate,))
+        return self._record(rows[0]) if rows else None
+
+    def get_many(self, plates):
+        """
+        Busca varias placas por índice (en consultas de hasta LOOKUP_SIZE placas)
+
+        Args:
+            plates: Lista de números de placa
+
+        Returns:
+            Diccionario {placa: registro} con las placas encontradas
+        """
+        plates = list(dict.fromkeys(plates))
+        found = {}
+        for i in range(0, len(plates), LOOKUP_SIZE):
+            batch = plates[i:i + LOOKUP_SIZE]
+            rows = self._query(
+                f"SELECT placa, tenencia, marca, ruc, anio_fab FROM plates "
+                f"WHERE placa IN ({', '.join('?' * len(batch))})", batch
+            )
+            for row in rows:
+                found[row[0]] = self._record(row)
+        return found
+
+    def _filters(self, ruc=None, marca=None, not_done=None):
+        """Arma la cláusula WHERE y sus parámetros para iter_plates y count"""
+        clauses = []
+        params = []
+        if ruc is not None:
+            clauses.append("p.ruc = ?")
+            params.append(ruc)
+        if marca is not None:
+            clauses.append("p.marca = ?")
+            params.append(marca)
+        if not_done is not None:
+            clauses.append(
+                "NOT EXISTS (SELECT 1 FROM plate_status s "
+                "WHERE s.placa = p.placa AND s.stage = ? AND s.status = 'ok')"
+            )
+            params.append(not_done)
+        return clauses, params
+
+    def iter_plates(self, ruc=None, marca=None, not_done=None, page_size=PAGE_SIZE):
+        """
+        Recorre las placas por páginas, en el orden en que se agregaron
+
+        Cada página es una consulta independiente (paginación por id), así que
+        no se mantiene un cursor abierto mientras el llamador consulta placas
+        o registra estados.
+
+        Args:
+            ruc: Solo las placas de este RUC
+            marca: Solo las placas de esta marca
+            not_done: Solo las placas cuya etapa (ver STAGES) no terminó con éxito
+            page_size: Registros por consulta
+
+        Returns:
+            Iterador de diccionarios con el formato de plates_data.json
+        """
+        clauses, params = self._filters(ruc, marca, not_done)
+        last_id = 0
+        while True:
+            where = ' AND '.join(clauses + ["p.id > ?"])
+            rows = self._query(
+                f"SELECT p.id, p.placa, p.tenencia, p.marca, p.ruc, p.anio_fab FROM plates p "
+                f"WHERE {where} ORDER BY p.id LIMIT ?",
+                params + [last_id, page_size]
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield self._record(row[1:])
+            last_id = rows[-1][0]
+
+    def count(self, ruc=None, marca=None, not_done=None):
+        """Cuenta las placas con los mismos filtros que iter_plates"""
+        clauses, params = self._filters(ruc, marca, not_done)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self._query(f"SELECT COUNT(*) FROM plates p {where}", params)[0][0]
+
+    def __len__(self):
+        return self.count()
+
+    # Misma interfaz que JobState (mark, entry, status, attempts, is_done, summary)
+
+    def mark(self, plate, stage, status, **info):
+        """
+        Registra el estado de una etapa para una placa
+
+        Args:
+            plate: Número de placa
+            stage: Etapa (ver STAGES)
+            status: Estado ('ok', 'error', 'empty', ...)
+            **info: Datos adicionales (se guardan como texto)
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Etapa desconocida: {stage}")
+
+        self._query(
+            "INSERT INTO plate_status (placa, stage, status, attempts, time, info) VALUES (?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT (placa, stage) DO UPDATE SET status = excluded.status, "
+            "attempts = plate_status.attempts + 1, time = excluded.time, info = excluded.info",
+            (plate, stage, status, time.time(), repr(info) if info else None)
+        )
+
+    def entry(self, plate, stage):
+        """Retorna la última entrada de una etapa para una placa (None si no se ejecutó)"""
+        rows = self._query(
+            "SELECT status, attempts, time FROM plate_status WHERE placa = ? AND stage = ?", (plate, stage)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return {'plate': plate, 'stage': stage, 'status': row[0], 'attempts': row[1], 'time': row[2]}
+
+    def status(self, plate, stage):
+        """Retorna el estado de una etapa para una placa (None si no se ejecutó)"""
+        entry = self.entry(plate, stage)
+        return entry['status'] if entry else None
+
+    def attempts(self, plate, stage):
+        """Retorna cuántas veces se ejecutó una etapa para una placa"""
+        entry = self.entry(plate, stage)
+        return entry['attempts'] if entry else 0
+
+    def is_done(self, plate, stage):
+        """Indica si la etapa terminó con éxito para la placa"""
+        return self.status(plate, stage) == 'ok'
+
+    def summary(self):
+        """
+        Cuenta las placas por etapa y estado (las placas del almacén cuentan
+        como extraídas)
+
+        Returns:
+            Diccionario {etapa: {estado: cantidad}}
+        """
+        counts = {stage: {} for stage in STAGES}
+        counts['extracted']['ok'] = len(self)
+        for stage, status, count in self._query(
+            "SELECT stage, status, COUNT(*) FROM plate_status GROUP BY stage, status"
+        ):
+            counts[stage][status] = count
+        return counts
+
+    def close(self):
+        """Cierra la conexión"""
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,210 @@
+"""
+Motor de preprocesamiento de imágenes para el OCR del paso 3.
+
+Cada imagen se decodifica una sola vez y todas las variantes (recorte,
+preprocesamiento principal y alternativo) se calculan a partir de ese mismo
+buffer, solo cuando se necesitan. Los buffers intermedios (HSV, máscara,
+grises, CLAHE, sharpening, umbral) se reservan una vez y se reutilizan entre
+imágenes del mismo tamaño, y las operaciones de OpenCV escriben en ellos
+(dst=...). Solo la imagen final de cada variante es un arreglo nuevo, porque
+el OCR (y el modo por lotes) la conserva.
+
+Se registra el tiempo y los bytes reservados por etapa.
+"""
+import time
+import cv2
+import numpy as np
+
+# Píxeles a eliminar arriba y abajo de la imagen de resultado
+CROP_TOP = 120
+CROP_BOTTOM = 10
+
+# Rango HSV de la marca de agua (#E3E3E3 y tonos similares)
+WATERMARK_HSV_LOWER = np.array([0, 0, 200])    # H, S, V
+WATERMARK_HSV_UPPER = np.array([180, 30, 245])
+
+# Rango de la marca de agua para el método alternativo (igual en los tres
+# canales, así que vale tanto en RGB como en BGR)
+WATERMARK_GRAY_LOWER = np.array([210, 210, 210])  # Un poco más oscuro que #E3E3E3
+WATERMARK_GRAY_UPPER = np.array([240, 240, 240])  # Un poco más claro
+
+SHARPEN_KERNEL = np.array([[-1, -1, -1],
+                           [-1, 9, -1],
+                           [-1, -1, -1]])
+DILATE_KERNEL = np.ones((2, 2), np.uint8)
+
+class PreprocessStats:
+    """Acumula tiempo, bytes reservados y número de llamadas por etapa"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds, nbytes=0):
+        entry = self.stages.setdefault(stage, [0.0, 0, 0])
+        entry[0] += seconds
+        entry[1] += nbytes
+        entry[2] += 1
+
+    def report(self):
+        """Muestra el resumen por etapa"""
+        if not self.stages:
+            return
+        print("\n⏱️  Preprocesamiento por etapa:")
+        print(f"   {'Etapa':<22}{'Llamadas':>10}{'Tiempo (s)':>12}{'ms/llamada':>12}{'MB reservados':>15}")
+        for stage, (seconds, nbytes, calls) in self.stages.items():
+            print(f"   {stage:<22}{calls:>10}{seconds:>12.3f}{seconds * 1000 / calls:>12.2f}"
+                  f"{nbytes / 1e6:>15.2f}")
+
+class ImagePreprocessor:
+    """
+    Calcula las variantes de preprocesamiento reutilizando buffers de trabajo
+
+    Una instancia por proceso; no es segura para usar desde varios hilos.
+    """
+
+    def __init__(self):
+        self.stats = PreprocessStats()
+        self.clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+        self._buffers = {}
+
+    def _buffer(self, name, shape):
+        """Retorna el buffer de trabajo, reservándolo solo si cambió el tamaño"""
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, np.uint8)
+            self._buffers[name] = buf
+            self.stats.add('reserva_buffers', 0.0, buf.nbytes)
+        return buf
+
+    def load(self, image_path):
+        """
+        Decodifica y recorta la imagen (una sola lectura de disco)
+
+        Args:
+            image_path: Ruta a la imagen
+
+        Returns:
+            PreparedImage con las variantes bajo demanda
+        """
+        start = time.perf_counter()
+        img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError(f"No se pudo leer la imagen: {image_path}")
+        self.stats.add('decodificar', time.perf_counter() - start, img.nbytes)
+
+        height = img.shape[0]
+        if height <= (CROP_TOP + CROP_BOTTOM):
+            print(f"   ⚠️  Imagen muy pequeña para recortar, usando imagen completa")
+            cropped = img
+        else:
+            # Recortar imagen: [inicio_y:fin_y, inicio_x:fin_x] (vista, sin copia)
+            cropped = img[CROP_TOP:height - CROP_BOTTOM, :]
+
+        return PreparedImage(self, cropped)
+
+    def _invert_if_dark(self, thresh):
+        """Invierte (en el mismo buffer) una imagen binaria si el fondo es oscuro"""
+        white_pixels = cv2.countNonZero(thresh)
+        black_pixels = thresh.size - white_pixels
+        if black_pixels > white_pixels:
+            cv2.bitwise_not(thresh, dst=thresh)
+
+    def primary(self, img):
+        """
+        Preprocesamiento principal: elimina la marca de agua, CLAHE, sharpening,
+        Otsu y dilatación
+
+        Args:
+            img: Imagen BGR recortada
+
+        Returns:
+            Imagen binaria nueva
+        """
+        shape2d = img.shape[:2]
+        stats = self.stats
+
+        start = time.perf_counter()
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=self._buffer('hsv', img.shape))
+        mask = cv2.inRange(hsv, WATERMARK_HSV_LOWER, WATERMARK_HSV_UPPER, dst=self._buffer('mask', shape2d))
+        # Blanquear la marca de agua y pasar a grises: como el blanco queda en
+        # 255 en grises, equivale a convertir a grises y hacer OR con la máscara
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', shape2d))
+        cv2.bitwise_or(gray, mask, dst=gray)
+        stats.add('marca_de_agua', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        enhanced = self.clahe.apply(gray, dst=self._buffer('enhanced', shape2d))
+        stats.add('clahe', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        sharpened = cv2.filter2D(enhanced, -1, SHARPEN_KERNEL, dst=self._buffer('sharpened', shape2d))
+        stats.add('sharpening', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        thresh = self._buffer('thresh', shape2d)
+        cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=thresh)
+        self._invert_if_dark(thresh)
+        stats.add('otsu', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        dilated = np.empty(shape2d, np.uint8)
+        cv2.dilate(thresh, DILATE_KERNEL, dst=dilated, iterations=1)
+        stats.add('dilatar', time.perf_counter() - start, dilated.nbytes)
+
+        return dilated
+
+    def alternative(self, img):
+        """
+        Preprocesamiento alternativo más agresivo: elimina la marca de agua por
+        rango de color y aplica umbral adaptativo
+
+        Args:
+            img: Imagen BGR recortada
+
+        Returns:
+            Imagen binaria nueva
+        """
+        shape2d = img.shape[:2]
+        stats = self.stats
+
+        start = time.perf_counter()
+        mask = cv2.inRange(img, WATERMARK_GRAY_LOWER, WATERMARK_GRAY_UPPER, dst=self._buffer('mask', shape2d))
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', shape2d))
+        cv2.bitwise_or(gray, mask, dst=gray)
+        stats.add('marca_de_agua_alt', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        thresh = np.empty(shape2d, np.uint8)
+        cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 10, dst=thresh
+        )
+        self._invert_if_dark(thresh)
+        stats.add('umbral_adaptativo', time.perf_counter() - start, thresh.nbytes)
+
+        return thresh
+
+class PreparedImage:
+    """
+    Imagen decodificada una sola vez, con sus variantes calculadas bajo demanda
+
+    Attributes:
+        crop: Imagen BGR recortada (sin preprocesamiento adicional)
+    """
+
+    def __init__(self, preprocessor, crop):
+        self.preprocessor = preprocessor
+        self.crop = crop
+        self._primary = None
+        self._alternative = None
+
+    def primary(self):
+        """Retorna (calculándola una vez) la variante de preprocesamiento principal"""
+        if self._primary is None:
+            self._primary = self.preprocessor.primary(self.crop)
+        return self._primary
+
+    def alternative(self):
+        """Retorna (calculándola una vez) la variante de preprocesamiento alternativa"""
+        if self._alternative is None:
+            self._alternative = self.preprocessor.alternative(self.crop)
+        return self._alternative
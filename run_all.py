@@ -4,6 +4,13 @@ Script principal que ejecuta todo el flujo de trabajo
 import subprocess
 import sys
 import os
+import json
+import time
+import argparse
+import multiprocessing
+
+# Log del OCR en el modo pipeline (la consola queda para el scraper y el CAPTCHA)
+PIPELINE_OCR_LOG = 'ocr_pipeline.log'
 
 def run_script(script_name, description):
     """
@@ -33,10 +40,294 @@ def run_script(script_name, description):
         print(f"\n❌ No se encontró el script: {script_name}")
         return False
 
+def run_pipeline(plates_data, ocr_workers=1, output_folder='output_images',
+                 output_file='vehicle_data_extracted.csv', on_scraped=None, on_error=None, headless=False,
+                 profile=None, browsers=1):
+    """
+    Ejecuta el scraping y el OCR a la vez (productor/consumidor)
+    
+    El scraper (proceso principal, con la consola para el CAPTCHA) encola cada
+    *_resultado.png en cuanto lo guarda, y un proceso OCR lo consume de
+    inmediato, así que el tiempo total se acerca al del paso más lento y no a
+    la suma de ambos. Las imágenes de ejecuciones anteriores que aún no pasaron
+    por OCR se encolan primero.
+    
+    Args:
+        plates_data: Lista de registros de placas a consultar
+        ocr_workers: Número de procesos OCR en paralelo
+        output_folder: Carpeta de las imágenes
+        output_file: Archivo CSV de salida del OCR
+        on_scraped: Función llamada con la ruta de cada imagen de resultado guardada
+        on_error: Función llamada con la placa cuando la consulta falla
+        headless: Si debe ejecutar Chrome sin ventana
+        profile: Perfil del navegador (ver step2_scrape_sunarp.SCRAPE_PROFILES)
+        browsers: Navegadores en paralelo (comparten el límite de cortesía)
+        
+    Returns:
+        True si el scraping y el OCR terminaron
+    """
+    import step2_scrape_sunarp as step2
+    import step3_ocr_extract as step3
+    
+    print("\n" + "="*70)
+    print("  PASOS 2 y 3: SCRAPING + OCR EN PIPELINE")
+    print("="*70)
+    
+    image_queue = multiprocessing.Queue()
+    consumer = multiprocessing.Process(
+        target=step3.ocr_consumer,
+        args=(image_queue, output_folder, output_file, ocr_workers, PIPELINE_OCR_LOG)
+    )
+    consumer.start()
+    print(f"✓ OCR en segundo plano ({ocr_workers} procesos, log: {PIPELINE_OCR_LOG})")
+    
+    if os.path.exists(output_folder):
+        for image_file in sorted(os.listdir(output_folder)):
+            if image_file.lower().endswith('_resultado.png') and not 'ERROR' in image_file.upper():
+                image_queue.put(os.path.join(output_folder, image_file))
+    
+    def on_result(result_path):
+        image_queue.put(result_path)
+        if on_scraped:
+            on_scraped(result_path)
+    
+    start = time.time()
+    successful = failed = 0
+    driver = None
+    try:
+        if plates_data and browsers > 1:
+            successful, failed = step2.scrape_plates_parallel(plates_data, output_folder, browsers,
+                                                              on_result=on_result, on_error=on_error,
+                                                              headless=headless, profile=profile)
+        elif plates_data:
+            driver = step2.setup_driver(headless=headless, profile=profile)
+            successful, failed = step2.scrape_plates(driver, plates_data, output_folder,
+                                                     on_result=on_result, on_error=on_error)
+    finally:
+        if driver is not None:
+            print("\n🔒 Cerrando navegador...")
+            driver.quit()
+        # Aunque el scraping falle, el OCR termina las imágenes ya encoladas
+        image_queue.put(None)
+        print("⏳ Esperando a que el OCR termine las imágenes pendientes...")
+        consumer.join()
+    
+    print(f"\n✓ Scraping: {successful} exitosas, {failed} fallidas")
+    print(f"✓ OCR: {'completado' if consumer.exitcode == 0 else f'terminó con código {consumer.exitcode}'} "
+          f"(detalle en {PIPELINE_OCR_LOG})")
+    print(f"⏱️  Tiempo total: {time.time() - start:.0f} s")
+    return consumer.exitcode == 0
+
+def sync_job_state(state, plates_data, output_folder, output_file):
+    """
+    Actualiza el estado del trabajo con lo que ya existe en disco
+    
+    - scraped: placas cuyo *_resultado.png ya existe (por ejemplo, de una
+      ejecución manual del paso 2)
+    - ocr/parsed: según el manifiesto del OCR incremental del paso 3
+    
+    Args:
+        state: JobState o PlateStore del trabajo
+        plates_data: Iterable de registros de placas (con un almacén, basta
+            con las placas sin consulta exitosa: iter_plates(not_done='scraped'))
+        output_folder: Carpeta de las imágenes
+        output_file: Archivo CSV de salida del OCR
+    """
+    import step2_scrape_sunarp as step2
+    import step3_ocr_extract as step3
+    from vehicle_writers import output_paths
+    
+    # Un solo recorrido de la carpeta en lugar de un os.path.exists por placa
+    completed, _ = step2.build_scrape_index(output_folder)
+    for plate_data in plates_data:
+        plate = plate_data['PLACA']
+        if plate in completed and not state.is_done(plate, 'scraped'):
+            state.mark(plate, 'scraped', 'ok')
+    
+    manifest = step3.load_manifest(output_paths(output_file)['manifest'])
+    for image_file, entry in manifest.items():
+        plate = image_file[:-len('_resultado.png')]
+        if state.status(plate, 'ocr') != entry['status']:
+            state.mark(plate, 'ocr', entry['status'])
+        if entry['status'] == 'ok' and not state.is_done(plate, 'parsed'):
+            state.mark(plate, 'parsed', 'ok')
+
+def run_batch(args):
+    """
+    Ejecuta el flujo completo sin intervención (nodos de trabajo, tareas programadas)
+    
+    No hay preguntas por consola: las opciones vienen de la línea de comandos
+    o de --config. El estado por placa y etapa se guarda en --state-file, así
+    que al reiniciar solo se consultan las placas que faltan y el OCR retoma
+    las imágenes pendientes.
+    
+    Args:
+        args: Argumentos retornados por parse_args
+        
+    Returns:
+        True si el trabajo terminó sin errores de OCR
+    """
+    from job_state import JobState
+    import step2_scrape_sunarp as step2
+    
+    print("\n" + "="*70)
+    print("  SUNARP SCRAPER - MODO POR LOTES (DESATENDIDO)")
+    print("="*70)
+    
+    step2.INTERACTIVE = False
+    
+    # Paso 1: extraer placas (solo si aún no existe el archivo)
+    if args.refresh_plates or not os.path.exists(args.plates_file):
+        import step1_extract_plates as step1
+        if args.plates_file.endswith(('.jsonl', '.db', '.sqlite', '.sqlite3')):
+            step1.extract_plates_stream(args.dataset, args.plates_file)
+        else:
+            step1.extract_plates_data(args.dataset, args.plates_file)
+    
+    from step1_extract_plates import load_plates
+    from plate_store import PlateStore, is_store_file
+    
+    # Con un almacén .db el estado por placa se guarda en el mismo almacén y
+    # las placas no se cargan completas: solo se recorren, por páginas, las
+    # que aún no tienen consulta exitosa
+    store = is_store_file(args.plates_file)
+    with (PlateStore(args.plates_file) if store else JobState(args.state_file)) as state:
+        if store:
+            total = len(state)
+            sync_job_state(state, state.iter_plates(not_done='scraped'), args.output_dir, args.output)
+            pending, summary = step2.select_pending(state.iter_plates(not_done='scraped'), args.output_dir,
+                                                    state, limit=args.limit)
+            summary['completed'] += total - state.count(not_done='scraped')
+        else:
+            plates_data = step2.dedupe_plates(load_plates(args.plates_file))
+            total = len(plates_data)
+            for plate_data in plates_data:
+                if not state.is_done(plate_data['PLACA'], 'extracted'):
+                    state.mark(plate_data['PLACA'], 'extracted', 'ok')
+            
+            sync_job_state(state, plates_data, args.output_dir, args.output)
+            
+            pending, summary = step2.select_pending(plates_data, args.output_dir, state, limit=args.limit)
+        print(f"✓ Estado del trabajo: {args.plates_file if store else args.state_file}")
+        print(f"✓ {total} placas, {len(pending)} pendientes de consulta "
+              f"(nuevas: {summary['new']}, a reintentar: {summary['retry']}, "
+              f"en espera: {summary['waiting']}, sin más intentos: {summary['exhausted']})")
+        
+        if pending and not step2.unattended_captcha_available():
+            # Sin operador, cada consulta al sitio real fallaría en el CAPTCHA y
+            # agotaría los intentos de las placas: solo se ejecuta el OCR de las
+            # imágenes ya consultadas
+            print("⚠️  Sin forma de resolver el CAPTCHA del sitio real: se omite el scraping")
+            print("   Apunta SUNARP_BASE_URL a la réplica local (sunarp_replay_server.py) para consultar")
+            pending = []
+        
+        def on_scraped(result_path):
+            state.mark(os.path.basename(result_path)[:-len('_resultado.png')], 'scraped', 'ok')
+        
+        def on_error(plate):
+            state.mark(plate, 'scraped', 'error')
+        
+        completed = run_pipeline(pending, args.ocr_workers, args.output_dir, args.output,
+                                 on_scraped=on_scraped, on_error=on_error, headless=args.headless,
+                                 profile=args.profile, browsers=args.browsers)
+        
+        sync_job_state(state, pending if store else plates_data, args.output_dir, args.output)
+        
+        print("\nEstado por etapa:")
+        for stage, counts in state.summary().items():
+            detail = ', '.join(f"{status}: {count}" for status, count in sorted(counts.items()))
+            print(f"   {stage}: {detail or '-'}")
+    
+    # Paso 4: unir los resultados del OCR con los datos del paso 1
+    if args.enrich and completed:
+        import step4_enrich_data as step4
+        from vehicle_writers import output_paths
+        stats = step4.enrich_dataset(output_paths(args.output)['jsonl'], args.plates_file, args.enriched_output)
+        print(f"✓ Dataset enriquecido: {args.enriched_output} ({stats['records']} registros, "
+              f"discrepancias de marca: {stats['marca']}, de año: {stats['anio']})")
+    
+    return completed
+
+def print_summary():
+    """Muestra los archivos generados por el flujo"""
+    print("\n" + "="*70)
+    print("  PROCESO COMPLETADO")
+    print("="*70)
+    print("\nArchivos generados:")
+    if os.path.exists('plates_data.json'):
+        print("  ✓ plates_data.json")
+    if os.path.exists('output_images'):
+        num_images = len([f for f in os.listdir('output_images') if f.endswith('.png')])
+        print(f"  ✓ output_images/ ({num_images} imágenes)")
+    if os.path.exists('vehicle_data_extracted.json'):
+        print("  ✓ vehicle_data_extracted.json")
+    if os.path.exists('vehicle_data_extracted.csv'):
+        print("  ✓ vehicle_data_extracted.csv")
+    if os.path.exists('vehicle_data_enriched.csv'):
+        print("  ✓ vehicle_data_enriched.csv")
+    
+    print("\n" + "="*70)
+
+def parse_args():
+    """
+    Parsea los argumentos de línea de comandos
+    
+    Con --config ARCHIVO.json, las claves del archivo (por ejemplo
+    {"limit": 500, "ocr_workers": 4}) se usan como valores por defecto y la
+    línea de comandos tiene prioridad.
+    """
+    parser = argparse.ArgumentParser(description="Ejecuta el flujo completo: placas, scraping de SUNARP y OCR")
+    parser.add_argument('--config', help="Archivo JSON con las opciones")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Ejecutar scraping y OCR a la vez: cada imagen se procesa en cuanto se guarda")
+    parser.add_argument('--batch', action='store_true',
+                        help="Modo desatendido y reanudable (sin preguntas, scraping + OCR en pipeline)")
+    parser.add_argument('--dataset', default='dataset_plates.csv',
+                        help="CSV de entrada del paso 1")
+    parser.add_argument('--plates-file', default='plates_data.json',
+                        help="Archivo de placas (salida del paso 1; con .jsonl se extrae por bloques)")
+    parser.add_argument('--refresh-plates', action='store_true',
+                        help="Volver a ejecutar el paso 1 aunque exista el archivo de placas")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="Número máximo de placas a consultar en esta ejecución")
+    parser.add_argument('--ocr-workers', type=int, default=1,
+                        help="Procesos OCR en paralelo en el modo pipeline")
+    parser.add_argument('--output-dir', default='output_images',
+                        help="Carpeta de las imágenes")
+    parser.add_argument('--output', default='vehicle_data_extracted.csv',
+                        help="Archivo CSV de salida del OCR")
+    parser.add_argument('--enrich', action='store_true',
+                        help="Al terminar, unir los resultados del OCR con los datos del paso 1 (paso 4)")
+    parser.add_argument('--enriched-output', default='vehicle_data_enriched.csv',
+                        help="Dataset enriquecido del paso 4")
+    parser.add_argument('--state-file', default='job_state.jsonl',
+                        help="Archivo de estado del modo por lotes")
+    parser.add_argument('--headless', action='store_true',
+                        help="Ejecutar Chrome sin ventana")
+    parser.add_argument('--browsers', type=int, default=1,
+                        help="Navegadores en paralelo en el paso 2 (comparten el límite de cortesía)")
+    parser.add_argument('--profile', choices=['default', 'light'], default='default',
+                        help="Perfil del navegador del paso 2 (light: headless, sin fuentes ni medios)")
+    
+    args, _ = parser.parse_known_args()
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            parser.set_defaults(**json.load(f))
+    return parser.parse_args()
+
 def main():
     """
     Ejecuta el flujo completo de trabajo
     """
+    args = parse_args()
+    
+    if args.batch:
+        if not run_batch(args):
+            print("\n⚠️  El trabajo por lotes no se completó correctamente.")
+            sys.exit(1)
+        print_summary()
+        return
+    
     print("\n" + "="*70)
     print("  SUNARP SCRAPER - FLUJO COMPLETO")
     print("="*70)
@@ -61,6 +352,15 @@ def main():
         print("\n❌ No se generó el archivo plates_data.json. Abortando...")
         return
     
+    if args.pipeline:
+        with open('plates_data.json', 'r', encoding='utf-8') as f:
+            plates_data = json.load(f)
+        if not run_pipeline(plates_data, args.ocr_workers, args.output_dir, args.output,
+                            headless=args.headless, profile=args.profile, browsers=args.browsers):
+            print("\n⚠️  El OCR no se completó correctamente.")
+        print_summary()
+        return
+    
     # Paso 2: Scraping
     print("\n" + "="*70)
     print("  IMPORTANTE - PASO 2")
@@ -106,22 +406,7 @@ def main():
             print("\n⚠️  El OCR no se completó correctamente.")
             print("Verifica que Tesseract-OCR esté instalado correctamente.")
     
-    # Resumen final
-    print("\n" + "="*70)
-    print("  PROCESO COMPLETADO")
-    print("="*70)
-    print("\nArchivos generados:")
-    if os.path.exists('plates_data.json'):
-        print("  ✓ plates_data.json")
-    if os.path.exists('output_images'):
-        num_images = len([f for f in os.listdir('output_images') if f.endswith('.png')])
-        print(f"  ✓ output_images/ ({num_images} imágenes)")
-    if os.path.exists('vehicle_data_extracted.json'):
-        print("  ✓ vehicle_data_extracted.json")
-    if os.path.exists('vehicle_data_extracted.csv'):
-        print("  ✓ vehicle_data_extracted.csv")
-    
-    print("\n" + "="*70)
+    print_summary()
 
 if __name__ == "__main__":
     main()
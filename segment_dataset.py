@@ -0,0 +1,401 @@
+"""
+Divide el volcado mensual del registro (dataset_ruc_AAAAMM.csv) en N partes
+para procesarlas en paralelo, en varios núcleos o nodos.
+
+Cada parte es un CSV (separado por ';', UTF-8) que se usa como dataset de un
+trabajador del flujo (step1_extract_plates.py --input o run_all.py --batch
+--dataset). Modos:
+- hash (por defecto): cada fila va a la parte hash(clave) % N, con la clave
+  PLACA o RUC normalizada. La misma placa cae siempre en la misma parte, en
+  cualquier nodo y en cualquier mes, así que la eliminación de repetidas del
+  paso 1 y el estado de cada trabajador siguen siendo válidos por parte.
+- range: N bloques contiguos de filas (de tamaño aproximadamente igual en bytes).
+
+El archivo no se carga completo: la codificación se detecta una vez con una
+muestra, el archivo se divide en rangos de bytes alineados a fin de línea y
+cada proceso lee el suyo por bloques y escribe sus partes. Los valores se
+copian como texto, sin conversiones (el RUC conserva sus ceros a la izquierda).
+Supone que los valores no contienen saltos de línea (como en el volcado de
+SUNAT).
+
+Uso:
+    python segment_dataset.py --input dataset_ruc_202510.csv --shards 8 --columns step1
+    python segment_dataset.py --input dataset_ruc_202510.csv --shards 4 --by range
+"""
+import os
+import csv
+import json
+import codecs
+import shutil
+import argparse
+import multiprocessing
+
+# Bytes que se leen para detectar la codificación y el separador
+SAMPLE_BYTES = 4 * 1024 * 1024
+
+# Bytes por bloque que lee cada proceso (más un resto hasta el fin de línea)
+BLOCK_BYTES = 32 * 1024 * 1024
+
+# Separador de las partes (el que espera el paso 1)
+OUTPUT_SEP = ';'
+
+# Separadores que se prueban en la cabecera del archivo de entrada
+CANDIDATE_SEPS = ';,\t|'
+
+SHARD_MODES = ['hash', 'range']
+
+def detect_encoding(csv_file, sample_bytes=SAMPLE_BYTES):
+    """
+    Detecta la codificación del CSV con una muestra del inicio del archivo
+
+    Se prueba UTF-8 (con o sin BOM) y, si la muestra no es UTF-8 válido, se
+    usa latin-1 (que acepta cualquier byte).
+
+    Args:
+        csv_file: Ruta al archivo CSV
+        sample_bytes: Bytes de la muestra
+
+    Returns:
+        Nombre de la codificación ('utf-8-sig', 'utf-8' o 'latin-1')
+    """
+    with open(csv_file, 'rb') as f:
+        sample = f.read(sample_bytes)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # final=False: la muestra puede cortar un carácter de varios bytes
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def read_header(csv_file, encoding):
+    """
+    Lee la cabecera del CSV
+
+    Args:
+        csv_file: Ruta al archivo CSV
+        encoding: Codificación (ver detect_encoding)
+
+    Returns:
+        Tupla (columnas, separador, byte donde empiezan los datos)
+    """
+    with open(csv_file, 'rb') as f:
+        line = f.readline()
+        data_start = f.tell()
+
+    text = line.decode(encoding).rstrip('\r\n')
+    sep = max(CANDIDATE_SEPS, key=text.count)
+    columns = next(csv.reader([text], delimiter=sep))
+    return columns, sep, data_start
+
+def split_ranges(csv_file, start, parts):
+    """
+    Divide el archivo en rangos de bytes de tamaño similar alineados a fin de línea
+
+    Args:
+        csv_file: Ruta al archivo CSV
+        start: Byte donde empiezan los datos (después de la cabecera)
+        parts: Número de rangos
+
+    Returns:
+        Lista de tuplas (inicio, fin); puede tener menos de parts rangos si el
+        archivo es pequeño
+    """
+    size = os.path.getsize(csv_file)
+    bounds = [start]
+    with open(csv_file, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(start + (size - start) * i // parts, bounds[-1]))
+            if f.tell() > start:
+                f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+def iter_blocks(csv_file, start, end, block_bytes=BLOCK_BYTES):
+    """
+    Lee un rango de bytes en bloques que terminan en fin de línea
+
+    Args:
+        csv_file: Ruta al archivo CSV
+        start: Byte inicial (inicio de una línea)
+        end: Byte final (inicio de una línea o fin del archivo)
+        block_bytes: Bytes por bloque
+
+    Returns:
+        Iterador de bloques de bytes
+    """
+    with open(csv_file, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            block = f.read(min(block_bytes, end - f.tell()))
+            if f.tell() < end and not block.endswith(b'\n'):
+                block += f.readline()
+            yield block
+
+def shard_keys(values):
+    """Normaliza la clave de partición (mayúsculas, sin espacios ni guiones), igual que el paso 1 con PLACA"""
+    return values.str.upper().str.replace(r'[\s\-]+', '', regex=True)
+
+def shard_of(values, shards):
+    """
+    Calcula la parte de cada fila por hash de la clave
+
+    hash_pandas_object usa una llave fija, así que el resultado es el mismo
+    en cualquier proceso, nodo o ejecución.
+
+    Args:
+        values: Serie con la clave (como texto)
+        shards: Número de partes
+
+    Returns:
+        Arreglo de numpy con el número de parte de cada fila
+    """
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(shard_keys(values), index=False).to_numpy()
+    return hashes % shards
+
+def shard_file(output_dir, prefix, shard, shards):
+    """Ruta del archivo de una parte (prefijo_parte003-de008.csv)"""
+    return os.path.join(output_dir, f"{prefix}_parte{shard:03d}-de{shards:03d}.csv")
+
+def header_line(columns):
+    """Cabecera CSV de las partes"""
+    import pandas as pd
+
+    return pd.DataFrame(columns=columns).to_csv(sep=OUTPUT_SEP, index=False)
+
+def segment_range(task):
+    """
+    Procesa un rango de bytes del archivo (se ejecuta en un proceso aparte)
+
+    En modo hash escribe un archivo parcial por parte en task['parts_dir'];
+    en modo range escribe directamente la parte task['worker'].
+
+    Args:
+        task: Diccionario con input_file, start, end, worker, mode, shards,
+            names, columns, key, sep, encoding, block_bytes, output_dir,
+            prefix y parts_dir
+
+    Returns:
+        Tupla (worker, filas por parte)
+    """
+    import io
+    import pandas as pd
+
+    shards = task['shards']
+    rows = [0] * shards
+    usecols = task['columns'] if task['key'] is None or task['key'] in task['columns'] \
+        else task['columns'] + [task['key']]
+    files = {}
+
+    def open_shard(shard):
+        if shard not in files:
+            if task['mode'] == 'range':
+                f = open(shard_file(task['output_dir'], task['prefix'], shard, shards),
+                         'w', encoding='utf-8', newline='')
+                f.write(header_line(task['columns']))
+            else:
+                f = open(os.path.join(task['parts_dir'], f"{shard:03d}_{task['worker']:03d}.csv"),
+                         'w', encoding='utf-8', newline='')
+            files[shard] = f
+        return files[shard]
+
+    try:
+        if task['mode'] == 'range':
+            open_shard(task['worker'])
+
+        for block in iter_blocks(task['input_file'], task['start'], task['end'], task['block_bytes']):
+            # Todo como texto y sin valores nulos: las partes copian el valor tal cual.
+            # encoding_errors='replace': un byte inválido después de la muestra
+            # no interrumpe una división de varias horas
+            chunk = pd.read_csv(io.BytesIO(block), sep=task['sep'], header=None, names=task['names'],
+                                usecols=usecols, dtype=str, keep_default_na=False,
+                                encoding=task['encoding'], encoding_errors='replace')
+            if not len(chunk):
+                continue
+
+            if task['mode'] == 'range':
+                pieces = [(task['worker'], chunk)]
+            else:
+                pieces = chunk.groupby(shard_of(chunk[task['key']], shards), sort=False)
+            for shard, piece in pieces:
+                piece[task['columns']].to_csv(open_shard(int(shard)), sep=OUTPUT_SEP, header=False, index=False)
+                rows[int(shard)] += len(piece)
+    finally:
+        for f in files.values():
+            f.close()
+
+    return task['worker'], rows
+
+def merge_shard(task):
+    """
+    Une los archivos parciales de una parte, en el orden de los rangos (se
+    ejecuta en un proceso aparte)
+
+    Args:
+        task: Tupla (parts_dir, output_dir, prefix, shard, shards, workers, columns)
+
+    Returns:
+        Ruta del archivo de la parte
+    """
+    parts_dir, output_dir, prefix, shard, shards, workers, columns = task
+    path = shard_file(output_dir, prefix, shard, shards)
+    with open(path, 'wb') as out:
+        out.write(header_line(columns).encode('utf-8'))
+        for worker in range(workers):
+            part = os.path.join(parts_dir, f"{shard:03d}_{worker:03d}.csv")
+            if os.path.exists(part):
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+                os.remove(part)
+    return path
+
+def segment_dataset(input_file, output_dir='shards', shards=4, mode='hash', key='PLACA', columns=None,
+                    workers=None, block_bytes=BLOCK_BYTES, sample_bytes=SAMPLE_BYTES):
+    """
+    Divide el CSV en partes, con varios procesos y memoria acotada
+
+    Args:
+        input_file: Ruta al CSV de entrada
+        output_dir: Carpeta de las partes (se crea si no existe)
+        shards: Número de partes
+        mode: 'hash' (por clave) o 'range' (bloques contiguos de filas)
+        key: Columna clave en modo hash (PLACA o RUC)
+        columns: Columnas a conservar (None: todas)
+        workers: Procesos en modo hash (por defecto, los núcleos disponibles);
+            en modo range hay un proceso por parte
+        block_bytes: Bytes por bloque de lectura de cada proceso
+        sample_bytes: Bytes de la muestra para detectar la codificación
+
+    Returns:
+        Diccionario con la descripción de la división (también se guarda en
+        output_dir/manifest.json)
+    """
+    if mode not in SHARD_MODES:
+        raise ValueError(f"Modo desconocido: {mode} (opciones: {', '.join(SHARD_MODES)})")
+
+    encoding = detect_encoding(input_file, sample_bytes)
+    names, sep, data_start = read_header(input_file, encoding)
+    print(f"Leyendo {input_file}: codificación {encoding}, separador {sep!r}, {len(names)} columnas")
+
+    columns = list(columns) if columns else list(names)
+    missing = [column for column in columns + ([key] if mode == 'hash' else []) if column not in names]
+    if missing:
+        raise ValueError(f"Columnas no encontradas en {input_file}: {', '.join(missing)}")
+
+    if mode == 'range':
+        workers = shards
+    else:
+        workers = workers or os.cpu_count() or 1
+    ranges = split_ranges(input_file, data_start, workers)
+
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.splitext(os.path.basename(input_file))[0]
+    parts_dir = os.path.join(output_dir, f".{prefix}_partes")
+    if mode == 'hash':
+        os.makedirs(parts_dir, exist_ok=True)
+
+    tasks = [
+        {
+            'input_file': input_file, 'start': start, 'end': end, 'worker': worker, 'mode': mode,
+            'shards': shards, 'names': names, 'columns': columns, 'key': key if mode == 'hash' else None,
+            'sep': sep, 'encoding': encoding, 'block_bytes': block_bytes,
+            'output_dir': output_dir, 'prefix': prefix, 'parts_dir': parts_dir,
+        }
+        for worker, (start, end) in enumerate(ranges)
+    ]
+    print(f"Dividiendo en {shards} partes ({'hash de ' + key if mode == 'hash' else 'rangos de filas'}) "
+          f"con {len(tasks)} procesos")
+
+    rows = [0] * shards
+    with multiprocessing.Pool(max(1, len(tasks))) as pool:
+        for worker, worker_rows in pool.imap_unordered(segment_range, tasks):
+            rows = [total + count for total, count in zip(rows, worker_rows)]
+            print(f"   Rango {worker + 1}/{len(tasks)} terminado ({sum(worker_rows):,} filas)")
+
+        if mode == 'hash':
+            pool.map(merge_shard, [
+                (parts_dir, output_dir, prefix, shard, shards, len(tasks), columns) for shard in range(shards)
+            ])
+
+    if mode == 'hash':
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    # Las partes de un rango vacío (archivo pequeño en modo range) se crean
+    # solo con la cabecera, para que siempre haya N partes
+    for shard in range(shards):
+        path = shard_file(output_dir, prefix, shard, shards)
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(header_line(columns))
+
+    manifest = {
+        'input_file': input_file,
+        'encoding': encoding,
+        'mode': mode,
+        'key': key if mode == 'hash' else None,
+        'columns': columns,
+        'rows': sum(rows),
+        'shards': [
+            {'shard': shard, 'file': os.path.basename(shard_file(output_dir, prefix, shard, shards)),
+             'rows': rows[shard]}
+            for shard in range(shards)
+        ],
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Divide el volcado del registro en partes para procesarlas en paralelo")
+    parser.add_argument('--input', default='dataset_ruc_202510.csv', help="CSV de entrada")
+    parser.add_argument('--output-dir', default='shards', help="Carpeta de las partes")
+    parser.add_argument('--shards', type=int, default=4, help="Número de partes")
+    parser.add_argument('--by', choices=SHARD_MODES, default='hash',
+                        help="hash: por hash de la clave; range: bloques contiguos de filas")
+    parser.add_argument('--key', default='PLACA', help="Columna clave en modo hash (PLACA o RUC)")
+    parser.add_argument('--columns', default=None,
+                        help="Columnas a conservar, separadas por comas, o 'step1' para las del paso 1 "
+                             "(por defecto, todas)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Procesos en modo hash (por defecto, los núcleos disponibles)")
+    parser.add_argument('--block-mb', type=int, default=BLOCK_BYTES // (1024 * 1024),
+                        help="MB por bloque de lectura de cada proceso")
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ No se encontró el archivo {args.input}")
+        return
+
+    columns = None
+    if args.columns == 'step1':
+        from step1_extract_plates import PLATE_COLUMNS
+        columns = PLATE_COLUMNS
+    elif args.columns:
+        columns = [column.strip() for column in args.columns.split(',') if column.strip()]
+
+    try:
+        manifest = segment_dataset(args.input, args.output_dir, args.shards, args.by, args.key, columns,
+                                   args.workers, args.block_mb * 1024 * 1024)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    print(f"\n✓ {manifest['rows']:,} filas en {len(manifest['shards'])} partes ({args.output_dir}/):")
+    for shard in manifest['shards']:
+        print(f"   {shard['file']}: {shard['rows']:,} filas")
+    print("\nCada parte se procesa por separado, por ejemplo:")
+    print(f"   python run_all.py --batch --dataset {args.output_dir}/{manifest['shards'][0]['file']} ...")
+
+if __name__ == "__main__":
+    main()
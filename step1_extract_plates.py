@@ -1,8 +1,38 @@
 """
 Script para extraer datos de placas del dataset y guardarlos en un formato estructurado.
+
+Modos:
+- plates_data.json (por defecto): lee el CSV completo y guarda un arreglo JSON.
+- plates_data.jsonl o plates.db (--stream, o una salida .jsonl/.db): lee el
+  CSV por bloques, solo con las columnas necesarias, normaliza y valida las
+  placas con operaciones vectorizadas, elimina las repetidas entre bloques y
+  escribe JSON Lines (o el almacén indexado de plate_store) a medida que
+  avanza, con memoria acotada (para los volcados de varios GB del registro).
 """
-import pandas as pd
+import os
+import re
 import json
+import argparse
+
+# Columnas que usa el resto del flujo y su tipo al leer el CSV (todo como
+# texto: el RUC conserva sus ceros a la izquierda y un año mal escrito no
+# rompe la lectura; ANIO_FAB se convierte a número después)
+PLATE_COLUMNS = ['PLACA', 'TENENCIA', 'MARCA', 'RUC', 'ANIO_FAB']
+PLATE_DTYPES = {column: str for column in PLATE_COLUMNS}
+
+# Filas por bloque en el modo streaming
+CHUNK_SIZE = 200_000
+
+# Formato de placa peruana (mismo que field_profiles.PLATE_REGEX): ABC123,
+# A0B975, AB1234. Antes de validar se quitan espacios y guiones.
+PLATE_PATTERN = r'[A-Z][A-Z0-9]{2}\d{3}'
+
+# Caracteres leídos por vez al recorrer un arreglo JSON (iter_json_array)
+JSON_BUFFER_SIZE = 1 << 16
+
+# Separadores entre elementos de un arreglo JSON
+_JSON_SEPARATORS = re.compile(r'[\s,]*')
+_JSON_WHITESPACE = re.compile(r'\s*')
 
 def extract_plates_data(csv_file='dataset_plates.csv', output_file='plates_data.json'):
     """
@@ -12,6 +42,8 @@ def extract_plates_data(csv_file='dataset_plates.csv', output_file='plates_data.
         csv_file: Ruta al archivo CSV con los datos de placas
         output_file: Ruta donde se guardará el JSON con los datos extraídos
     """
+    import pandas as pd
+    
     print(f"Leyendo archivo: {csv_file}")
     
     # Leer el CSV
@@ -54,6 +86,276 @@ def extract_plates_data(csv_file='dataset_plates.csv', output_file='plates_data.
     
     return plates_data
 
+def normalize_plates(chunk, validate=True):
+    """
+    Normaliza y valida un bloque de placas con operaciones vectorizadas
+    
+    PLACA pasa a mayúsculas sin espacios ni guiones; ANIO_FAB a entero (o
+    vacío si no es numérico); el resto de columnas vacías queda como ''.
+    
+    Args:
+        chunk: DataFrame con las columnas PLATE_COLUMNS (como texto)
+        validate: Si se descartan las placas que no cumplen PLATE_PATTERN
+        
+    Returns:
+        Tupla (DataFrame normalizado, placas vacías, placas inválidas)
+    """
+    import pandas as pd
+    
+    plates = chunk['PLACA'].str.upper().str.replace(r'[\s\-]+', '', regex=True)
+    empty = plates.isna() | (plates == '')
+    keep = ~empty
+    invalid = 0
+    if validate:
+        valid = plates.str.fullmatch(PLATE_PATTERN).fillna(False).astype(bool)
+        invalid = int((keep & ~valid).sum())
+        keep &= valid
+    
+    chunk = chunk[keep].copy()
+    chunk['PLACA'] = plates[keep]
+    for column in ('TENENCIA', 'MARCA', 'RUC'):
+        chunk[column] = chunk[column].fillna('').str.strip()
+    # Los años no enteros (p. ej. "2019.5") quedan vacíos: Int64 no los acepta
+    year = pd.to_numeric(chunk['ANIO_FAB'], errors='coerce')
+    year = year.where(year % 1 == 0).astype('Int64')
+    chunk['ANIO_FAB'] = year.astype(object).where(year.notna(), '')
+    
+    return chunk, int(empty.sum()), invalid
+
+def iter_plate_chunks(csv_file, chunksize=CHUNK_SIZE, validate=True, encoding='utf-8', stats=None):
+    """
+    Lee el CSV por bloques y retorna las placas normalizadas, sin repetidas
+    
+    Las placas repetidas (también entre bloques) se descartan conservando la
+    primera aparición. Para eso solo se guarda un hash de 64 bits por placa
+    ya vista (8 bytes por placa, en un arreglo ordenado de numpy), no los
+    registros.
+    
+    Args:
+        csv_file: Ruta al archivo CSV (separado por ';')
+        chunksize: Filas por bloque
+        validate: Si se descartan las placas con formato inválido
+        encoding: Codificación del CSV
+        stats: Diccionario donde acumular los conteos (filas, vacías,
+            inválidas, repetidas)
+        
+    Returns:
+        Iterador de DataFrames con las columnas PLATE_COLUMNS
+    """
+    import numpy as np
+    import pandas as pd
+    
+    if stats is None:
+        stats = {}
+    for key in ('rows', 'empty', 'invalid', 'duplicates'):
+        stats.setdefault(key, 0)
+    seen = np.empty(0, dtype=np.uint64)
+    
+    reader = pd.read_csv(csv_file, sep=';', encoding=encoding, usecols=PLATE_COLUMNS,
+                         dtype=PLATE_DTYPES, chunksize=chunksize)
+    
+    for chunk in reader:
+        stats['rows'] += len(chunk)
+        chunk, empty, invalid = normalize_plates(chunk[PLATE_COLUMNS], validate)
+        stats['empty'] += empty
+        stats['invalid'] += invalid
+        
+        # Repetidas dentro del bloque y con los bloques anteriores
+        before = len(chunk)
+        chunk = chunk.drop_duplicates('PLACA')
+        hashes = pd.util.hash_pandas_object(chunk['PLACA'], index=False).to_numpy()
+        positions = np.searchsorted(seen, hashes)
+        found = np.zeros(len(hashes), dtype=bool)
+        if len(seen):
+            found = seen[np.minimum(positions, len(seen) - 1)] == hashes
+        chunk = chunk[~found]
+        new = np.sort(hashes[~found])
+        seen = np.insert(seen, np.searchsorted(seen, new), new)
+        stats['duplicates'] += before - len(chunk)
+        
+        yield chunk
+
+def extract_plates_stream(csv_file='dataset_plates.csv', output_file='plates_data.jsonl',
+                          chunksize=CHUNK_SIZE, validate=True, encoding='utf-8'):
+    """
+    Extrae las placas por bloques, con memoria acotada
+    
+    Según la extensión de output_file se escribe:
+    - .jsonl: JSON Lines, en un temporal que se renombra al final.
+    - .db/.sqlite: el almacén indexado de plate_store. Se agregan las placas
+      nuevas y se conservan las existentes con su estado en el flujo.
+    
+    Args:
+        csv_file: Ruta al archivo CSV (separado por ';')
+        output_file: Ruta del archivo de salida
+        chunksize: Filas por bloque
+        validate: Si se descartan las placas con formato inválido
+        encoding: Codificación del CSV
+        
+    Returns:
+        Diccionario con los conteos (filas, vacías, inválidas, repetidas, escritas)
+    """
+    from plate_store import PlateStore, is_store_file
+    
+    # iter_plates elige el lector por extensión: JSON Lines en un .json no se
+    # podría volver a leer
+    if not is_store_file(output_file) and not output_file.endswith('.jsonl'):
+        raise ValueError(f"El modo por bloques escribe .jsonl o .db, no {output_file}")
+    
+    print(f"Leyendo archivo por bloques de {chunksize:,} filas: {csv_file}")
+    
+    stats = {'rows': 0, 'empty': 0, 'invalid': 0, 'duplicates': 0, 'written': 0}
+    samples = []
+    chunks = iter_plate_chunks(csv_file, chunksize, validate, encoding, stats)
+    
+    if is_store_file(output_file):
+        with PlateStore(output_file) as store:
+            for chunk in chunks:
+                stats['written'] += store.add_plates(chunk.to_dict('records'))
+                if len(samples) < 5:
+                    samples.extend(chunk.head(5 - len(samples)).to_dict('records'))
+                print(f"   {stats['rows']:,} filas leídas, {stats['written']:,} placas nuevas")
+            total = len(store)
+        print(f"\nAlmacén de placas: {total:,} placas en total")
+    else:
+        temp_file = output_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                if len(chunk):
+                    # Algunas versiones de pandas no terminan la última línea con '\n'
+                    lines = chunk.to_json(orient='records', lines=True, force_ascii=False)
+                    f.write(lines if lines.endswith('\n') else lines + '\n')
+                    stats['written'] += len(chunk)
+                    if len(samples) < 5:
+                        samples.extend(chunk.head(5 - len(samples)).to_dict('records'))
+                print(f"   {stats['rows']:,} filas leídas, {stats['written']:,} placas escritas")
+        os.replace(temp_file, output_file)
+    
+    print(f"\nTotal de registros: {stats['rows']:,}")
+    print(f"Placas vacías: {stats['empty']:,}, con formato inválido: {stats['invalid']:,}, "
+          f"repetidas: {stats['duplicates']:,}")
+    print(f"Total de placas válidas: {stats['written']:,}")
+    
+    print("\nPrimeros 5 registros:")
+    for i, plate in enumerate(samples):
+        print(f"{i+1}. {plate}")
+    
+    print(f"\nDatos guardados en: {output_file}")
+    
+    return stats
+
+def iter_json_array(json_file, buffer_size=JSON_BUFFER_SIZE):
+    """
+    Recorre un arreglo JSON elemento por elemento, con memoria acotada
+    
+    Se lee el archivo por bloques de buffer_size caracteres y cada elemento se
+    decodifica con JSONDecoder.raw_decode: en memoria solo queda el bloque
+    actual (y el elemento que lo cruza), no el arreglo completo.
+    
+    Args:
+        json_file: Ruta al archivo con un arreglo JSON
+        buffer_size: Caracteres por lectura
+        
+    Yields:
+        Elementos del arreglo
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    
+    with open(json_file, 'r', encoding='utf-8') as f:
+        while True:
+            pos = _JSON_SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"{json_file} no contiene un arreglo JSON")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    # El elemento termina solo si le sigue ',' o ']': un número
+                    # cortado por el bloque ("2." de "2.5") se decodifica igual
+                    following = _JSON_WHITESPACE.match(buffer, end).end()
+                    if following < len(buffer) and buffer[following] in ',]':
+                        yield item
+                        pos = end
+                        continue
+                    if eof:
+                        raise ValueError(f"Arreglo JSON mal formado en {json_file}")
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                raise ValueError(f"Arreglo JSON incompleto en {json_file}")
+            
+            chunk = f.read(buffer_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+def iter_plates(plates_file):
+    """
+    Itera los registros de un archivo de placas (.json del modo completo,
+    .jsonl del modo streaming o el almacén .db de plate_store, por páginas)
+    
+    Args:
+        plates_file: Ruta al archivo de placas
+        
+    Returns:
+        Iterador de diccionarios
+    """
+    from plate_store import PlateStore, is_store_file
+    
+    if is_store_file(plates_file):
+        with PlateStore(plates_file) as store:
+            yield from store.iter_plates()
+    elif plates_file.endswith('.jsonl'):
+        with open(plates_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from iter_json_array(plates_file)
+
+def load_plates(plates_file):
+    """Carga todos los registros de un archivo de placas (.json, .jsonl o .db)"""
+    if plates_file.endswith('.json'):
+        # Se carga completo de todas formas: json.load es más rápido que iter_json_array
+        with open(plates_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return list(iter_plates(plates_file))
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Extrae las placas del dataset para el scraping")
+    parser.add_argument('--input', default='dataset_plates.csv', help="CSV de entrada (separado por ';')")
+    parser.add_argument('--output', default=None,
+                        help="Archivo de salida: .json, .jsonl o almacén .db (por defecto plates_data.json, "
+                             "o plates_data.jsonl con --stream)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Leer por bloques y escribir JSON Lines con memoria acotada")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Filas por bloque en modo streaming")
+    parser.add_argument('--encoding', default='utf-8', help="Codificación del CSV en modo streaming")
+    parser.add_argument('--no-validate', action='store_true',
+                        help="No descartar las placas con formato inválido (modo streaming)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    plates_data = extract_plates_data()
-    print(f"\n✓ Proceso completado. Se extrajeron {len(plates_data)} placas.")
+    args = parse_args()
+    output_file = args.output or ('plates_data.jsonl' if args.stream else 'plates_data.json')
+    if args.stream and output_file.endswith('.json'):
+        output_file += 'l'
+        print(f"⚠️  El modo por bloques escribe JSON Lines: la salida será {output_file}")
+    if args.stream or output_file.endswith(('.jsonl', '.db', '.sqlite', '.sqlite3')):
+        stats = extract_plates_stream(args.input, output_file, args.chunksize,
+                                      validate=not args.no_validate, encoding=args.encoding)
+        print(f"\n✓ Proceso completado. Se extrajeron {stats['written']:,} placas.")
+    else:
+        plates_data = extract_plates_data(args.input, output_file)
+        print(f"\n✓ Proceso completado. Se extrajeron {len(plates_data)} placas.")
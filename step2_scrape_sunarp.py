@@ -3,57 +3,452 @@ Script para hacer scraping de consulta vehicular en SUNARP.
 Consulta cada placa y guarda la imagen con los resultados.
 
 Características:
-- Delay de 10 segundos entre consultas
+- Esperas por eventos de la página (formulario listo, red inactiva, imagen
+  cargada) en lugar de pausas fijas, con tiempos por etapa
+- Límite de cortesía de una consulta cada 10 segundos (configurable)
+- Varios navegadores en paralelo (--browsers) con un solo límite de cortesía
+  global, para que la espera del operador en el CAPTCHA de una ventana se
+  solape con la carga de la página en las otras
+- Perfil liviano opcional (headless, sin fuentes ni medios, carga "eager") y
+  reutilización de la página entre placas sin volver a cargarla
 - Resolución manual de CAPTCHA por defecto
 - Opción para usar LLM con visión (requiere API key)
-- Guarda imágenes de resultados en carpeta output_images
+- Guarda la imagen de resultado tal como la sirve la página (sin capturas de
+  pantalla) en la carpeta output_images
 """
 import json
 import time
 import os
+import argparse
+import queue
+import threading
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from PIL import Image
 import base64
+import urllib.parse
+from job_state import JobState
+from step1_extract_plates import load_plates
+from plate_store import PlateStore, is_store_file
 
 # Configuración
+# URL base del sitio; se puede apuntar a la réplica local
+# (sunarp_replay_server.py) con --base-url o la variable SUNARP_BASE_URL
+SUNARP_SITE_URL = "https://consultavehicular.sunarp.gob.pe"
+SUNARP_BASE_URL = os.environ.get('SUNARP_BASE_URL', SUNARP_SITE_URL)
+CONSULTA_PATH = "/consulta-vehicular/inicio"
 USE_LLM_FOR_CAPTCHA = False  # Por defecto manual
 LLM_API_KEY = ""  # Agregar tu API key aquí si quieres usar LLM
 
-def setup_driver():
-    """Configura y retorna el driver de Selenium"""
+# Modo interactivo: esperar ENTER para el CAPTCHA y para el clic manual.
+# En modo desatendido (run_all.py --batch, --non-interactive) no se espera a
+# nadie: si la consulta no obtiene el resultado, la placa queda como fallida
+# y se reintenta en la siguiente ejecución. Contra el sitio real no hay quién
+# resuelva el CAPTCHA (ver unattended_captcha_available), así que el modo
+# desatendido solo consulta la réplica local.
+INTERACTIVE = True
+
+# Política de reintentos para las placas que fallaron (*_ERROR.png o sin imagen
+# de resultado): se reintentan hasta MAX_SCRAPE_ATTEMPTS intentos en total, y
+# solo si pasaron RETRY_AFTER_MINUTES desde el último fallo
+RETRY_FAILED = True
+MAX_SCRAPE_ATTEMPTS = 3
+RETRY_AFTER_MINUTES = 30
+
+# Límite de cortesía con el sitio: segundos mínimos entre el inicio de dos
+# consultas consecutivas (independiente de lo que tarde cada consulta)
+REQUEST_INTERVAL_SECONDS = 10
+
+# Imagen de resultado: 'download' guarda los bytes originales de la imagen
+# (src data: o descarga con la sesión del navegador); 'screenshot' la captura
+# como elemento (recodificada). Si la descarga falla se usa la captura.
+RESULT_IMAGE_MODE = 'download'
+RESULT_IMAGE_MODES = ['download', 'screenshot']
+
+# Guardar también la captura completa de la página en cada consulta (por
+# defecto solo se guarda cuando no se pudo obtener la imagen de resultado)
+SAVE_PAGE_SCREENSHOT = False
+
+# Formatos que el paso 3 (cv2.imread) lee sin importar la extensión del archivo
+IMAGE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff')
+
+# Obtiene la imagen como data URI: el src si ya lo es, o descargándola con
+# fetch desde la página (mismas cookies y sesión; también sirve para blob:)
+FETCH_IMAGE_SCRIPT = """
+var img = arguments[0], done = arguments[arguments.length - 1];
+var src = img.currentSrc || img.src;
+if (!src) { done(null); return; }
+if (src.startsWith('data:')) { done(src); return; }
+fetch(src, {credentials: 'include'})
+    .then(function (response) {
+        if (!response.ok) { throw new Error('HTTP ' + response.status); }
+        return response.blob();
+    })
+    .then(function (blob) {
+        var reader = new FileReader();
+        reader.onload = function () { done(reader.result); };
+        reader.onerror = function () { done(null); };
+        reader.readAsDataURL(blob);
+    })
+    .catch(function () { done(null); });
+"""
+
+# Perfil del navegador: 'default' (Chrome normal, con ventana) o 'light'
+# (headless, bloquea fuentes, medios y analítica, y no espera a los recursos
+# secundarios al cargar la página)
+SCRAPE_PROFILE = 'default'
+SCRAPE_PROFILES = ['default', 'light']
+
+# Recursos bloqueados en el perfil liviano (patrones de Network.setBlockedURLs).
+# Las imágenes no se bloquean: el CAPTCHA y el resultado son imágenes.
+BLOCKED_URL_PATTERNS = [
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mp3', '*.ogg',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*hotjar.com*',
+]
+
+# Reutilizar la página entre placas: si el formulario sigue en pantalla se
+# limpia y se vuelve a usar en lugar de recargar la aplicación completa
+REUSE_PAGE = True
+
+# Ruta del chromedriver resuelta por webdriver_manager, guardada para no
+# consultar la versión por red en cada ejecución. La variable de entorno
+# CHROMEDRIVER_PATH tiene prioridad.
+DRIVER_CACHE_FILE = '.chromedriver_path'
+
+# Navegadores en paralelo (cada uno con su ventana y su CAPTCHA). El límite de
+# cortesía es global: más navegadores no aumentan las consultas por segundo,
+# solo solapan las esperas (operador, carga de la página).
+BROWSER_WORKERS = 1
+
+# La consola es una sola: los navegadores piden el CAPTCHA de a uno
+CONSOLE_LOCK = threading.Lock()
+
+# Tiempos máximos de espera (segundos). Son límites, no pausas: cada espera
+# termina en cuanto se cumple su condición.
+FORM_TIMEOUT = 15        # Formulario listo (#nroPlaca)
+RESULT_TIMEOUT = 20      # Imagen de resultado presente y decodificada
+NETWORK_IDLE_TIMEOUT = 5 # Red inactiva tras cargar la página
+NETWORK_IDLE_SECONDS = 0.5  # Tiempo sin nuevas peticiones para considerar la red inactiva
+
+class ScrapeTimings:
+    """
+    Acumula el tiempo por etapa de las consultas (mismo formato que PreprocessStats)
+    
+    Se puede compartir entre los hilos de scrape_plates_parallel.
+    """
+    
+    def __init__(self):
+        self.stages = {}
+        self.plates = []
+        self._lock = threading.Lock()
+    
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+    
+    @contextmanager
+    def step(self, stage):
+        """Mide el bloque como una etapa (también si lanza una excepción)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+    
+    def add_plate(self, seconds):
+        """Registra la latencia total de una consulta"""
+        with self._lock:
+            self.plates.append(seconds)
+    
+    def report(self):
+        """Muestra el resumen por etapa y la latencia por placa"""
+        if not self.stages:
+            return
+        print("\n⏱️  Tiempo por etapa de la consulta:")
+        print(f"   {'Etapa':<22}{'Llamadas':>10}{'Tiempo (s)':>12}{'s/llamada':>12}")
+        for stage, (seconds, calls) in self.stages.items():
+            print(f"   {stage:<22}{calls:>10}{seconds:>12.2f}{seconds / calls:>12.2f}")
+        if self.plates:
+            ordered = sorted(self.plates)
+            print(f"   Latencia por placa: media {sum(ordered) / len(ordered):.2f} s, "
+                  f"mediana {ordered[len(ordered) // 2]:.2f} s, máxima {ordered[-1]:.2f} s")
+
+class RateLimiter:
+    """
+    Límite de cortesía: asegura un intervalo mínimo entre el inicio de dos consultas
+    
+    Es seguro entre hilos: cada llamada a wait() reserva el siguiente turno
+    libre, así que con varios navegadores el total sigue siendo como máximo
+    una consulta por intervalo.
+    
+    Args:
+        interval: Segundos mínimos entre consultas
+    """
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = None
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Espera (si hace falta) hasta que se pueda iniciar la siguiente consulta"""
+        with self._lock:
+            now = time.monotonic()
+            slot = now if self._next is None else max(now, self._next)
+            self._next = slot + self.interval
+        
+        remaining = slot - now
+        if remaining > 0:
+            print(f"\n⏳ Esperando {remaining:.1f} segundos antes de la siguiente consulta...")
+            time.sleep(remaining)
+
+def wait_for_document_ready(driver, timeout=None):
+    """
+    Espera a que el documento esté analizado: document.readyState es
+    'interactive' o 'complete' (no se exige 'complete')
+    
+    Con el HTML analizado basta: después se espera a que #nroPlaca sea
+    clickeable y a que la red quede inactiva antes del CAPTCHA, lo que ya
+    cubre las imágenes, fuentes y scripts que 'complete' esperaría. Es además
+    lo que hace el perfil liviano (carga 'eager', con las fuentes bloqueadas).
+    """
+    WebDriverWait(driver, timeout or FORM_TIMEOUT).until(
+        lambda d: d.execute_script("return document.readyState") != 'loading'
+    )
+
+def wait_for_network_idle(driver, timeout=None, idle_seconds=None):
+    """
+    Espera a que la página deje de pedir recursos durante idle_seconds
+    
+    Se usa la Resource Timing API del navegador: la red se considera inactiva
+    cuando el número de recursos cargados no cambia durante idle_seconds. Si
+    no se alcanza en timeout, se continúa sin error (la página puede tener
+    peticiones periódicas).
+    
+    Args:
+        driver: Instancia del WebDriver
+        timeout: Tiempo máximo de espera (por defecto NETWORK_IDLE_TIMEOUT)
+        idle_seconds: Tiempo sin nuevas peticiones (por defecto NETWORK_IDLE_SECONDS)
+        
+    Returns:
+        True si la red quedó inactiva antes del timeout
+    """
+    timeout = timeout or NETWORK_IDLE_TIMEOUT
+    idle_seconds = idle_seconds or NETWORK_IDLE_SECONDS
+    state = {'count': -1, 'since': time.monotonic()}
+    
+    def idle(d):
+        count = d.execute_script("return performance.getEntriesByType('resource').length")
+        now = time.monotonic()
+        if count != state['count']:
+            state['count'] = count
+            state['since'] = now
+            return False
+        return now - state['since'] >= idle_seconds
+    
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(idle)
+        return True
+    except TimeoutException:
+        return False
+
+def decode_data_uri(uri):
+    """
+    Decodifica un data URI (data:[tipo][;base64],datos)
+    
+    Returns:
+        Bytes del contenido, o None si no es un data URI válido
+    """
+    if not uri or not uri.startswith('data:') or ',' not in uri:
+        return None
+    header, data = uri.split(',', 1)
+    try:
+        if header.endswith(';base64'):
+            return base64.b64decode(data)
+        return urllib.parse.unquote_to_bytes(data)
+    except ValueError:
+        return None
+
+def download_result_image(driver, element, path):
+    """
+    Guarda los bytes originales de la imagen de resultado (sin recodificar)
+    
+    Args:
+        driver: Instancia del WebDriver
+        element: Elemento <img> del resultado
+        path: Ruta del archivo a escribir
+        
+    Returns:
+        True si se guardó la imagen; False si no se pudo obtener o no es PNG/JPEG
+    """
+    data = decode_data_uri(driver.execute_async_script(FETCH_IMAGE_SCRIPT, element))
+    if not data or not data.startswith(IMAGE_SIGNATURES):
+        return False
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+def resolve_driver_path():
+    """
+    Retorna la ruta del chromedriver sin consultar la red si ya se resolvió antes
+    
+    Orden: variable de entorno CHROMEDRIVER_PATH, ruta guardada en
+    DRIVER_CACHE_FILE (si el archivo sigue existiendo) y, por último,
+    ChromeDriverManager().install(), cuya ruta se guarda para las siguientes
+    ejecuciones.
+    """
+    path = os.environ.get('CHROMEDRIVER_PATH')
+    if path:
+        return path
+    
+    if os.path.exists(DRIVER_CACHE_FILE):
+        with open(DRIVER_CACHE_FILE, 'r', encoding='utf-8') as f:
+            path = f.read().strip()
+        if path and os.path.exists(path):
+            return path
+    
+    path = ChromeDriverManager().install()
+    with open(DRIVER_CACHE_FILE, 'w', encoding='utf-8') as f:
+        f.write(path)
+    return path
+
+def setup_driver(headless=False, profile=None):
+    """
+    Configura y retorna el driver de Selenium
+    
+    Args:
+        headless: Si debe ejecutar Chrome sin ventana (nodos sin pantalla)
+        profile: Perfil del navegador (ver SCRAPE_PROFILES); por defecto SCRAPE_PROFILE
+    """
+    profile = profile or SCRAPE_PROFILE
     chrome_options = Options()
-    # chrome_options.add_argument('--headless')  # Comentado para ver el navegador
+    if headless or profile == 'light':
+        chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--no-sandbox')
     chrome_options.add_argument('--disable-dev-shm-usage')
     chrome_options.add_argument('--window-size=1920,1080')
     
-    service = Service(ChromeDriverManager().install())
+    if profile == 'light':
+        # driver.get retorna con el DOM listo, sin esperar imágenes ni fuentes
+        chrome_options.page_load_strategy = 'eager'
+        for argument in ['--disable-gpu', '--disable-extensions', '--mute-audio',
+                         '--no-first-run', '--disable-background-networking',
+                         '--disable-component-update', '--disable-sync',
+                         '--disable-features=Translate,MediaRouter,OptimizationHints']:
+            chrome_options.add_argument(argument)
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.notifications': 2,
+            'profile.managed_default_content_settings.geolocation': 2,
+        })
+    
+    service = Service(resolve_driver_path())
     driver = webdriver.Chrome(service=service, options=chrome_options)
+    
+    if profile == 'light':
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
     return driver
 
-def solve_captcha_manual(driver):
+def consulta_url():
+    """Retorna la URL de la página de consulta según SUNARP_BASE_URL"""
+    return SUNARP_BASE_URL.rstrip('/') + CONSULTA_PATH
+
+def find_reusable_form(driver):
     """
-    Espera a que el usuario resuelva el CAPTCHA manualmente
+    Retorna el campo de placa si la página del sitio sigue cargada y lo muestra
+    
+    Returns:
+        Elemento #nroPlaca, o None si hay que volver a cargar la página
     """
-    print("\n" + "="*60)
-    print("⚠️  CAPTCHA DETECTADO - RESOLUCIÓN MANUAL REQUERIDA")
-    print("="*60)
-    print("Por favor:")
-    print("1. Resuelve el CAPTCHA en la ventana del navegador")
-    print("2. Presiona ENTER aquí cuando hayas completado el CAPTCHA")
-    print("="*60)
+    try:
+        if urllib.parse.urlsplit(driver.current_url).netloc != urllib.parse.urlsplit(consulta_url()).netloc:
+            return None
+        inputs = driver.find_elements(By.ID, "nroPlaca")
+        if inputs and inputs[0].is_displayed() and inputs[0].is_enabled():
+            return inputs[0]
+    except Exception:
+        pass
+    return None
+
+def result_image_ready(previous, previous_src):
+    """
+    Condición de WebDriverWait: imagen de resultado nueva y decodificada
     
-    input("Presiona ENTER después de resolver el CAPTCHA...")
-    print("✓ Continuando con la consulta...")
+    Al reutilizar la página, la imagen de la placa anterior puede seguir en el
+    DOM; solo cuenta una imagen distinta (otro elemento u otro src).
     
-    # Dar tiempo adicional para que se procese
-    time.sleep(2)
+    Args:
+        previous: Elemento <img> del resultado anterior (o None)
+        previous_src: src del resultado anterior (o None)
+    """
+    def condition(driver):
+        images = driver.find_elements(By.CSS_SELECTOR, "div.container-data-vehiculo img")
+        if not images:
+            return False
+        image = images[0]
+        try:
+            if previous is not None and image == previous and image.get_attribute('src') == previous_src:
+                return False
+            if driver.execute_script("return arguments[0].complete && arguments[0].naturalWidth > 0", image):
+                return image
+        except StaleElementReferenceException:
+            pass
+        return False
+    return condition
+
+def browser_label(plate_number=None):
+    """Identifica la ventana (con varios navegadores) y la placa en los mensajes al operador"""
+    thread = threading.current_thread()
+    label = f"placa {plate_number}" if plate_number else ""
+    if thread is not threading.main_thread():
+        label = f"{thread.name}, {label}" if label else thread.name
+    return label
+
+def unattended_captcha_available():
+    """
+    Indica si las consultas pueden pasar el CAPTCHA sin operador: solo contra
+    la réplica local (cualquier URL base distinta del sitio real), cuyo CAPTCHA
+    simulado no requiere respuesta
+    
+    solve_captcha_llm no cuenta: no está implementado y recurre al modo
+    manual, que sin operador no resuelve nada.
+    """
+    return SUNARP_BASE_URL.rstrip('/') != SUNARP_SITE_URL
+
+def solve_captcha_manual(driver, plate_number=None):
+    """
+    Espera a que el usuario resuelva el CAPTCHA manualmente
+    
+    Con varios navegadores, los CAPTCHA se piden de a uno (CONSOLE_LOCK) y
+    el mensaje indica la ventana y la placa.
+    """
+    if not INTERACTIVE:
+        print("⚠️  Modo desatendido: se continúa sin esperar la resolución del CAPTCHA")
+        return
+    
+    with CONSOLE_LOCK:
+        label = browser_label(plate_number)
+        print("\n" + "="*60)
+        print("⚠️  CAPTCHA DETECTADO - RESOLUCIÓN MANUAL REQUERIDA" + (f" ({label})" if label else ""))
+        print("="*60)
+        print("Por favor:")
+        print("1. Resuelve el CAPTCHA en la ventana del navegador")
+        print("2. Presiona ENTER aquí cuando hayas completado el CAPTCHA")
+        print("="*60)
+        
+        input("Presiona ENTER después de resolver el CAPTCHA...")
+        print("✓ Continuando con la consulta...")
 
 def solve_captcha_llm(driver, api_key):
     """
@@ -102,65 +497,97 @@ def solve_captcha_llm(driver, api_key):
     print("    Cayendo a modo manual...")
     solve_captcha_manual(driver)
 
-def scrape_plate(driver, plate_number, output_folder='output_images'):
+def scrape_plate(driver, plate_number, output_folder='output_images', timings=None, reuse_page=False,
+                 rate_limiter=None):
     """
     Realiza el scraping para una placa específica
     
+    Cada paso espera a que la página esté lista (formulario, red inactiva,
+    botón habilitado, imagen decodificada) en lugar de pausas fijas.
+    
     Args:
         driver: Instancia del WebDriver
         plate_number: Número de placa a consultar
         output_folder: Carpeta donde guardar las imágenes
+        timings: ScrapeTimings opcional donde acumular el tiempo por etapa
+        reuse_page: Si el formulario de la consulta anterior sigue en pantalla,
+            limpiarlo y reutilizarlo en lugar de recargar la página
+        rate_limiter: RateLimiter opcional; se espera el turno justo antes de
+            enviar la consulta (clic en el botón), no antes de cargar la página
     """
-    url = "https://consultavehicular.sunarp.gob.pe/consulta-vehicular/inicio"
+    if timings is None:
+        timings = ScrapeTimings()
     
     print(f"\n{'='*60}")
     print(f"Consultando placa: {plate_number}")
     print(f"{'='*60}")
     
     try:
-        # Navegar a la página
-        driver.get(url)
-        print("✓ Página cargada")
+        plate_input = find_reusable_form(driver) if reuse_page else None
         
-        # Esperar a que cargue el formulario
-        wait = WebDriverWait(driver, 15)
-        
-        # Esperar un momento para que cargue completamente
-        time.sleep(2)
-        
-        # Buscar el campo de entrada de placa
-        print("⚙️  Buscando campo de placa...")
-        try:
-            plate_input = wait.until(
-                EC.presence_of_element_located((By.ID, "nroPlaca"))
-            )
-            print(f"✓ Campo de placa encontrado")
-        except Exception as e:
-            print(f"❌ No se encontró el campo de placa con ID 'nroPlaca': {str(e)}")
-            raise
+        # Resultado anterior que puede seguir en el DOM (ver result_image_ready)
+        previous_result = previous_src = None
+        if plate_input is not None:
+            previous = driver.find_elements(By.CSS_SELECTOR, "div.container-data-vehiculo img")
+            if previous:
+                previous_result = previous[0]
+                previous_src = previous_result.get_attribute('src')
+            print("✓ Formulario reutilizado (sin recargar la página)")
+        else:
+            # Navegar a la página
+            with timings.step('cargar_pagina'):
+                driver.get(consulta_url())
+                wait_for_document_ready(driver)
+            print("✓ Página cargada")
+            
+            # Esperar a que cargue el formulario
+            wait = WebDriverWait(driver, FORM_TIMEOUT)
+            
+            # Buscar el campo de entrada de placa
+            print("⚙️  Buscando campo de placa...")
+            try:
+                with timings.step('formulario'):
+                    plate_input = wait.until(
+                        EC.element_to_be_clickable((By.ID, "nroPlaca"))
+                    )
+                print(f"✓ Campo de placa encontrado")
+            except Exception as e:
+                print(f"❌ No se encontró el campo de placa con ID 'nroPlaca': {str(e)}")
+                raise
         
         # Limpiar e ingresar la placa
         plate_input.clear()
         plate_input.send_keys(plate_number)
         print(f"✓ Placa ingresada: {plate_number}")
         
-        # Pequeña pausa antes del CAPTCHA
-        time.sleep(1)
+        # El CAPTCHA se carga aparte: esperar a que la red quede inactiva
+        with timings.step('red_inactiva'):
+            wait_for_network_idle(driver)
         
-        # Manejar CAPTCHA
-        if USE_LLM_FOR_CAPTCHA and LLM_API_KEY:
-            solve_captcha_llm(driver, LLM_API_KEY)
-        else:
-            solve_captcha_manual(driver)
+        # Manejar CAPTCHA (tiempo del operador, se mide aparte)
+        with timings.step('captcha'):
+            if USE_LLM_FOR_CAPTCHA and LLM_API_KEY:
+                solve_captcha_llm(driver, LLM_API_KEY)
+            else:
+                solve_captcha_manual(driver, plate_number)
         
         # Buscar y hacer clic en el botón de búsqueda/consulta
         print("⚙️  Buscando botón de búsqueda...")
         
         try:
-            # Buscar el botón dentro del div con clase button-login
-            search_button = driver.find_element(By.CSS_SELECTOR, "div.button-login button")
+            # Buscar el botón dentro del div con clase button-login (habilitado
+            # una vez que la página procesó el CAPTCHA)
+            with timings.step('boton'):
+                search_button = WebDriverWait(driver, FORM_TIMEOUT).until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, "div.button-login button"))
+                )
             print(f"✓ Botón encontrado")
             
+            # El clic es la consulta al sitio: aquí se aplica el límite de cortesía
+            if rate_limiter is not None:
+                with timings.step('cortesia'):
+                    rate_limiter.wait()
+            
             # Hacer clic en el botón
             try:
                 search_button.click()
@@ -173,53 +600,66 @@ def scrape_plate(driver, plate_number, output_folder='output_images'):
                 
         except Exception as e:
             print(f"❌ No se encontró el botón de búsqueda: {str(e)}")
-            print("⚠️  Por favor, haz clic manualmente en el botón de búsqueda")
-            input("Presiona ENTER después de hacer clic en 'Buscar' o 'Consultar'...")
+            if not INTERACTIVE:
+                raise
+            if rate_limiter is not None:
+                with timings.step('cortesia'):
+                    rate_limiter.wait()
+            with CONSOLE_LOCK:
+                print(f"⚠️  Por favor, haz clic manualmente en el botón de búsqueda ({browser_label(plate_number)})")
+                input("Presiona ENTER después de hacer clic en 'Buscar' o 'Consultar'...")
         
-        # Esperar a que se procese la búsqueda
+        # Esperar a que cargue el resultado (imagen dentro del div
+        # container-data-vehiculo) y a que el navegador la decodifique
         print("⏳ Esperando resultados...")
-        time.sleep(3)
-        
-        # Esperar a que cargue el resultado (imagen dentro del div container-data-vehiculo)
         try:
-            result_element = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div.container-data-vehiculo img"))
-            )
+            with timings.step('resultado'):
+                WebDriverWait(driver, RESULT_TIMEOUT, poll_frequency=0.1).until(
+                    result_image_ready(previous_result, previous_src)
+                )
             print(f"✓ Resultado cargado (imagen encontrada)")
         except Exception as e:
+            if previous_result is not None:
+                # La imagen que sigue en el DOM es la de la placa anterior: no
+                # se guarda como resultado de esta placa (la siguiente recarga)
+                print(f"❌ No llegó el resultado de la placa {plate_number} (página reutilizada)")
+                raise
             print(f"⚠️  No se detectó la imagen de resultado: {str(e)}")
             print("    Continuando de todas formas...")
         
-        # Esperar adicional para que se cargue completamente la imagen
-        time.sleep(2)
-        
         # Crear carpeta de salida si no existe
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
             print(f"✓ Carpeta creada: {output_folder}")
         
-        # Verificar que hay contenido visible antes de capturar
-        print("⚙️  Preparando captura de pantalla...")
-        
-        # Scroll para asegurar que todo el contenido esté visible
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
-        
-        # Guardar screenshot completo de la página
-        screenshot_path = os.path.join(output_folder, f"{plate_number}.png")
-        driver.save_screenshot(screenshot_path)
-        print(f"✓ Screenshot completo guardado: {screenshot_path}")
+        saved = False
+        with timings.step('imagen'):
+            result_path = os.path.join(output_folder, f"{plate_number}_resultado.png")
+            try:
+                # Buscar la imagen dentro del div con clase container-data-vehiculo
+                result_img = driver.find_element(By.CSS_SELECTOR, "div.container-data-vehiculo img")
+                if RESULT_IMAGE_MODE == 'download':
+                    saved = download_result_image(driver, result_img, result_path)
+                    if saved:
+                        print(f"✓ Imagen de resultado descargada: {result_path}")
+                    else:
+                        print("⚠️  No se pudo descargar la imagen, se captura el elemento")
+                if not saved:
+                    result_img.screenshot(result_path)
+                    saved = True
+                    print(f"✓ Screenshot de resultado guardado: {result_path}")
+            except Exception as e:
+                print(f"⚠️  No se pudo obtener la imagen del resultado: {str(e)}")
         
-        # Capturar la imagen del resultado desde el div container-data-vehiculo
-        try:
-            # Buscar la imagen dentro del div con clase container-data-vehiculo
-            result_img = driver.find_element(By.CSS_SELECTOR, "div.container-data-vehiculo img")
-            result_screenshot_path = os.path.join(output_folder, f"{plate_number}_resultado.png")
-            result_img.screenshot(result_screenshot_path)
-            print(f"✓ Screenshot de resultado guardado: {result_screenshot_path}")
-        except Exception as e:
-            print(f"⚠️  No se pudo capturar la imagen del resultado: {str(e)}")
-            print("    Se usará el screenshot completo para el OCR")
+        # Captura completa de la página solo si falta la imagen de resultado
+        # (para revisar qué mostró el sitio) o si se pidió expresamente
+        if not saved or SAVE_PAGE_SCREENSHOT:
+            with timings.step('captura_pagina'):
+                # Scroll para asegurar que todo el contenido esté visible (síncrono)
+                driver.execute_script("window.scrollTo(0, 0);")
+                screenshot_path = os.path.join(output_folder, f"{plate_number}.png")
+                driver.save_screenshot(screenshot_path)
+                print(f"✓ Screenshot completo guardado: {screenshot_path}")
         
         return True
         
@@ -234,24 +674,414 @@ def scrape_plate(driver, plate_number, output_folder='output_images'):
             pass
         return False
 
+def normalize_plate(plate):
+    """Normaliza el número de placa para comparar (sin espacios, en mayúsculas)"""
+    return str(plate).strip().upper()
+
+def dedupe_plates(plates_data):
+    """
+    Elimina las placas repetidas del archivo de entrada (se conserva la primera)
+    
+    Args:
+        plates_data: Lista de registros de plates_data.json
+        
+    Returns:
+        Lista sin placas vacías ni repetidas
+    """
+    seen = set()
+    unique = []
+    for plate_data in plates_data:
+        plate = normalize_plate(plate_data.get('PLACA', ''))
+        if not plate or plate in seen:
+            continue
+        seen.add(plate)
+        unique.append(dict(plate_data, PLACA=plate))
+    return unique
+
+def build_scrape_index(output_folder='output_images'):
+    """
+    Indexa las placas ya consultadas a partir de las imágenes guardadas
+    
+    Args:
+        output_folder: Carpeta de las imágenes
+        
+    Returns:
+        Tupla (completadas, fallidas): conjunto de placas con *_resultado.png y
+        diccionario {placa: fecha del último fallo} de las que solo tienen
+        *_ERROR.png o la captura completa sin imagen de resultado
+    """
+    completed = set()
+    failed = {}
+    
+    if not os.path.exists(output_folder):
+        return completed, failed
+    
+    for entry in os.scandir(output_folder):
+        name = entry.name
+        if not name.lower().endswith('.png'):
+            continue
+        stem = name[:-4]
+        if stem.endswith('_resultado'):
+            completed.add(stem[:-len('_resultado')])
+        elif stem.endswith('_ERROR'):
+            plate = stem[:-len('_ERROR')]
+            failed[plate] = max(failed.get(plate, 0), entry.stat().st_mtime)
+        else:
+            failed.setdefault(stem, entry.stat().st_mtime)
+    
+    for plate in completed:
+        failed.pop(plate, None)
+    
+    return completed, failed
+
+def select_pending(plates_data, output_folder='output_images', state=None, limit=None):
+    """
+    Selecciona las placas que faltan consultar según la política de reintentos
+    
+    Args:
+        plates_data: Iterable de registros sin repetidos (ver dedupe_plates),
+            por ejemplo PlateStore.iter_plates
+        output_folder: Carpeta de las imágenes
+        state: JobState o PlateStore opcional con el número de intentos por
+            placa (sin él, cada placa fallida cuenta como un intento)
+        limit: Dejar de recorrer plates_data al juntar este número de
+            pendientes (el resumen cuenta solo lo recorrido)
+        
+    Returns:
+        Tupla (pendientes, resumen) donde resumen cuenta las placas
+        completadas, a reintentar, en espera y descartadas
+    """
+    completed, failed = build_scrape_index(output_folder)
+    now = time.time()
+    summary = {'completed': 0, 'new': 0, 'retry': 0, 'waiting': 0, 'exhausted': 0}
+    pending = []
+    
+    for plate_data in plates_data:
+        plate = plate_data['PLACA']
+        if plate in completed:
+            summary['completed'] += 1
+            continue
+        
+        last_failure = failed.get(plate)
+        attempts = 0
+        entry = state.entry(plate, 'scraped') if state is not None else None
+        if entry and entry['status'] == 'error':
+            attempts = entry['attempts']
+            last_failure = max(last_failure or 0, entry['time'])
+        elif last_failure is not None:
+            attempts = 1
+        
+        if last_failure is None:
+            summary['new'] += 1
+        elif not RETRY_FAILED or attempts >= MAX_SCRAPE_ATTEMPTS:
+            summary['exhausted'] += 1
+            continue
+        elif now - last_failure < RETRY_AFTER_MINUTES * 60:
+            summary['waiting'] += 1
+            continue
+        else:
+            summary['retry'] += 1
+        pending.append(plate_data)
+        if limit is not None and len(pending) >= limit:
+            break
+    
+    return pending, summary
+
+def finish_plate(plate_number, success, output_folder, on_result=None, on_error=None):
+    """
+    Registra el resultado de una consulta: limpia la captura de error anterior
+    y llama a on_result u on_error
+    
+    Returns:
+        True si se guardó la imagen de resultado
+    """
+    result_path = os.path.join(output_folder, f"{plate_number}_resultado.png")
+    if success and os.path.exists(result_path):
+        # Un reintento exitoso reemplaza la captura de error anterior
+        error_path = os.path.join(output_folder, f"{plate_number}_ERROR.png")
+        if os.path.exists(error_path):
+            os.remove(error_path)
+        if on_result:
+            on_result(result_path)
+        return True
+    if on_error:
+        on_error(plate_number)
+    return False
+
+def scrape_plates(driver, plates_data, output_folder='output_images', on_result=None, on_error=None,
+                  rate_limiter=None, timings=None):
+    """
+    Consulta una lista de placas, respetando el límite de cortesía entre consultas
+    
+    Args:
+        driver: Instancia del WebDriver
+        plates_data: Lista de registros de plates_data.json
+        output_folder: Carpeta donde guardar las imágenes
+        on_result: Función llamada con la ruta de cada *_resultado.png en cuanto
+            se guarda (por ejemplo, para encolarla al OCR del pipeline)
+        on_error: Función llamada con el número de placa cuando la consulta
+            falla o no se pudo capturar la imagen de resultado
+        rate_limiter: RateLimiter a usar (por defecto, uno nuevo con
+            REQUEST_INTERVAL_SECONDS)
+        timings: ScrapeTimings donde acumular los tiempos (por defecto, uno
+            nuevo que se muestra al terminar)
+        
+    Returns:
+        Tupla (exitosas, fallidas)
+    """
+    successful = 0
+    failed = 0
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(REQUEST_INTERVAL_SECONDS)
+    report = timings is None
+    if timings is None:
+        timings = ScrapeTimings()
+    # Tras un error se recarga la página en la siguiente consulta
+    reuse_page = False
+    
+    for idx, plate_data in enumerate(plates_data, 1):
+        plate_number = plate_data.get('PLACA', '')
+        
+        if not plate_number:
+            print(f"\n⚠️  Registro {idx}: Placa vacía, saltando...")
+            continue
+        
+        print(f"\n[{idx}/{len(plates_data)}] Procesando placa: {plate_number}")
+        print(f"   RUC: {plate_data.get('RUC', 'N/A')}")
+        print(f"   Marca: {plate_data.get('MARCA', 'N/A')}")
+        print(f"   Año: {plate_data.get('ANIO_FAB', 'N/A')}")
+        
+        # Realizar scraping (el límite de cortesía se aplica al enviar la consulta)
+        start = time.perf_counter()
+        success = scrape_plate(driver, plate_number, output_folder, timings, reuse_page, rate_limiter)
+        reuse_page = REUSE_PAGE and success
+        elapsed = time.perf_counter() - start
+        timings.add_plate(elapsed)
+        print(f"⏱️  Consulta de {plate_number}: {elapsed:.1f} s")
+        
+        if success:
+            successful += 1
+        else:
+            failed += 1
+        finish_plate(plate_number, success, output_folder, on_result, on_error)
+    
+    if report:
+        timings.report()
+    return successful, failed
+
+def scrape_plates_parallel(plates_data, output_folder='output_images', workers=2, on_result=None,
+                           on_error=None, rate_limiter=None, timings=None, headless=False, profile=None):
+    """
+    Consulta una lista de placas con varios navegadores a la vez
+    
+    Cada hilo abre su propio navegador (setup_driver) y toma placas de una
+    cola compartida. Todos pasan por el mismo RateLimiter justo antes de
+    enviar la consulta (después del CAPTCHA), así que el ritmo total de
+    consultas al sitio no supera una cada REQUEST_INTERVAL_SECONDS;
+    lo que se gana es que, mientras el operador resuelve el CAPTCHA de una
+    ventana, las demás ya cargaron la página y llenaron el formulario.
+    
+    Args:
+        plates_data: Lista de registros de plates_data.json
+        output_folder: Carpeta donde guardar las imágenes
+        workers: Número de navegadores
+        on_result: Igual que en scrape_plates (se llama de a un hilo a la vez)
+        on_error: Igual que en scrape_plates (se llama de a un hilo a la vez)
+        rate_limiter: RateLimiter global (por defecto, uno nuevo con
+            REQUEST_INTERVAL_SECONDS)
+        timings: ScrapeTimings compartido (por defecto, uno nuevo que se
+            muestra al terminar)
+        headless: Si los navegadores se ejecutan sin ventana
+        profile: Perfil del navegador (ver SCRAPE_PROFILES)
+        
+    Returns:
+        Tupla (exitosas, fallidas)
+    """
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(REQUEST_INTERVAL_SECONDS)
+    report = timings is None
+    if timings is None:
+        timings = ScrapeTimings()
+    
+    plate_queue = queue.Queue()
+    for idx, plate_data in enumerate(plates_data, 1):
+        plate_queue.put((idx, plate_data))
+    
+    counts = {'successful': 0, 'failed': 0}
+    lock = threading.Lock()
+    
+    # Resolver el chromedriver una sola vez antes de abrir los navegadores
+    resolve_driver_path()
+    
+    def worker(worker_id):
+        try:
+            driver = setup_driver(headless=headless, profile=profile)
+        except Exception as e:
+            print(f"❌ No se pudo iniciar el navegador {worker_id}: {str(e)}")
+            return
+        
+        try:
+            # Ventanas escalonadas para que el operador las distinga
+            driver.set_window_position(60 * (worker_id - 1), 60 * (worker_id - 1))
+        except Exception:
+            pass
+        
+        reuse_page = False
+        try:
+            while True:
+                try:
+                    idx, plate_data = plate_queue.get_nowait()
+                except queue.Empty:
+                    break
+                
+                plate_number = plate_data.get('PLACA', '')
+                if not plate_number:
+                    continue
+                print(f"\n[{idx}/{len(plates_data)}] Procesando placa: {plate_number} ({browser_label()})")
+                
+                start = time.perf_counter()
+                success = scrape_plate(driver, plate_number, output_folder, timings, reuse_page, rate_limiter)
+                reuse_page = REUSE_PAGE and success
+                elapsed = time.perf_counter() - start
+                timings.add_plate(elapsed)
+                print(f"⏱️  Consulta de {plate_number}: {elapsed:.1f} s ({browser_label()})")
+                
+                with lock:
+                    counts['successful' if success else 'failed'] += 1
+                    finish_plate(plate_number, success, output_folder, on_result, on_error)
+        finally:
+            driver.quit()
+    
+    threads = [
+        threading.Thread(target=worker, args=(worker_id,), name=f"navegador-{worker_id}", daemon=True)
+        for worker_id in range(1, min(workers, len(plates_data)) + 1)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    if not plate_queue.empty():
+        print(f"\n⚠️  {plate_queue.qsize()} placas quedaron sin consultar (no hay navegadores activos)")
+    
+    if report:
+        timings.report()
+    return counts['successful'], counts['failed']
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Consulta las placas en SUNARP y guarda las imágenes de resultado")
+    parser.add_argument('--plates-file', default='plates_data.json',
+                        help="Archivo de placas (salida del paso 1: .json, .jsonl o almacén .db)")
+    parser.add_argument('--ruc', default=None, help="Solo las placas de este RUC")
+    parser.add_argument('--marca', default=None, help="Solo las placas de esta marca")
+    parser.add_argument('--output-folder', default='output_images',
+                        help="Carpeta donde guardar las imágenes")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="Número máximo de placas a consultar (sin preguntar)")
+    parser.add_argument('--state-file', default='job_state.jsonl',
+                        help="Archivo de estado por placa (intentos de consulta, compartido con run_all.py --batch; "
+                             "con un almacén .db el estado se guarda en el almacén)")
+    parser.add_argument('--no-retry', action='store_true',
+                        help="No reintentar las placas que fallaron")
+    parser.add_argument('--max-attempts', type=int, default=MAX_SCRAPE_ATTEMPTS,
+                        help="Intentos máximos por placa")
+    parser.add_argument('--retry-after', type=float, default=RETRY_AFTER_MINUTES,
+                        help="Minutos de espera desde el último fallo antes de reintentar")
+    parser.add_argument('--result-image', choices=RESULT_IMAGE_MODES, default=RESULT_IMAGE_MODE,
+                        help="Cómo guardar la imagen de resultado: bytes originales o captura del elemento")
+    parser.add_argument('--page-screenshot', action='store_true',
+                        help="Guardar también la captura completa de la página en cada consulta")
+    parser.add_argument('--base-url', default=SUNARP_BASE_URL,
+                        help="URL base del sitio (por ejemplo, la réplica local http://127.0.0.1:8765)")
+    parser.add_argument('--profile', choices=SCRAPE_PROFILES, default=SCRAPE_PROFILE,
+                        help="Perfil del navegador: normal o liviano (headless, sin fuentes ni medios)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Ejecutar Chrome sin ventana")
+    parser.add_argument('--reload-page', action='store_true',
+                        help="Recargar la página en cada placa en lugar de reutilizar el formulario")
+    parser.add_argument('--browsers', type=int, default=BROWSER_WORKERS,
+                        help="Navegadores en paralelo (comparten el límite de cortesía)")
+    parser.add_argument('--interval', type=float, default=REQUEST_INTERVAL_SECONDS,
+                        help="Segundos mínimos entre el inicio de dos consultas (límite de cortesía)")
+    parser.add_argument('--non-interactive', action='store_true',
+                        help="No esperar ENTER (CAPTCHA, clic manual, número de placas)")
+    return parser.parse_args()
+
 def main():
     """Función principal"""
+    global INTERACTIVE, RETRY_FAILED, MAX_SCRAPE_ATTEMPTS, RETRY_AFTER_MINUTES, REQUEST_INTERVAL_SECONDS
+    global RESULT_IMAGE_MODE, SAVE_PAGE_SCREENSHOT, SCRAPE_PROFILE, REUSE_PAGE, SUNARP_BASE_URL
+    global BROWSER_WORKERS
+    args = parse_args()
+    if args.non_interactive:
+        INTERACTIVE = False
+    RETRY_FAILED = not args.no_retry
+    MAX_SCRAPE_ATTEMPTS = args.max_attempts
+    RETRY_AFTER_MINUTES = args.retry_after
+    REQUEST_INTERVAL_SECONDS = args.interval
+    RESULT_IMAGE_MODE = args.result_image
+    SAVE_PAGE_SCREENSHOT = args.page_screenshot
+    SCRAPE_PROFILE = args.profile
+    REUSE_PAGE = not args.reload_page
+    SUNARP_BASE_URL = args.base_url
+    BROWSER_WORKERS = max(1, args.browsers)
+    
     print("\n" + "="*60)
     print("SUNARP SCRAPER - Consulta Vehicular")
     print("="*60)
     
+    if not INTERACTIVE and not unattended_captcha_available():
+        print("❌ El modo desatendido no puede resolver el CAPTCHA del sitio real")
+        print("   Usa --base-url con la réplica local o ejecuta sin --non-interactive")
+        return
+    
     # Cargar datos de placas
-    plates_file = 'plates_data.json'
+    plates_file = args.plates_file
     
     if not os.path.exists(plates_file):
         print(f"❌ Error: No se encontró el archivo {plates_file}")
         print("   Por favor, ejecuta primero step1_extract_plates.py")
         return
     
-    with open(plates_file, 'r', encoding='utf-8') as f:
-        plates_data = json.load(f)
-    
-    print(f"\n✓ Cargadas {len(plates_data)} placas del archivo")
+    if is_store_file(plates_file):
+        # Almacén indexado: no se carga completo; se recorren por páginas solo
+        # las placas sin consulta exitosa (con los filtros por RUC o marca) y
+        # el estado por placa se guarda en la misma base
+        store = PlateStore(plates_file)
+        state = store
+        total = store.count(ruc=args.ruc, marca=args.marca)
+        pending_in_store = store.count(ruc=args.ruc, marca=args.marca, not_done='scraped')
+        print(f"\n✓ Almacén de placas: {total} placas"
+              + (f" (RUC {args.ruc})" if args.ruc else '') + (f" (marca {args.marca})" if args.marca else ''))
+        plates_data, summary = select_pending(
+            store.iter_plates(ruc=args.ruc, marca=args.marca, not_done='scraped'),
+            args.output_folder, state, limit=args.limit
+        )
+        summary['completed'] += total - pending_in_store
+    else:
+        plates_data = load_plates(plates_file)
+        
+        print(f"\n✓ Cargadas {len(plates_data)} placas del archivo")
+        
+        unique = dedupe_plates(plates_data)
+        if len(unique) < len(plates_data):
+            print(f"✓ {len(plates_data) - len(unique)} placas vacías o repetidas omitidas")
+        if args.ruc or args.marca:
+            unique = [
+                plate_data for plate_data in unique
+                if (not args.ruc or str(plate_data.get('RUC', '')) == args.ruc)
+                and (not args.marca or plate_data.get('MARCA', '') == args.marca)
+            ]
+            print(f"✓ {len(unique)} placas con el filtro de RUC/marca")
+        
+        state = JobState(args.state_file)
+        plates_data, summary = select_pending(unique, args.output_folder, state)
+    print(f"✓ Ya consultadas: {summary['completed']}, nuevas: {summary['new']}, "
+          f"a reintentar: {summary['retry']}")
+    if summary['waiting'] or summary['exhausted']:
+        print(f"   Fallidas en espera ({RETRY_AFTER_MINUTES:g} min): {summary['waiting']}, "
+              f"sin más intentos ({MAX_SCRAPE_ATTEMPTS}): {summary['exhausted']}")
     
     # Configurar modo de CAPTCHA
     if USE_LLM_FOR_CAPTCHA:
@@ -265,55 +1095,56 @@ def main():
         mode = "Manual"
     
     print(f"\n⚙️  Modo de resolución de CAPTCHA: {mode}")
-    print(f"⏱️  Delay entre consultas: 10 segundos")
+    if SCRAPE_PROFILE == 'light' and INTERACTIVE:
+        print("⚠️  El perfil liviano ejecuta Chrome sin ventana: el CAPTCHA no se verá en pantalla")
+    print(f"⏱️  Intervalo mínimo entre consultas: {REQUEST_INTERVAL_SECONDS:g} segundos")
     
     # Preguntar cuántas placas procesar (para testing)
-    try:
-        limit = input(f"\n¿Cuántas placas deseas procesar? (Enter para todas, máximo {len(plates_data)}): ").strip()
-        if limit:
-            limit = int(limit)
-            plates_data = plates_data[:limit]
-    except:
-        pass
+    if args.limit is not None:
+        plates_data = plates_data[:args.limit]
+    elif INTERACTIVE:
+        try:
+            limit = input(f"\n¿Cuántas placas deseas procesar? (Enter para todas, máximo {len(plates_data)}): ").strip()
+            if limit:
+                limit = int(limit)
+                plates_data = plates_data[:limit]
+        except:
+            pass
+    
+    if not plates_data:
+        print("\n✓ No hay placas pendientes de consulta")
+        state.close()
+        return
     
     print(f"\n🚀 Iniciando scraping de {len(plates_data)} placas...")
     
-    # Inicializar driver
-    driver = setup_driver()
+    def on_result(result_path):
+        state.mark(os.path.basename(result_path)[:-len('_resultado.png')], 'scraped', 'ok')
     
-    successful = 0
-    failed = 0
+    def on_error(plate_number):
+        state.mark(plate_number, 'scraped', 'error')
     
-    try:
-        for idx, plate_data in enumerate(plates_data, 1):
-            plate_number = plate_data.get('PLACA', '')
-            
-            if not plate_number:
-                print(f"\n⚠️  Registro {idx}: Placa vacía, saltando...")
-                continue
-            
-            print(f"\n[{idx}/{len(plates_data)}] Procesando placa: {plate_number}")
-            print(f"   RUC: {plate_data.get('RUC', 'N/A')}")
-            print(f"   Marca: {plate_data.get('MARCA', 'N/A')}")
-            print(f"   Año: {plate_data.get('ANIO_FAB', 'N/A')}")
-            
-            # Realizar scraping
-            success = scrape_plate(driver, plate_number)
-            
-            if success:
-                successful += 1
-            else:
-                failed += 1
-            
-            # Delay entre consultas (excepto en la última)
-            if idx < len(plates_data):
-                print(f"\n⏳ Esperando 10 segundos antes de la siguiente consulta...")
-                time.sleep(10)
-    
-    finally:
-        # Cerrar el navegador
-        print("\n🔒 Cerrando navegador...")
-        driver.quit()
+    if BROWSER_WORKERS > 1:
+        print(f"🌐 {BROWSER_WORKERS} navegadores en paralelo")
+        try:
+            successful, failed = scrape_plates_parallel(plates_data, args.output_folder, BROWSER_WORKERS,
+                                                        on_result=on_result, on_error=on_error,
+                                                        headless=args.headless)
+        finally:
+            state.close()
+    else:
+        # Inicializar driver
+        driver = setup_driver(headless=args.headless)
+        
+        try:
+            successful, failed = scrape_plates(driver, plates_data, args.output_folder,
+                                               on_result=on_result, on_error=on_error)
+        
+        finally:
+            state.close()
+            # Cerrar el navegador
+            print("\n🔒 Cerrando navegador...")
+            driver.quit()
     
     # Resumen
     print("\n" + "="*60)
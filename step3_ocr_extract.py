@@ -1,18 +1,229 @@
 """
 Script para extraer información de imágenes usando OCR (EasyOCR).
 Lee las imágenes de la carpeta output_images y extrae la información estructurada.
+
+EasyOCR (torch), OpenCV y numpy se importan solo cuando se necesitan, así que
+--help, --reparse y las ejecuciones que solo usan la caché arrancan de inmediato.
 """
 import os
 import json
-import re
-from PIL import Image
-import easyocr
-import cv2
-import numpy as np
+import argparse
+import itertools
+import time
+import importlib.util
+import multiprocessing
+import ocr_cache
+import layout_template
+import field_profiles
+from vehicle_writers import VehicleDataWriter, consolidate_outputs, output_paths, iter_jsonl
+from vehicle_parser import parse_vehicle_data, reparse_record
+
+# Caché de resultados OCR (evita repetir OCR sobre imágenes que no cambiaron)
+USE_OCR_CACHE = True
+OCR_CACHE_FILE = 'ocr_cache.sqlite'
+OCR_CACHE_MAX_AGE_DAYS = 180  # Eliminar entradas sin uso por más de N días
+OCR_CACHE_MAX_ENTRIES = 500000  # Máximo de entradas en la caché
+
+# Parámetros de reader.readtext para cada pasada de OCR
+# Parámetros ajustados para reconocer texto normal (no solo negrita)
+READTEXT_PARAMS = {
+    'detail': 0,
+    'paragraph': False,  # No agrupar en párrafos, obtener línea por línea
+    'batch_size': 8,
+    'text_threshold': 0.5,  # Umbral más bajo para captar texto normal
+    'low_text': 0.2,  # Umbral muy bajo para detectar texto tenue
+    'link_threshold': 0.3,  # Umbral para unir palabras
+    'width_ths': 0.7,  # Ancho para combinar cajas de texto
+    'height_ths': 0.7,  # Alto para combinar cajas
+    'decoder': 'greedy',  # Decodificador más rápido
+    'beamWidth': 5,
+    'contrast_ths': 0.1,  # Umbral de contraste bajo para texto suave
+    'adjust_contrast': 0.5  # Ajustar contraste
+}
+
+READTEXT_PARAMS_ALTERNATIVE = {
+    'detail': 0,
+    'paragraph': False,
+    'batch_size': 8,
+    'text_threshold': 0.4,
+    'low_text': 0.2,
+    'contrast_ths': 0.1,
+    'adjust_contrast': 0.5
+}
+
+READTEXT_PARAMS_RAW = {
+    'detail': 0,
+    'paragraph': False,
+    'batch_size': 8,
+    'text_threshold': 0.4,
+    'low_text': 0.2
+}
+
+# Parámetros de reader.readtext que corresponden al detector (CRAFT); el resto
+# se pasan al reconocedor en el modo por lotes
+DETECTION_PARAM_KEYS = {
+    'min_size', 'text_threshold', 'low_text', 'link_threshold', 'canvas_size',
+    'mag_ratio', 'slope_ths', 'ycenter_ths', 'height_ths', 'width_ths', 'add_margin'
+}
+RECOGNITION_PARAM_KEYS = {
+    'decoder', 'beamWidth', 'batch_size', 'workers', 'allowlist', 'blocklist',
+    'contrast_ths', 'adjust_contrast', 'filter_ths'
+}
+
+# Tamaño de lote mínimo del reconocedor en el modo por lotes (--batch-size).
+# El modo por lotes es solo para GPU: en CPU (get_reader usa gpu=False)
+# EasyOCR reconoce las cajas de a una y la detección por lotes midió 0.89x
+# frente a imagen por imagen, así que por defecto se procesa de a una imagen
+RECOGNITION_BATCH_SIZE = 64
+
+# Plantilla de diseño (modo por regiones de campo). None = OCR de página completa
+LAYOUT_TEMPLATE = None
+LAYOUT_FILE = 'sunarp_layout.json'
+# Reconocer cada campo de la plantilla con su perfil (caracteres permitidos y
+# corrección de formato: placa, VIN, año, ...; ver field_profiles.py)
+USE_FIELD_PROFILES = True
+
+# Mínimo de campos con valor para aceptar el resultado de la plantilla;
+# si hay menos, se usa el OCR de página completa
+TEMPLATE_MIN_FIELDS = 5
+
+# Criterio para decidir pasadas de OCR adicionales:
+# - 'length': por número de líneas y largo del texto (comportamiento original)
+# - 'confidence': por confianza de cada caja y campos encontrados; solo se
+#   vuelven a reconocer las regiones de baja confianza
+OCR_FALLBACK_MODE = 'length'
+OCR_MIN_CONFIDENCE = 0.5  # Cajas por debajo de esta confianza se reintentan
+OCR_MIN_FIELDS = 6  # Campos con valor para aceptar la primera pasada
+OCR_MIN_BOXES = 5  # Con menos cajas, la detección falló: pasada completa alternativa
+OCR_DECISION_LOG = 'ocr_decisions.jsonl'  # Registro de decisiones (None = no registrar)
+
+# Campos usados para medir la cobertura del parseo
+COVERAGE_FIELDS = [
+    'n_serie', 'n_vin', 'n_motor', 'color', 'marca', 'modelo',
+    'estado', 'sede', 'año_modelo', 'propietarios'
+]
+
+# Modo de inferencia de EasyOCR en CPU:
+# - 'int8': cuantización dinámica int8 de las capas LSTM/Linear (lo que hace
+#   EasyOCR por defecto en CPU)
+# - 'fp32': sin cuantización (referencia de precisión, más lento)
+# - 'int8-jit': int8 y además el detector (CRAFT) convertido a un grafo
+#   TorchScript congelado y optimizado para CPU en la primera imagen
+OCR_INFERENCE_MODE = 'int8'
+INFERENCE_MODES = ['fp32', 'int8', 'int8-jit']
+
+# Hilos intra-op de torch (None = automático: todos los núcleos en serie,
+# núcleos / workers en paralelo)
+TORCH_THREADS = None
+
+# Versión de la lógica de extracción; cambiarla invalida la caché
+OCR_PIPELINE_VERSION = 1
+
+# Variables globales que se copian del proceso principal a los workers
+WORKER_SETTINGS = ['USE_OCR_CACHE', 'LAYOUT_TEMPLATE', 'OCR_FALLBACK_MODE', 'OCR_INFERENCE_MODE']
 
-# Inicializar el lector de EasyOCR (se hará una sola vez)
+# Registros por tarea enviada a cada worker en el modo --reparse
+REPARSE_CHUNK_SIZE = 256
+
+# Tareas por worker que se leen y envían a la vez en el modo --reparse (la
+# ventana acota la memoria: la fuente no se lee más rápido de lo que se escribe)
+REPARSE_WINDOW_CHUNKS = 4
+
+# Campos comparados entre registros (cambios del parser en --reparse y
+# precisión en --compare-inference)
+COMPARE_FIELDS = [
+    'placa', 'n_serie', 'n_vin', 'n_motor', 'color', 'marca', 'modelo',
+    'placa_vigente', 'placa_anterior', 'estado', 'anotaciones', 'sede',
+    'año_modelo', 'propietarios'
+]
+
+# Cargar EasyOCR en el proceso principal antes de crear los workers, para que
+# lo hereden ya cargado por fork (solo en sistemas con fork, y si alguna imagen
+# no está en la caché OCR)
+PRELOAD_READER = True
+
+# Inicializar el lector de EasyOCR (se hará una sola vez por proceso)
 reader = None
 
+# Motor de preprocesamiento (buffers de trabajo reutilizados, uno por proceso)
+preprocessor = None
+
+class TracedDetector:
+    """
+    Detector de EasyOCR convertido a TorchScript en su primera llamada
+    
+    torch.jit.trace necesita una entrada de ejemplo, así que se usa la primera
+    imagen real. El grafo se congela y se optimiza para CPU (fusión de
+    convolución y batch norm, sin rama de entrenamiento). Si la conversión
+    falla, se sigue usando el modelo original.
+    """
+    
+    def __init__(self, net):
+        self.net = net
+        self.traced = None
+    
+    def __call__(self, x):
+        if self.traced is None:
+            import torch
+            try:
+                with torch.no_grad():
+                    self.traced = torch.jit.optimize_for_inference(torch.jit.trace(self.net, x))
+            except Exception as e:
+                print(f"   ⚠️  No se pudo convertir el detector a TorchScript ({e}), usando el modelo original")
+                self.traced = self.net
+        return self.traced(x)
+
+def get_reader():
+    """
+    Retorna el lector de EasyOCR del proceso actual, creándolo si no existe
+    
+    Returns:
+        Instancia de easyocr.Reader
+    """
+    global reader
+    
+    if reader is None:
+        print("   ⚙️  Inicializando EasyOCR (esto puede tomar un momento la primera vez)...")
+        start = time.perf_counter()
+        import easyocr
+        if TORCH_THREADS:
+            import torch
+            torch.set_num_threads(TORCH_THREADS)
+        quantize = OCR_INFERENCE_MODE != 'fp32'
+        reader = easyocr.Reader(['es', 'en'], gpu=False, quantize=quantize)  # Español e Inglés
+        if OCR_INFERENCE_MODE == 'int8-jit':
+            reader.detector = TracedDetector(reader.detector)
+        print(f"   ✓ EasyOCR listo en {time.perf_counter() - start:.1f} s (modo {OCR_INFERENCE_MODE})")
+    
+    return reader
+
+def get_preprocessor():
+    """
+    Retorna el motor de preprocesamiento del proceso actual, creándolo si no existe
+    
+    Returns:
+        Instancia de preprocessing.ImagePreprocessor
+    """
+    global preprocessor
+    
+    if preprocessor is None:
+        from preprocessing import ImagePreprocessor
+        preprocessor = ImagePreprocessor()
+    
+    return preprocessor
+
+def load_image(image_path):
+    """
+    Decodifica la imagen una sola vez; las variantes se calculan bajo demanda
+    
+    Args:
+        image_path: Ruta a la imagen
+        
+    Returns:
+        PreparedImage (atributo crop, métodos primary() y alternative())
+    """
+    return get_preprocessor().load(image_path)
+
 def crop_image(image_path):
     """
     Recorta la imagen eliminando partes superior e inferior no relevantes
@@ -23,439 +234,1052 @@ def crop_image(image_path):
     Returns:
         Imagen recortada (numpy array)
     """
-    # Leer imagen
-    img = cv2.imread(image_path)
+    return load_image(image_path).crop
+
+def preprocess_image(image_path):
+    """
+    Pre-procesa la imagen para mejorar el OCR, eliminando marcas de agua
+    
+    Args:
+        image_path: Ruta a la imagen
+        
+    Returns:
+        Imagen procesada
+    """
+    return load_image(image_path).primary()
+
+def preprocess_image_alternative(image_path):
+    """
+    Método alternativo de preprocesamiento más agresivo
     
-    if img is None:
-        raise ValueError(f"No se pudo leer la imagen: {image_path}")
+    Args:
+        image_path: Ruta a la imagen
+        
+    Returns:
+        Imagen procesada
+    """
+    return load_image(image_path).alternative()
+
+def ocr_cache_params():
+    """
+    Retorna el hash de los parámetros que determinan el texto extraído
     
-    height, width = img.shape[:2]
+    Returns:
+        Hash hexadecimal usado como parte de la clave de la caché
+    """
+    return ocr_cache.params_hash(
+        OCR_PIPELINE_VERSION, ['es', 'en'], OCR_INFERENCE_MODE,
+        READTEXT_PARAMS, READTEXT_PARAMS_ALTERNATIVE, READTEXT_PARAMS_RAW,
+        OCR_FALLBACK_MODE, OCR_MIN_CONFIDENCE, OCR_MIN_FIELDS, OCR_MIN_BOXES
+    )
+
+def extract_text_from_image(image_path, preprocess=True, use_cache=None):
+    """
+    Extrae texto de una imagen usando OCR (EasyOCR)
     
-    # Eliminar 120px de arriba y 10px de abajo
-    top_crop = 120
-    bottom_crop = 10
+    Si la caché está activa y la imagen (por hash de contenido) ya fue
+    procesada con los mismos parámetros, se retorna el texto guardado sin
+    cargar el modelo.
     
-    # Validar que la imagen sea lo suficientemente grande
-    if height <= (top_crop + bottom_crop):
-        print(f"   ⚠️  Imagen muy pequeña para recortar, usando imagen completa")
-        return img
+    Args:
+        image_path: Ruta a la imagen
+        preprocess: Si debe preprocesar la imagen
+        use_cache: Si debe usar la caché OCR (None = usar USE_OCR_CACHE)
+        
+    Returns:
+        Texto extraído
+    """
+    if use_cache is None:
+        use_cache = USE_OCR_CACHE
     
-    # Recortar imagen: [inicio_y:fin_y, inicio_x:fin_x]
-    cropped = img[top_crop:height-bottom_crop, :]
+    try:
+        variant = 'preprocess' if preprocess else 'crop'
+        adaptive = preprocess and OCR_FALLBACK_MODE == 'confidence'
+        if adaptive:
+            variant = 'adaptive'
+        
+        if use_cache:
+            digest = ocr_cache.image_hash(OCR_CACHE_FILE, image_path)
+            params_key = ocr_cache_params()
+            cached = ocr_cache.get_cached_text(OCR_CACHE_FILE, digest, variant, params_key)
+            if cached is not None:
+                print("   ✓ Texto obtenido de la caché OCR")
+                return cached
+        
+        if adaptive:
+            text = run_ocr_adaptive(image_path)
+        else:
+            text = run_ocr(image_path, preprocess)
+        
+        if use_cache:
+            ocr_cache.store_text(OCR_CACHE_FILE, digest, variant, params_key, text)
+        
+        return text
     
-    return cropped
+    except Exception as e:
+        print(f"❌ Error al extraer texto de {image_path}: {str(e)}")
+        return ""
 
-def preprocess_image(image_path):
+def run_ocr(image_path, preprocess=True):
     """
-    Pre-procesa la imagen para mejorar el OCR, eliminando marcas de agua
+    Ejecuta EasyOCR sobre la imagen, con pasadas alternativas si hay poco texto
     
     Args:
         image_path: Ruta a la imagen
+        preprocess: Si debe preprocesar la imagen
         
     Returns:
-        Imagen procesada
+        Texto extraído
     """
-    # Primero recortar la imagen para eliminar áreas no relevantes
-    img = crop_image(image_path)
+    # Inicializar el lector si no existe
+    reader = get_reader()
     
-    # Convertir de BGR a RGB para trabajar con colores correctamente
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # Leer la imagen una sola vez; las variantes se calculan de este buffer
+    prepared = load_image(image_path)
+    if preprocess:
+        # Intentar con preprocesamiento principal
+        img = prepared.primary()
+    else:
+        # Usar imagen recortada pero sin preprocesamiento adicional
+        img = prepared.crop
     
-    # Eliminar el color gris de la marca de agua (#E3E3E3 y tonos similares)
-    # Convertir a HSV para mejor detección de colores
-    img_hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    # Realizar OCR con configuración para mejor detección
+    results = reader.readtext(img, **READTEXT_PARAMS)
     
-    # Definir rango de colores grises claros (marca de agua)
-    lower_gray = np.array([0, 0, 200])    # H, S, V
-    upper_gray = np.array([180, 30, 245])  # Captura grises claros como #E3E3E3
+    # Si no se obtuvo suficiente texto, intentar con método alternativo
+    if len(results) < 5 or len('\n'.join(results)) < 50:
+        print("   ⚙️  Probando con preprocesamiento alternativo...")
+        img_alt = prepared.alternative()
+        results_alt = reader.readtext(img_alt, **READTEXT_PARAMS_ALTERNATIVE)
+        # Usar el resultado con más texto
+        if len('\n'.join(results_alt)) > len('\n'.join(results)):
+            results = results_alt
+            print(f"   ✓ Método alternativo obtuvo más texto")
     
-    # Crear máscara para la marca de agua
-    mask_watermark = cv2.inRange(img_hsv, lower_gray, upper_gray)
+    # Si aún no hay resultados, intentar sin preprocesamiento
+    if len(results) < 5:
+        print("   ⚙️  Probando sin preprocesamiento...")
+        img_original = prepared.crop  # Usar recortada
+        results_orig = reader.readtext(img_original, **READTEXT_PARAMS_RAW)
+        if len('\n'.join(results_orig)) > len('\n'.join(results)):
+            results = results_orig
+            print(f"   ✓ Sin preprocesamiento obtuvo más texto")
     
-    # Aplicar la máscara - hacer la marca de agua blanca
-    img_no_watermark = img.copy()
-    img_no_watermark[mask_watermark > 0] = [255, 255, 255]  # Blanco
+    # Unir todos los textos
+    return '\n'.join(results)
+
+def field_coverage(text):
+    """
+    Cuenta cuántos campos del vehículo se pueden parsear del texto
     
-    # Convertir a escala de grises
-    gray = cv2.cvtColor(img_no_watermark, cv2.COLOR_BGR2GRAY)
+    Args:
+        text: Texto extraído por OCR
+        
+    Returns:
+        Número de campos de COVERAGE_FIELDS con valor
+    """
+    data = parse_vehicle_data(text, '')
+    return sum(1 for field in COVERAGE_FIELDS if data[field])
+
+def log_ocr_decision(entry):
+    """
+    Registra la decisión de pasadas de OCR de una imagen (para ajustar umbrales)
     
-    # Aumentar el contraste para hacer el texto más oscuro y legible
-    # Usar CLAHE antes de la umbralización
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-    enhanced = clahe.apply(gray)
+    Args:
+        entry: Diccionario con la decisión y sus métricas
+    """
+    if not OCR_DECISION_LOG:
+        return
+    with open(OCR_DECISION_LOG, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+def rerecognize_boxes(img, results, indices, params):
+    """
+    Vuelve a reconocer solo algunas cajas sobre otra variante de la imagen
     
-    # Aplicar sharpening para hacer el texto más nítido
-    kernel_sharpen = np.array([[-1,-1,-1],
-                               [-1, 9,-1],
-                               [-1,-1,-1]])
-    sharpened = cv2.filter2D(enhanced, -1, kernel_sharpen)
+    Todas las cajas se envían en una sola llamada al reconocedor, sin
+    detección. Se conserva el texto nuevo solo si su confianza es mayor.
     
-    # Usar umbralización de Otsu para separar texto del fondo
-    _, thresh = cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    Args:
+        img: Variante de la imagen (mismo tamaño que la usada en la detección)
+        results: Lista de (caja, texto, confianza), se actualiza en el lugar
+        indices: Índices de results a reconocer de nuevo
+        params: Parámetros de reader.readtext (se usan los del reconocedor)
+        
+    Returns:
+        Índices que siguen por debajo de OCR_MIN_CONFIDENCE
+    """
+    import cv2
+    reader = get_reader()
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height, width = img.shape[:2]
     
-    # Invertir si el fondo es oscuro
-    white_pixels = np.sum(thresh == 255)
-    black_pixels = np.sum(thresh == 0)
+    horizontal_list = []
+    box_indices = {}
+    for i in indices:
+        box = results[i][0]
+        xs = [int(point[0]) for point in box]
+        ys = [int(point[1]) for point in box]
+        x_min, x_max = max(0, min(xs)), min(width, max(xs))
+        y_min, y_max = max(0, min(ys)), min(height, max(ys))
+        horizontal_list.append([x_min, x_max, y_min, y_max])
+        box_indices.setdefault((x_min, y_min), []).append(i)
     
-    if black_pixels > white_pixels:
-        thresh = cv2.bitwise_not(thresh)
+    recog_kwargs = {k: v for k, v in params.items() if k in RECOGNITION_PARAM_KEYS}
+    new_results = reader.recognize(img, horizontal_list, [], detail=1, paragraph=False,
+                                   reformat=False, **recog_kwargs)
     
-    # Dilatar ligeramente el texto para hacerlo más grueso y legible
-    kernel = np.ones((2, 2), np.uint8)
-    dilated = cv2.dilate(thresh, kernel, iterations=1)
+    for box, text, confidence in new_results:
+        pending = box_indices.get((int(box[0][0]), int(box[0][1])))
+        if not pending:
+            continue
+        i = pending.pop(0)
+        if confidence > results[i][2]:
+            results[i] = (results[i][0], text, confidence)
     
-    return dilated
+    return [i for i in indices if results[i][2] < OCR_MIN_CONFIDENCE]
 
-def preprocess_image_alternative(image_path):
+def run_ocr_adaptive(image_path):
     """
-    Método alternativo de preprocesamiento más agresivo
+    Ejecuta EasyOCR decidiendo las pasadas adicionales por confianza y cobertura
+    
+    La primera pasada usa detail=1. Si parsea suficientes campos y todas las
+    cajas superan OCR_MIN_CONFIDENCE, se acepta. Si no, solo las cajas de baja
+    confianza se reconocen de nuevo (sin detección) sobre el preprocesamiento
+    alternativo y luego sobre la imagen recortada. Solo si la detección
+    encontró muy pocas cajas se hace una pasada completa alternativa.
     
     Args:
         image_path: Ruta a la imagen
         
     Returns:
-        Imagen procesada
+        Texto extraído
+    """
+    reader = get_reader()
+    prepared = load_image(image_path)
+    
+    results = reader.readtext(prepared.primary(), **dict(READTEXT_PARAMS, detail=1))
+    detector_calls = 1
+    recognizer_calls = 1
+    
+    text = '\n'.join(item[1] for item in results)
+    coverage = field_coverage(text)
+    low = [i for i, item in enumerate(results) if item[2] < OCR_MIN_CONFIDENCE]
+    initial = {'boxes': len(results), 'coverage': coverage, 'low_confidence': len(low)}
+    
+    if len(results) < OCR_MIN_BOXES:
+        # La detección falló: pasada completa con el preprocesamiento alternativo
+        decision = 'full_alternative'
+        results_alt = reader.readtext(prepared.alternative(), **dict(READTEXT_PARAMS_ALTERNATIVE, detail=1))
+        detector_calls += 1
+        recognizer_calls += 1
+        if len('\n'.join(item[1] for item in results_alt)) > len(text):
+            results = results_alt
+    elif coverage >= OCR_MIN_FIELDS and not low:
+        decision = 'accept'
+    elif low:
+        # Reintentar solo las regiones de baja confianza
+        decision = 'rerecognize'
+        low = rerecognize_boxes(prepared.alternative(), results, low, READTEXT_PARAMS_ALTERNATIVE)
+        recognizer_calls += 1
+        if low:
+            low = rerecognize_boxes(prepared.crop, results, low, READTEXT_PARAMS_RAW)
+            recognizer_calls += 1
+    else:
+        # Confianza alta pero pocos campos: otra pasada no cambiaría el texto
+        decision = 'accept_low_coverage'
+    
+    text = '\n'.join(item[1] for item in results)
+    final_coverage = field_coverage(text) if decision != 'accept' else coverage
+    
+    print(f"   ⚙️  Decisión OCR: {decision} (cobertura {coverage}→{final_coverage}, "
+          f"baja confianza {initial['low_confidence']}→{len(low)})")
+    log_ocr_decision({
+        'image': os.path.basename(image_path),
+        'decision': decision,
+        **initial,
+        'final_coverage': final_coverage,
+        'final_low_confidence': len(low),
+        'detector_calls': detector_calls,
+        'recognizer_calls': recognizer_calls,
+        'min_confidence': OCR_MIN_CONFIDENCE,
+        'min_fields': OCR_MIN_FIELDS,
+    })
+    
+    return text
+
+def pad_to_shape(img, height, width):
     """
-    # Primero recortar la imagen
-    img = crop_image(image_path)
+    Rellena la imagen con blanco (abajo y a la derecha) hasta el tamaño indicado
     
-    # Método alternativo: Eliminar marca de agua por rango de color en RGB
-    # #E3E3E3 = RGB(227, 227, 227)
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    Las coordenadas del contenido no cambian, a diferencia de un redimensionado.
     
-    # Definir rango de colores grises claros en RGB
-    lower_gray_rgb = np.array([210, 210, 210])  # Un poco más oscuro que #E3E3E3
-    upper_gray_rgb = np.array([240, 240, 240])  # Un poco más claro
+    Args:
+        img: Imagen (escala de grises o BGR)
+        height: Alto final
+        width: Ancho final
+        
+    Returns:
+        Imagen rellenada
+    """
+    import cv2
+    pad_bottom = height - img.shape[0]
+    pad_right = width - img.shape[1]
+    if pad_bottom == 0 and pad_right == 0:
+        return img
+    value = 255 if img.ndim == 2 else (255, 255, 255)
+    return cv2.copyMakeBorder(img, 0, pad_bottom, 0, pad_right, cv2.BORDER_CONSTANT, value=value)
+
+def readtext_batch(images, params):
+    """
+    Equivalente por lotes de reader.readtext(detail=0) para varias imágenes
     
-    # Crear máscara para píxeles grises (marca de agua)
-    mask = cv2.inRange(img_rgb, lower_gray_rgb, upper_gray_rgb)
+    Las imágenes de resultado de SUNARP tienen el mismo diseño y casi el mismo
+    tamaño, así que se rellenan a un tamaño común y:
+    - la detección se ejecuta una sola vez para todo el lote (tensor 4D)
+    - los recortes de todas las imágenes pasan en una sola llamada a
+      reader.recognize, apilando las imágenes en vertical y desplazando las
+      cajas. En CPU, recognize igual reconoce las cajas de a una (solo con GPU
+      arma lotes), así que en este modo el reconocimiento no se acelera
     
-    # Convertir píxeles de marca de agua a blanco
-    img_clean = img.copy()
-    img_clean[mask > 0] = [255, 255, 255]
+    Args:
+        images: Lista de imágenes (escala de grises o BGR)
+        params: Parámetros de reader.readtext (READTEXT_PARAMS*)
+        
+    Returns:
+        Lista con la lista de textos de cada imagen (mismo orden que images)
+    """
+    import cv2
+    import numpy as np
+    if not images:
+        return []
     
-    # Convertir a escala de grises
-    gray = cv2.cvtColor(img_clean, cv2.COLOR_BGR2GRAY)
+    reader = get_reader()
     
-    # Aplicar umbral adaptativo agresivo
-    thresh = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 10
+    detect_kwargs = {k: v for k, v in params.items() if k in DETECTION_PARAM_KEYS}
+    recog_kwargs = {k: v for k, v in params.items() if k in RECOGNITION_PARAM_KEYS}
+    recog_kwargs['batch_size'] = max(recog_kwargs.get('batch_size', 1), RECOGNITION_BATCH_SIZE)
+    
+    height = max(img.shape[0] for img in images)
+    width = max(img.shape[1] for img in images)
+    
+    grey_batch = []
+    color_batch = []
+    for img in images:
+        padded = pad_to_shape(img, height, width)
+        if padded.ndim == 2:
+            grey_batch.append(padded)
+            color_batch.append(cv2.cvtColor(padded, cv2.COLOR_GRAY2BGR))
+        else:
+            grey_batch.append(cv2.cvtColor(padded, cv2.COLOR_BGR2GRAY))
+            color_batch.append(padded)
+    
+    # Detección de todo el lote en una sola pasada
+    horizontal_agg, free_agg = reader.detect(np.stack(color_batch), reformat=False, **detect_kwargs)
+    
+    # Apilar las imágenes y desplazar las cajas (recortadas a su propia imagen
+    # para que el margen no invada la imagen vecina)
+    horizontal_list = []
+    free_list = []
+    for i, (horizontal, free) in enumerate(zip(horizontal_agg, free_agg)):
+        offset = i * height
+        for x_min, x_max, y_min, y_max in horizontal:
+            horizontal_list.append([
+                max(0, x_min), min(width, x_max),
+                max(0, y_min) + offset, min(height, y_max) + offset
+            ])
+        for box in free:
+            free_list.append([
+                [min(max(0, x), width), min(max(0, y), height) + offset] for x, y in box
+            ])
+    
+    texts = [[] for _ in images]
+    if not horizontal_list and not free_list:
+        return texts
+    
+    # Reconocimiento de todos los recortes en una sola llamada
+    results = reader.recognize(
+        np.vstack(grey_batch), horizontal_list, free_list,
+        detail=1, paragraph=False, reformat=False, **recog_kwargs
     )
     
-    # Invertir si es necesario
-    white_pixels = np.sum(thresh == 255)
-    black_pixels = np.sum(thresh == 0)
-    if black_pixels > white_pixels:
-        thresh = cv2.bitwise_not(thresh)
+    for box, text, _confidence in results:
+        top = min(point[1] for point in box)
+        idx = min(int(top // height), len(images) - 1)
+        texts[idx].append(text)
     
-    return thresh
+    return texts
 
-def extract_text_from_image(image_path, preprocess=True):
+def run_ocr_batch(image_paths, preprocess=True):
     """
-    Extrae texto de una imagen usando OCR (EasyOCR)
+    Versión por lotes de run_ocr: aplica las mismas pasadas y criterios de
+    respaldo, pero cada pasada procesa todas las imágenes que la necesitan juntas
     
     Args:
-        image_path: Ruta a la imagen
-        preprocess: Si debe preprocesar la imagen
+        image_paths: Lista de rutas de imágenes
+        preprocess: Si debe preprocesar las imágenes
         
     Returns:
-        Texto extraído
+        Lista de textos extraídos (mismo orden que image_paths)
     """
-    global reader
+    # Cada imagen se decodifica una sola vez para todas las pasadas
+    prepared = [load_image(path) for path in image_paths]
+    if preprocess:
+        images = [p.primary() for p in prepared]
+    else:
+        images = [p.crop for p in prepared]
+    
+    results = readtext_batch(images, READTEXT_PARAMS)
+    
+    # Pasada alternativa solo para las imágenes con poco texto
+    pending = [
+        i for i, res in enumerate(results)
+        if len(res) < 5 or len('\n'.join(res)) < 50
+    ]
+    if pending:
+        print(f"   ⚙️  Probando con preprocesamiento alternativo ({len(pending)} imágenes)...")
+        images_alt = [prepared[i].alternative() for i in pending]
+        for i, res_alt in zip(pending, readtext_batch(images_alt, READTEXT_PARAMS_ALTERNATIVE)):
+            if len('\n'.join(res_alt)) > len('\n'.join(results[i])):
+                results[i] = res_alt
+    
+    # Pasada sin preprocesamiento para las que aún no tienen resultados
+    pending = [i for i, res in enumerate(results) if len(res) < 5]
+    if pending:
+        print(f"   ⚙️  Probando sin preprocesamiento ({len(pending)} imágenes)...")
+        images_orig = [prepared[i].crop for i in pending]
+        for i, res_orig in zip(pending, readtext_batch(images_orig, READTEXT_PARAMS_RAW)):
+            if len('\n'.join(res_orig)) > len('\n'.join(results[i])):
+                results[i] = res_orig
+    
+    return ['\n'.join(res) for res in results]
+
+def extract_text_batch(image_paths, preprocess=True, use_cache=None):
+    """
+    Extrae texto de varias imágenes con OCR por lotes
+    
+    Las imágenes que ya están en la caché no pasan por el modelo. Si el lote
+    falla, se recurre a extract_text_from_image imagen por imagen.
+    
+    Args:
+        image_paths: Lista de rutas de imágenes
+        preprocess: Si debe preprocesar las imágenes
+        use_cache: Si debe usar la caché OCR (None = usar USE_OCR_CACHE)
+        
+    Returns:
+        Lista de textos extraídos (mismo orden que image_paths)
+    """
+    if use_cache is None:
+        use_cache = USE_OCR_CACHE
+    
+    variant = 'preprocess' if preprocess else 'crop'
+    params_key = ocr_cache_params()
+    texts = [None] * len(image_paths)
+    digests = [None] * len(image_paths)
+    
+    if use_cache:
+        for i, path in enumerate(image_paths):
+            try:
+                digests[i] = ocr_cache.image_hash(OCR_CACHE_FILE, path)
+                texts[i] = ocr_cache.get_cached_text(OCR_CACHE_FILE, digests[i], variant, params_key)
+            except Exception as e:
+                print(f"⚠️  No se pudo consultar la caché para {path}: {str(e)}")
+    
+    pending = [i for i, text in enumerate(texts) if text is None]
+    if len(pending) < len(image_paths):
+        print(f"   ✓ {len(image_paths) - len(pending)} textos obtenidos de la caché OCR")
+    
+    if not pending:
+        return texts
     
     try:
-        # Inicializar el lector si no existe
-        if reader is None:
-            print("   ⚙️  Inicializando EasyOCR (esto puede tomar un momento la primera vez)...")
-            reader = easyocr.Reader(['es', 'en'], gpu=False)  # Español e Inglés
-        
-        # Leer la imagen
-        if preprocess:
-            # Intentar con preprocesamiento principal
-            img = preprocess_image(image_path)
+        batch_texts = run_ocr_batch([image_paths[i] for i in pending], preprocess)
+    except Exception as e:
+        print(f"⚠️  Falló el OCR por lotes ({str(e)}), procesando imagen por imagen...")
+        for i in pending:
+            texts[i] = extract_text_from_image(image_paths[i], preprocess, use_cache)
+        return texts
+    
+    for i, text in zip(pending, batch_texts):
+        texts[i] = text
+        if use_cache and digests[i]:
+            ocr_cache.store_text(OCR_CACHE_FILE, digests[i], variant, params_key, text)
+    
+    return texts
+
+def calibrate_layout(reference_image, layout_file=LAYOUT_FILE):
+    """
+    Calibra la plantilla de regiones de campo a partir de una imagen de referencia
+    
+    Args:
+        reference_image: Ruta a una imagen *_resultado.png bien leída
+        layout_file: Ruta donde guardar la plantilla JSON
+        
+    Returns:
+        Diccionario de la plantilla
+    """
+    print(f"⚙️  Calibrando plantilla con: {reference_image}")
+    
+    reader = get_reader()
+    img = preprocess_image(reference_image)
+    params = dict(READTEXT_PARAMS, detail=1)
+    ocr_results = reader.readtext(img, **params)
+    
+    height, width = img.shape[:2]
+    layout = layout_template.calibrate(ocr_results, width, height)
+    layout['reference'] = os.path.basename(reference_image)
+    layout_template.save_layout(layout, layout_file)
+    
+    print(f"✓ Plantilla guardada en: {layout_file}")
+    print(f"   Campos calibrados ({len(layout['fields'])}): {', '.join(layout['fields'])}")
+    missing = [field for field in layout_template.FIELD_DISPLAY_LABELS if field not in layout['fields']]
+    if missing:
+        print(f"   ⚠️  Campos no encontrados en la referencia: {', '.join(missing)}")
+    
+    return layout
+
+def run_template_ocr(image_path, layout):
+    """
+    Reconoce solo las regiones de valor de la plantilla, sin ejecutar el detector
+    
+    Los campos de una línea se reconocen juntos, con una llamada al
+    reconocedor por perfil de campo (cada perfil limita los caracteres que
+    puede emitir el decodificador); los de varias líneas (propietarios) usan
+    readtext sobre su región. Con USE_FIELD_PROFILES, cada valor se corrige y
+    valida según el formato de su campo.
+    
+    Args:
+        image_path: Ruta a la imagen
+        layout: Diccionario de la plantilla
+        
+    Returns:
+        Diccionario {campo: valor}
+    """
+    reader = get_reader()
+    img = preprocess_image(image_path)
+    height, width = img.shape[:2]
+    regions = layout_template.scaled_regions(layout, width, height)
+    
+    values = {}
+    groups = {}
+    for field, (x_min, x_max, y_min, y_max, multiline) in regions.items():
+        if x_max <= x_min or y_max <= y_min:
+            continue
+        if multiline:
+            lines = reader.readtext(img[y_min:y_max, x_min:x_max], **READTEXT_PARAMS)
+            values[field] = layout_template.clean_value(field, ' '.join(lines))
         else:
-            # Usar imagen recortada pero sin preprocesamiento adicional
-            img = crop_image(image_path)
-        
-        # Realizar OCR con configuración para mejor detección
-        # Parámetros ajustados para reconocer texto normal (no solo negrita)
-        results = reader.readtext(
-            img, 
-            detail=0, 
-            paragraph=False,  # No agrupar en párrafos, obtener línea por línea
-            batch_size=8,
-            text_threshold=0.5,  # Umbral más bajo para captar texto normal
-            low_text=0.2,  # Umbral muy bajo para detectar texto tenue
-            link_threshold=0.3,  # Umbral para unir palabras
-            width_ths=0.7,  # Ancho para combinar cajas de texto
-            height_ths=0.7,  # Alto para combinar cajas
-            decoder='greedy',  # Decodificador más rápido
-            beamWidth=5,
-            contrast_ths=0.1,  # Umbral de contraste bajo para texto suave
-            adjust_contrast=0.5  # Ajustar contraste
+            profile = field_profiles.FIELD_PROFILES.get(field) if USE_FIELD_PROFILES else None
+            horizontal_list, box_fields = groups.setdefault(profile, ([], {}))
+            horizontal_list.append([x_min, x_max, y_min, y_max])
+            box_fields[(x_min, y_min)] = field
+    
+    recog_kwargs = {k: v for k, v in READTEXT_PARAMS.items() if k in RECOGNITION_PARAM_KEYS}
+    for profile, (horizontal_list, box_fields) in groups.items():
+        if profile is not None:
+            recog_kwargs['allowlist'] = field_profiles.profile_allowlist(profile)
+        else:
+            recog_kwargs.pop('allowlist', None)
+        results = reader.recognize(
+            img, horizontal_list, [], detail=1, paragraph=False, reformat=False, **recog_kwargs
         )
+        for box, text, _confidence in results:
+            field = box_fields.get((int(box[0][0]), int(box[0][1])))
+            if field:
+                values[field] = layout_template.clean_value(field, text)
+    
+    if USE_FIELD_PROFILES:
+        for field, value in values.items():
+            values[field], _valid = field_profiles.normalize_field(field, value)
+    
+    return values
+
+def template_cache_params(layout):
+    """Retorna la clave de parámetros de la caché OCR en modo plantilla"""
+    profiles_version = field_profiles.PROFILES_VERSION if USE_FIELD_PROFILES else None
+    return ocr_cache.params_hash(ocr_cache_params(), layout, profiles_version)
+
+def extract_fields_with_template(image_path, plate_number, layout, use_cache=None):
+    """
+    Extrae los campos del vehículo con la plantilla de regiones
+    
+    Args:
+        image_path: Ruta a la imagen
+        plate_number: Número de placa (nombre del archivo)
+        layout: Diccionario de la plantilla
+        use_cache: Si debe usar la caché OCR (None = usar USE_OCR_CACHE)
         
-        # Si no se obtuvo suficiente texto, intentar con método alternativo
-        if len(results) < 5 or len('\n'.join(results)) < 50:
-            print("   ⚙️  Probando con preprocesamiento alternativo...")
-            img_alt = preprocess_image_alternative(image_path)
-            results_alt = reader.readtext(
-                img_alt,
-                detail=0,
-                paragraph=False,
-                batch_size=8,
-                text_threshold=0.4,
-                low_text=0.2,
-                contrast_ths=0.1,
-                adjust_contrast=0.5
-            )
-            # Usar el resultado con más texto
-            if len('\n'.join(results_alt)) > len('\n'.join(results)):
-                results = results_alt
-                print(f"   ✓ Método alternativo obtuvo más texto")
-        
-        # Si aún no hay resultados, intentar sin preprocesamiento
-        if len(results) < 5:
-            print("   ⚙️  Probando sin preprocesamiento...")
-            img_original = crop_image(image_path)  # Usar recortada
-            results_orig = reader.readtext(
-                img_original,
-                detail=0,
-                paragraph=False,
-                batch_size=8,
-                text_threshold=0.4,
-                low_text=0.2
-            )
-            if len('\n'.join(results_orig)) > len('\n'.join(results)):
-                results = results_orig
-                print(f"   ✓ Sin preprocesamiento obtuvo más texto")
+    Returns:
+        Diccionario con información estructurada, o None si la plantilla
+        no obtuvo suficientes campos
+    """
+    if use_cache is None:
+        use_cache = USE_OCR_CACHE
+    
+    values = None
+    if use_cache:
+        digest = ocr_cache.image_hash(OCR_CACHE_FILE, image_path)
+        params_key = template_cache_params(layout)
+        cached = ocr_cache.get_cached_text(OCR_CACHE_FILE, digest, 'template', params_key)
+        if cached is not None:
+            values = json.loads(cached)
+    
+    if values is None:
+        values = run_template_ocr(image_path, layout)
+        if use_cache:
+            ocr_cache.store_text(OCR_CACHE_FILE, digest, 'template', params_key,
+                                 json.dumps(values, ensure_ascii=False))
+    
+    filled = sum(1 for value in values.values() if value)
+    if filled < TEMPLATE_MIN_FIELDS:
+        print(f"   ⚠️  {plate_number}: plantilla con pocos campos ({filled}), usando OCR de página completa")
+        return None
+    
+    return layout_template.build_record(values, plate_number)
+
+def ocr_image(image_path):
+    """
+    Aplica OCR a una imagen y estructura la información del vehículo
+    
+    Args:
+        image_path: Ruta a la imagen *_resultado.png
         
-        # Unir todos los textos
-        text = '\n'.join(results)
+    Returns:
+        Tupla (image_file, plate_number, vehicle_data, error). vehicle_data es
+        None si no se pudo extraer texto; error contiene el mensaje si falló.
+    """
+    image_file = os.path.basename(image_path)
+    plate_number = os.path.splitext(image_file)[0].replace('_resultado', '')
+    
+    try:
+        # Modo plantilla: reconocer solo las regiones de campo
+        if LAYOUT_TEMPLATE is not None:
+            vehicle_data = extract_fields_with_template(image_path, plate_number, LAYOUT_TEMPLATE)
+            if vehicle_data:
+                return image_file, plate_number, vehicle_data, None
         
-        return text
+        # Extraer texto con preprocesamiento
+        text = extract_text_from_image(image_path, preprocess=True)
+        
+        if not text.strip():
+            print(f"   ⚠️  {plate_number}: No se extrajo texto, intentando sin preprocesamiento...")
+            text = extract_text_from_image(image_path, preprocess=False)
+        
+        if not text.strip():
+            return image_file, plate_number, None, None
+        
+        return image_file, plate_number, parse_vehicle_data(text, plate_number), None
     
     except Exception as e:
-        print(f"❌ Error al extraer texto de {image_path}: {str(e)}")
-        return ""
+        return image_file, plate_number, None, str(e)
 
-def parse_vehicle_data(text, plate_number):
+def ocr_images(image_paths):
     """
-    Parsea el texto extraído y estructura la información del vehículo
+    Versión por lotes de ocr_image
     
     Args:
-        text: Texto extraído por OCR
-        plate_number: Número de placa para referencia
+        image_paths: Lista de rutas de imágenes *_resultado.png
         
     Returns:
-        Diccionario con información estructurada
-    """
-    data = {
-        'placa': plate_number,
-        'n_serie': '',
-        'n_vin': '',
-        'n_motor': '',
-        'color': '',
-        'marca': '',
-        'modelo': '',
-        'placa_vigente': '',
-        'placa_anterior': '',
-        'estado': '',
-        'anotaciones': '',
-        'sede': '',
-        'año_modelo': '',
-        'propietarios': '',
-        'raw_text': text
-    }
+        Lista de tuplas (image_file, plate_number, vehicle_data, error)
+    """
+    # En modo plantilla cada imagen solo pasa por el reconocedor, y en modo
+    # 'confidence' las pasadas adicionales dependen de cada imagen
+    if LAYOUT_TEMPLATE is not None or OCR_FALLBACK_MODE == 'confidence':
+        return [ocr_image(path) for path in image_paths]
+    
+    image_files = [os.path.basename(path) for path in image_paths]
+    plate_numbers = [os.path.splitext(f)[0].replace('_resultado', '') for f in image_files]
     
-    # Normalizar texto para búsqueda
-    text_upper = text.upper()
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    
-    # Patrones mejorados basados en el formato visual de SUNARP
-    # Los campos vienen como "ETIQUETA: VALOR" o "ETIQUETA:VALOR"
-    patterns = {
-        'placa': [
-            r'N[°º]?\s*PLACA\s*[:\s]+\s*([A-Z0-9\-]+)',
-            r'PLACA\s*[:\s]+\s*([A-Z0-9\-]+)',
-        ],
-        'n_serie': [
-            r'N[°º]?\s*SERIE\s*[:\s]+\s*([A-Z0-9]+)',
-            r'SERIE\s*[:\s]+\s*([A-Z0-9]+)',
-        ],
-        'n_vin': [
-            r'N[°º]?\s*VIN\s*[:\s]+\s*([A-Z0-9]+)',
-            r'VIN\s*[:\s]+\s*([A-Z0-9]+)',
-        ],
-        'n_motor': [
-            r'N[°º]?\s*MOTOR\s*[:\s]+\s*([A-Z0-9]+)',
-            r'MOTOR\s*[:\s]+\s*([A-Z0-9]+)',
-        ],
-        'color': [
-            r'COLOR\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
-        ],
-        'marca': [
-            r'MARCA\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
-        ],
-        'modelo': [
-            r'MODELO\s*[:\s]+\s*([A-Z0-9\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
-        ],
-        'placa_vigente': [
-            r'PLACA\s+VIGENTE\s*[:\s]+\s*([A-Z0-9\-]+)',
-        ],
-        'placa_anterior': [
-            r'PLACA\s+ANTERIOR\s*[:\s]*\s*([A-Z0-9\-]+|NINGUNA)',
-        ],
-        'estado': [
-            r'ESTADO\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
-        ],
-        'anotaciones': [
-            r'ANOTACIONES\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
-        ],
-        'sede': [
-            r'SEDE\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
-        ],
-        'año_modelo': [
-            r'A[ÑN]O\s+DE\s+MODELO\s*[:\s]+\s*(\d{4})',
-            r'A[ÑN]O\s+MODELO\s*[:\s]+\s*(\d{4})',
-        ],
-        'propietarios': [
-            r'PROPIETARIO\s*\(\s*S\s*\)\s*[:\s]+\s*(.+?)(?=\n\n|\Z)',
-            r'PROPIETARIOS\s*[:\s]+\s*(.+?)(?=\n\n|\Z)',
-        ],
+    try:
+        texts = extract_text_batch(image_paths, preprocess=True)
+        
+        # Reintentar sin preprocesamiento las que no dieron texto
+        empty = [i for i, text in enumerate(texts) if not text.strip()]
+        if empty:
+            print(f"   ⚠️  {len(empty)} imágenes sin texto, intentando sin preprocesamiento...")
+            for i, text in zip(empty, extract_text_batch([image_paths[i] for i in empty], preprocess=False)):
+                texts[i] = text
+    except Exception as e:
+        return [(f, plate, None, str(e)) for f, plate in zip(image_files, plate_numbers)]
+    
+    results = []
+    for image_file, plate_number, text in zip(image_files, plate_numbers, texts):
+        if not text.strip():
+            results.append((image_file, plate_number, None, None))
+            continue
+        try:
+            results.append((image_file, plate_number, parse_vehicle_data(text, plate_number), None))
+        except Exception as e:
+            results.append((image_file, plate_number, None, str(e)))
+    
+    return results
+
+def worker_settings():
+    """
+    Retorna la configuración del proceso principal que deben heredar los workers
+    
+    Returns:
+        Diccionario {nombre_variable_global: valor}
+    """
+    return {name: globals()[name] for name in WORKER_SETTINGS}
+
+def init_worker(num_threads=None, settings=None):
+    """
+    Inicializa un proceso worker: limita los hilos de torch y aplica la configuración
+    
+    Si el proceso principal precargó EasyOCR (PRELOAD_READER con fork y alguna
+    imagen fuera de la caché), el worker ya lo tiene; si no, se carga una sola
+    vez por worker, en el primer fallo de caché.
+    
+    Args:
+        num_threads: Hilos intra-op de torch por worker (None = automático)
+        settings: Configuración retornada por worker_settings()
+    """
+    import torch
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if settings:
+        globals().update(settings)
+
+def iter_ocr_results(image_paths, workers=1, batch_size=1, torch_threads=None):
+    """
+    Aplica OCR a las imágenes, en serie o con un pool de procesos
+    
+    Los resultados se entregan en el mismo orden que image_paths, de modo que
+    la salida es idéntica a la del modo en serie.
+    
+    Args:
+        image_paths: Lista o iterador de rutas de imágenes (iterador solo con batch_size=1)
+        workers: Número de procesos worker (1 = en serie, sin pool)
+        batch_size: Imágenes por lote de OCR (1 = imagen por imagen)
+        torch_threads: Hilos de torch por worker (None = núcleos / workers)
+        
+    Yields:
+        Tuplas (image_file, plate_number, vehicle_data, error) de ocr_image
+    """
+    if batch_size > 1:
+        tasks = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+        func = ocr_images
+    else:
+        tasks = image_paths
+        func = ocr_image
+    
+    if workers <= 1:
+        for task in tasks:
+            if batch_size > 1:
+                yield from func(task)
+            else:
+                yield func(task)
+        return
+    
+    # Repartir los núcleos entre los workers para no sobresuscribir la CPU
+    num_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+    
+    context = multiprocessing.get_context()
+    # Si todas las imágenes de una lista están en la caché, ningún worker
+    # necesita el modelo. Un iterador (imágenes que va dejando el scraper en el
+    # modo pipeline) no se puede revisar sin consumirlo: se precarga siempre.
+    if isinstance(image_paths, (list, tuple)):
+        needs_reader = not all(is_cached(path) for path in image_paths)
+    else:
+        needs_reader = True
+    if PRELOAD_READER and needs_reader and 'fork' in multiprocessing.get_all_start_methods():
+        # Los workers heredan el modelo ya cargado (copy-on-write) en lugar de
+        # cargarlo cada uno. Con un solo hilo de torch en el proceso principal
+        # no queda un pool de hilos activo que el fork pueda dejar bloqueado.
+        import torch
+        torch.set_num_threads(1)
+        get_reader()
+        context = multiprocessing.get_context('fork')
+    
+    initargs = (num_threads, worker_settings())
+    with context.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+        for result in pool.imap(func, tasks, chunksize=1):
+            if batch_size > 1:
+                yield from result
+            else:
+                yield result
+
+def load_manifest(manifest_file):
+    """
+    Carga el manifiesto de imágenes procesadas (la última entrada por ruta gana)
+    
+    Args:
+        manifest_file: Archivo JSON Lines con una entrada por imagen procesada
+        
+    Returns:
+        Diccionario {nombre_imagen: entrada}
+    """
+    manifest = {}
+    
+    if not os.path.exists(manifest_file):
+        return manifest
+    
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Línea truncada por una caída a mitad de escritura
+                continue
+            manifest[entry['path']] = entry
+    
+    return manifest
+
+def append_manifest(manifest_file, image_path, status):
+    """
+    Registra una imagen procesada en el manifiesto
+    
+    Args:
+        manifest_file: Archivo JSON Lines del manifiesto
+        image_path: Ruta a la imagen
+        status: Estado del procesamiento ('ok', 'empty' o 'error')
+    """
+    stat = os.stat(image_path)
+    entry = {
+        'path': os.path.basename(image_path),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'status': status
     }
+    with open(manifest_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+def is_processed(manifest, image_path):
+    """
+    Indica si la imagen ya fue procesada con éxito y no cambió desde entonces
+    
+    Args:
+        manifest: Diccionario retornado por load_manifest
+        image_path: Ruta a la imagen
+        
+    Returns:
+        True si se puede saltar la imagen
+    """
+    entry = manifest.get(os.path.basename(image_path))
+    if not entry or entry.get('status') != 'ok':
+        return False
+    
+    stat = os.stat(image_path)
+    return entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+
+def reset_incremental_outputs(output_file, manifest_file):
+    """
+    Prepara las salidas para el modo incremental
+    
+    El JSON Lines es la fuente de verdad del modo incremental. Si no existe
+    (primera ejecución incremental), se descartan los CSV y el manifiesto
+    previos para que todas las imágenes se procesen y no queden filas duplicadas.
+    
+    Args:
+        output_file: Archivo CSV principal
+        manifest_file: Archivo JSON Lines del manifiesto
+    """
+    paths = output_paths(output_file)
+    if os.path.exists(paths['jsonl']):
+        return
+    
+    for path in (paths['csv'], paths['simple_csv'], manifest_file):
+        if os.path.exists(path):
+            os.remove(path)
+
+def report_result(idx, total, result, writer):
+    """
+    Muestra el resultado de una imagen y lo escribe en las salidas
+    
+    Args:
+        idx: Posición de la imagen (desde 1)
+        total: Total de imágenes a procesar (None si no se conoce de antemano)
+        result: Tupla (image_file, plate_number, vehicle_data, error) de ocr_image
+        writer: VehicleDataWriter donde escribir el registro
+        
+    Returns:
+        Estado del procesamiento ('ok', 'empty' o 'error')
+    """
+    image_file, plate_number, vehicle_data, error = result
+    
+    print(f"\n[{idx}/{total}] Procesado: {image_file}" if total else f"\n[{idx}] Procesado: {image_file}")
+    print(f"   Placa: {plate_number}")
     
-    # Buscar patrones en el texto
-    for key, pattern_list in patterns.items():
-        for pattern in pattern_list:
-            match = re.search(pattern, text_upper, re.MULTILINE | re.DOTALL)
-            if match:
-                value = match.group(1).strip()
-                # Limpiar espacios múltiples
-                value = re.sub(r'\s+', ' ', value)
-                data[key] = value
-                break  # Usar el primer patrón que coincida
-    
-    # Método alternativo: buscar línea por línea
-    for i, line in enumerate(lines):
-        line_upper = line.upper()
-        
-        # N° PLACA:
-        if 'PLACA' in line_upper and 'VIGENTE' not in line_upper and 'ANTERIOR' not in line_upper:
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['placa']:
-                data['placa'] = parts[-1].strip()
-        
-        # N° SERIE:
-        if line_upper.startswith('N') and 'SERIE' in line_upper:
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
-            if len(parts) > 1 and not data['n_serie']:
-                data['n_serie'] = parts[-1].strip()
-        
-        # N° VIN:
-        if 'VIN' in line_upper:
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
-            if len(parts) > 1 and not data['n_vin']:
-                data['n_vin'] = parts[-1].strip()
-        
-        # N° MOTOR:
-        if 'MOTOR' in line_upper:
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
-            if len(parts) > 1 and not data['n_motor']:
-                data['n_motor'] = parts[-1].strip()
-        
-        # COLOR:
-        if line_upper.startswith('COLOR'):
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['color']:
-                data['color'] = parts[-1].strip()
-        
-        # MARCA:
-        if line_upper.startswith('MARCA'):
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['marca']:
-                data['marca'] = parts[-1].strip()
-        
-        # MODELO:
-        if line_upper.startswith('MODELO'):
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['modelo']:
-                data['modelo'] = parts[-1].strip()
-        
-        # PLACA VIGENTE:
-        if 'PLACA' in line_upper and 'VIGENTE' in line_upper:
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
-            if len(parts) > 1 and not data['placa_vigente']:
-                data['placa_vigente'] = parts[-1].strip()
-        
-        # PLACA ANTERIOR:
-        if 'PLACA' in line_upper and 'ANTERIOR' in line_upper:
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
-            if len(parts) > 1 and not data['placa_anterior']:
-                data['placa_anterior'] = parts[-1].strip()
-        
-        # ESTADO:
-        if line_upper.startswith('ESTADO'):
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['estado']:
-                data['estado'] = parts[-1].strip()
-        
-        # ANOTACIONES:
-        if line_upper.startswith('ANOTACIONES'):
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['anotaciones']:
-                data['anotaciones'] = parts[-1].strip()
-        
-        # SEDE:
-        if line_upper.startswith('SEDE'):
-            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
-            if len(parts) > 1 and not data['sede']:
-                data['sede'] = parts[-1].strip()
-        
-        # AÑO DE MODELO:
-        if 'AÑO' in line_upper and 'MODELO' in line_upper:
-            parts = re.split(r'[:\s]+', line_upper)
-            if len(parts) > 1 and not data['año_modelo']:
-                # Buscar el año (4 dígitos)
-                for part in parts:
-                    if re.match(r'\d{4}', part):
-                        data['año_modelo'] = part.strip()
-                        break
-        
-        # PROPIETARIO(S):
-        if 'PROPIETARIO' in line_upper:
-            # Capturar desde esta línea hasta el final o línea vacía
-            propietario_text = []
-            for j in range(i, len(lines)):
-                if 'PROPIETARIO' in lines[j].upper():
-                    parts = re.split(r'[:\s]+', lines[j], maxsplit=1)
-                    if len(parts) > 1:
-                        propietario_text.append(parts[-1])
-                elif lines[j].strip() and not ':' in lines[j]:
-                    propietario_text.append(lines[j])
-                elif not lines[j].strip() or ':' in lines[j]:
-                    break
-            if propietario_text and not data['propietarios']:
-                data['propietarios'] = ' '.join(propietario_text).strip()
-    
-    # Si no se encontró la placa en el texto, usar el nombre del archivo
-    if not data['placa'] or data['placa'] == 'N/A':
-        data['placa'] = plate_number
-    
-    return data
-
-def process_images(input_folder='output_images', output_file='vehicle_data_extracted.csv'):
+    if error:
+        print(f"   ❌ Error: {error}")
+        return 'error'
+    
+    if not vehicle_data:
+        print("   ❌ No se pudo extraer texto de la imagen")
+        return 'empty'
+    
+    print(f"   ✓ Texto extraído ({len(vehicle_data['raw_text'])} caracteres)")
+    writer.write(vehicle_data, source_image=image_file)
+    
+    # Mostrar campos extraídos
+    print(f"   ✓ Placa: {vehicle_data['placa'] or 'N/A'}")
+    print(f"   ✓ Serie: {vehicle_data['n_serie'] or 'N/A'}")
+    print(f"   ✓ Motor: {vehicle_data['n_motor'] or 'N/A'}")
+    print(f"   ✓ Marca: {vehicle_data['marca'] or 'N/A'}")
+    print(f"   ✓ Modelo: {vehicle_data['modelo'] or 'N/A'}")
+    print(f"   ✓ Color: {vehicle_data['color'] or 'N/A'}")
+    print(f"   ✓ Estado: {vehicle_data['estado'] or 'N/A'}")
+    print(f"   ✓ Propietario(s): {vehicle_data['propietarios'][:50] or 'N/A'}...")
+    
+    return 'ok'
+
+def write_results(ocr_results, writer, input_folder, total=None, manifest_file=None, state=None):
+    """
+    Muestra y escribe los resultados de OCR a medida que se obtienen
+    
+    Args:
+        ocr_results: Iterable de tuplas (image_file, plate_number, vehicle_data, error)
+        writer: VehicleDataWriter donde escribir los registros
+        input_folder: Carpeta de las imágenes (para el manifiesto)
+        total: Total de imágenes (None si no se conoce, como en el pipeline)
+        manifest_file: Manifiesto donde registrar cada imagen (None = sin manifiesto)
+        state: PlateStore (o JobState) donde registrar las etapas ocr y
+            parsed de cada placa (None = sin registro)
+        
+    Returns:
+        Tupla (exitosas, fallidas)
+    """
+    successful = 0
+    failed = 0
+    
+    for idx, result in enumerate(ocr_results, 1):
+        status = report_result(idx, total, result, writer)
+        if status == 'ok':
+            successful += 1
+        else:
+            failed += 1
+        
+        if manifest_file:
+            # Asegurar que el registro está en disco antes de marcarlo en el manifiesto
+            writer.flush()
+            append_manifest(manifest_file, os.path.join(input_folder, result[0]), status)
+        
+        if state is not None:
+            state.mark(result[1], 'ocr', status)
+            if status == 'ok':
+                state.mark(result[1], 'parsed', 'ok')
+    
+    return successful, failed
+
+def process_image_stream(image_paths, input_folder='output_images', output_file='vehicle_data_extracted.csv',
+                         workers=1, use_cache=True, parquet=False, log_file=None):
+    """
+    Aplica OCR a las imágenes a medida que llegan (pipeline scraping -> OCR)
+    
+    Funciona como el modo incremental: cada registro se agrega a las salidas
+    y al manifiesto en cuanto se obtiene, las imágenes ya procesadas se saltan
+    y al final se consolidan las salidas.
+    
+    Args:
+        image_paths: Iterable de rutas *_resultado.png dentro de input_folder
+            (puede bloquear esperando la siguiente, por ejemplo una cola que
+            llena el scraper)
+        input_folder: Carpeta de las imágenes
+        output_file: Archivo CSV principal
+        workers: Número de procesos OCR en paralelo (1 = en serie)
+        use_cache: Si debe usar la caché OCR por hash de imagen
+        parquet: Si debe escribir también una salida Parquet al consolidar
+        log_file: Archivo donde escribir los mensajes del OCR (None = consola)
+        
+    Returns:
+        Tupla (exitosas, fallidas)
+    """
+    global USE_OCR_CACHE
+    USE_OCR_CACHE = use_cache
+    
+    if log_file:
+        # El scraper usa la consola (CAPTCHA); el OCR escribe en su propio log
+        log = open(log_file, 'a', encoding='utf-8', buffering=1)
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+    
+    manifest_file = output_paths(output_file)['manifest']
+    reset_incremental_outputs(output_file, manifest_file)
+    manifest = load_manifest(manifest_file)
+    
+    def pending():
+        for image_path in image_paths:
+            if not is_processed(manifest, image_path):
+                yield image_path
+    
+    ocr_results = iter_ocr_results(pending(), workers=workers)
+    writer = VehicleDataWriter(output_file, append=True)
+    
+    with writer:
+        successful, failed = write_results(ocr_results, writer, input_folder, manifest_file=manifest_file)
+    
+    total = consolidate_outputs(output_file, parquet_output=parquet)
+    print(f"\n✓ Pipeline OCR: {successful} exitosas, {failed} fallidas ({total} registros en {output_file})")
+    return successful, failed
+
+def ocr_consumer(image_queue, input_folder='output_images', output_file='vehicle_data_extracted.csv',
+                 workers=1, log_file=None):
+    """
+    Proceso consumidor del pipeline: aplica OCR a las rutas que llegan por la cola
+    
+    Args:
+        image_queue: multiprocessing.Queue con rutas de imágenes; None indica el final
+        input_folder: Carpeta de las imágenes
+        output_file: Archivo CSV principal
+        workers: Número de procesos OCR en paralelo
+        log_file: Archivo donde escribir los mensajes del OCR (None = consola)
+    """
+    process_image_stream(iter(image_queue.get, None), input_folder, output_file,
+                         workers=workers, log_file=log_file)
+
+def process_images(input_folder='output_images', output_file='vehicle_data_extracted.csv', workers=1,
+                   use_cache=True, incremental=False, parquet=False, batch_size=1, layout_file=None,
+                   profile=False, fallback_mode='length', inference_mode='int8', torch_threads=None,
+                   plate_store=None):
     """
     Procesa todas las imágenes en la carpeta y extrae información
     
     Args:
         input_folder: Carpeta con las imágenes
         output_file: Archivo CSV donde guardar los resultados
+        workers: Número de procesos OCR en paralelo (1 = en serie)
+        use_cache: Si debe usar la caché OCR por hash de imagen
+        incremental: Si debe saltar las imágenes ya procesadas (según el
+            manifiesto) y agregar a las salidas existentes
+        parquet: Si debe escribir también una salida Parquet (requiere pyarrow)
+        batch_size: Imágenes por lote de OCR (1 = imagen por imagen)
+        layout_file: Plantilla de regiones de campo (None = OCR de página completa)
+        profile: Si debe mostrar el tiempo y los bytes reservados por etapa de
+            preprocesamiento (solo en modo en serie)
+        fallback_mode: Criterio de pasadas adicionales ('length' o 'confidence')
+        inference_mode: Modo de inferencia de EasyOCR (ver OCR_INFERENCE_MODE)
+        torch_threads: Hilos intra-op de torch por proceso (None = automático)
+        plate_store: Almacén de placas del paso 1 (.db) donde registrar el
+            estado de OCR de cada placa (None = sin almacén)
+    
+    Cada resultado se escribe en las salidas (CSV, CSV simple, JSON y JSON Lines)
+    en cuanto se obtiene, sin acumularlos en memoria.
     """
+    global USE_OCR_CACHE, LAYOUT_TEMPLATE, OCR_FALLBACK_MODE, OCR_INFERENCE_MODE, TORCH_THREADS
+    USE_OCR_CACHE = use_cache
+    OCR_FALLBACK_MODE = fallback_mode
+    OCR_INFERENCE_MODE = inference_mode
+    # En paralelo los hilos se fijan en cada worker (init_worker)
+    TORCH_THREADS = torch_threads if workers <= 1 else None
+    
     print("\n" + "="*60)
     print("OCR - EXTRACCIÓN DE DATOS VEHICULARES")
     print("="*60)
     
+    if layout_file:
+        if not os.path.exists(layout_file):
+            print(f"❌ Error: No se encontró la plantilla {layout_file}")
+            print("   Calíbrala primero con: python step3_ocr_extract.py --calibrate <imagen>_resultado.png")
+            return
+        LAYOUT_TEMPLATE = layout_template.load_layout(layout_file)
+        print(f"✓ Modo plantilla: {len(LAYOUT_TEMPLATE['fields'])} regiones de campo ({layout_file})")
+    
     if not os.path.exists(input_folder):
         print(f"❌ Error: La carpeta {input_folder} no existe")
         print("   Por favor, ejecuta primero step2_scrape_sunarp.py")
@@ -474,97 +1298,85 @@ def process_images(input_folder='output_images', output_file='vehicle_data_extra
     
     print(f"\n✓ Encontradas {len(image_files)} imágenes '_resultado.png' para procesar")
     
-    # Verificar instalación de EasyOCR
-    try:
-        print("✓ EasyOCR disponible")
-        print("ℹ️  Nota: La primera ejecución descargará modelos (~100MB), puede tardar unos minutos")
-    except Exception as e:
-        print(f"\n❌ ERROR: EasyOCR no está disponible: {str(e)}")
+    manifest_file = output_paths(output_file)['manifest']
+    if incremental:
+        reset_incremental_outputs(output_file, manifest_file)
+        manifest = load_manifest(manifest_file)
+        pending = [
+            f for f in image_files
+            if not is_processed(manifest, os.path.join(input_folder, f))
+        ]
+        print(f"✓ Modo incremental: {len(image_files) - len(pending)} ya procesadas, {len(pending)} pendientes")
+        image_files = pending
+    
+    store = None
+    if plate_store:
+        from plate_store import PlateStore
+        store = PlateStore(plate_store)
+        unknown = sum(
+            1 for f in image_files
+            if store.get(os.path.splitext(f)[0].replace('_resultado', '')) is None
+        )
+        print(f"✓ Almacén de placas: {plate_store}"
+              + (f" ({unknown} imágenes de placas que no están en el almacén)" if unknown else ""))
+    
+    # Verificar instalación de EasyOCR (sin importarlo: se carga al primer fallo de caché)
+    if importlib.util.find_spec('easyocr') is None:
+        print("\n❌ ERROR: EasyOCR no está disponible")
         print("\nPara instalar: pip install easyocr")
         return
+    print("✓ EasyOCR disponible")
+    print("ℹ️  Nota: La primera ejecución descargará modelos (~100MB), puede tardar unos minutos")
     
-    results = []
-    successful = 0
-    failed = 0
+    writer = VehicleDataWriter(output_file, append=incremental, parquet_output=parquet)
     
-    for idx, image_file in enumerate(image_files, 1):
-        image_path = os.path.join(input_folder, image_file)
-        plate_number = os.path.splitext(image_file)[0].replace('_resultado', '')
-        
-        print(f"\n[{idx}/{len(image_files)}] Procesando: {image_file}")
-        print(f"   Placa: {plate_number}")
-        
-        try:
-            # Extraer texto con preprocesamiento
-            print("   ⚙️  Aplicando OCR...")
-            text = extract_text_from_image(image_path, preprocess=True)
-            
-            if not text.strip():
-                print("   ⚠️  No se extrajo texto, intentando sin preprocesamiento...")
-                text = extract_text_from_image(image_path, preprocess=False)
-            
-            if text.strip():
-                print(f"   ✓ Texto extraído ({len(text)} caracteres)")
-                
-                # Parsear datos
-                print("   ⚙️  Estructurando información...")
-                vehicle_data = parse_vehicle_data(text, plate_number)
-                results.append(vehicle_data)
-                
-                # Mostrar campos extraídos
-                print(f"   ✓ Placa: {vehicle_data['placa'] or 'N/A'}")
-                print(f"   ✓ Serie: {vehicle_data['n_serie'] or 'N/A'}")
-                print(f"   ✓ Motor: {vehicle_data['n_motor'] or 'N/A'}")
-                print(f"   ✓ Marca: {vehicle_data['marca'] or 'N/A'}")
-                print(f"   ✓ Modelo: {vehicle_data['modelo'] or 'N/A'}")
-                print(f"   ✓ Color: {vehicle_data['color'] or 'N/A'}")
-                print(f"   ✓ Estado: {vehicle_data['estado'] or 'N/A'}")
-                print(f"   ✓ Propietario(s): {vehicle_data['propietarios'][:50] or 'N/A'}...")
-                
-                successful += 1
-            else:
-                print("   ❌ No se pudo extraer texto de la imagen")
-                failed += 1
-                
-        except Exception as e:
-            print(f"   ❌ Error: {str(e)}")
-            failed += 1
+    if workers > 1:
+        print(f"⚙️  Modo paralelo: {workers} procesos OCR")
+    if batch_size > 1:
+        print(f"⚙️  Modo por lotes: {batch_size} imágenes por lote")
+        print("   ⚠️  Solo acelera con GPU; en CPU es más lento que imagen por imagen")
+    if fallback_mode == 'confidence':
+        print(f"⚙️  Pasadas adicionales por confianza (decisiones en {OCR_DECISION_LOG})")
+    if inference_mode != 'int8':
+        print(f"⚙️  Modo de inferencia: {inference_mode}")
     
-    # Guardar resultados
-    if results:
-        # Convertir a DataFrame
-        import pandas as pd
-        df = pd.DataFrame(results)
-        
-        # Reordenar columnas para mejor visualización
-        columns_order = [
-            'placa', 'n_serie', 'n_vin', 'n_motor', 'color', 'marca', 'modelo',
-            'placa_vigente', 'placa_anterior', 'estado', 'anotaciones', 'sede',
-            'año_modelo', 'propietarios', 'raw_text'
-        ]
-        
-        # Asegurar que todas las columnas existan
-        for col in columns_order:
-            if col not in df.columns:
-                df[col] = ''
-        
-        df = df[columns_order]
-        
-        # Guardar como CSV (principal)
-        df.to_csv(output_file, index=False, encoding='utf-8-sig')
-        print(f"\n✓ Resultados guardados en CSV: {output_file}")
-        
-        # También guardar como JSON (backup)
-        json_file = output_file.replace('.csv', '.json')
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        print(f"✓ Backup JSON guardado en: {json_file}")
-        
-        # Crear un CSV simplificado sin raw_text para fácil lectura
-        simple_csv = output_file.replace('.csv', '_simple.csv')
-        df_simple = df.drop('raw_text', axis=1, errors='ignore')
-        df_simple.to_csv(simple_csv, index=False, encoding='utf-8-sig')
-        print(f"✓ CSV simplificado (sin raw_text) guardado en: {simple_csv}")
+    image_paths = [os.path.join(input_folder, image_file) for image_file in image_files]
+    ocr_results = iter_ocr_results(image_paths, workers=workers, batch_size=batch_size,
+                                   torch_threads=torch_threads)
+    
+    try:
+        with writer:
+            successful, failed = write_results(ocr_results, writer, input_folder, total=len(image_files),
+                                               manifest_file=manifest_file if incremental else None,
+                                               state=store)
+    finally:
+        if store is not None:
+            store.close()
+    
+    if incremental:
+        total = consolidate_outputs(output_file, parquet_output=parquet)
+        print(f"\n✓ Salidas incrementales actualizadas: {output_file} ({total} registros)")
+        print(f"✓ Manifiesto: {manifest_file}")
+    elif writer.count:
+        paths = output_paths(output_file)
+        print(f"\n✓ Resultados guardados en CSV: {paths['csv']}")
+        print(f"✓ Backup JSON guardado en: {paths['json']}")
+        print(f"✓ JSON Lines guardado en: {paths['jsonl']}")
+        print(f"✓ CSV simplificado (sin raw_text) guardado en: {paths['simple_csv']}")
+        if writer.parquet_output:
+            print(f"✓ Parquet guardado en: {paths['parquet']}")
+    
+    if profile:
+        if workers > 1:
+            print("\nℹ️  Las estadísticas de preprocesamiento solo están disponibles con --workers 1")
+        else:
+            get_preprocessor().stats.report()
+    
+    # Limpiar entradas antiguas de la caché
+    if use_cache:
+        removed = ocr_cache.evict(OCR_CACHE_FILE, OCR_CACHE_MAX_AGE_DAYS, OCR_CACHE_MAX_ENTRIES)
+        if removed:
+            print(f"✓ Caché OCR: {removed} entradas antiguas eliminadas")
     
     # Resumen
     print("\n" + "="*60)
@@ -575,9 +1387,368 @@ def process_images(input_folder='output_images', output_file='vehicle_data_extra
     print(f"❌ Fallidas: {failed}")
     print("="*60)
 
+def cached_text(image_path):
+    """
+    Retorna el texto OCR guardado en la caché para una imagen, sin ejecutar OCR
+    
+    Args:
+        image_path: Ruta a la imagen *_resultado.png
+        
+    Returns:
+        Texto guardado, o None si la imagen no está en la caché
+    """
+    params_key = ocr_cache_params()
+    digest = ocr_cache.image_hash(OCR_CACHE_FILE, image_path)
+    first_variant = 'adaptive' if OCR_FALLBACK_MODE == 'confidence' else 'preprocess'
+    
+    # Mismo orden que ocr_image: con preprocesamiento y, si no dio texto, sin él
+    for variant in (first_variant, 'crop'):
+        text = ocr_cache.get_cached_text(OCR_CACHE_FILE, digest, variant, params_key)
+        if text is not None and text.strip():
+            return text
+    return None
+
+def is_cached(image_path):
+    """
+    Indica si el OCR de una imagen se puede tomar de la caché sin cargar EasyOCR
+    
+    Args:
+        image_path: Ruta a la imagen *_resultado.png
+        
+    Returns:
+        True si la imagen está en la caché (con la configuración actual)
+    """
+    if not USE_OCR_CACHE:
+        return False
+    if LAYOUT_TEMPLATE is not None:
+        digest = ocr_cache.image_hash(OCR_CACHE_FILE, image_path)
+        cached = ocr_cache.get_cached_text(OCR_CACHE_FILE, digest, 'template', template_cache_params(LAYOUT_TEMPLATE))
+        # Con pocos campos, ocr_image sigue con el OCR de página completa
+        if cached is not None and sum(1 for value in json.loads(cached).values() if value) >= TEMPLATE_MIN_FIELDS:
+            return True
+    return cached_text(image_path) is not None
+
+def iter_stored_texts(output_file, input_folder, source='outputs'):
+    """
+    Lee los textos OCR ya extraídos, registro por registro
+    
+    Args:
+        output_file: Archivo CSV principal (las demás rutas se derivan de él)
+        input_folder: Carpeta con las imágenes (solo para source='cache')
+        source: 'outputs' (JSON Lines, o el JSON de respaldo si no existe)
+            o 'cache' (caché OCR de las imágenes de input_folder)
+        
+    Yields:
+        Tuplas (source_image, plate_number, raw_text, registro_anterior);
+        registro_anterior es None si el texto viene de la caché
+    """
+    paths = output_paths(output_file)
+    
+    if source == 'cache':
+        if not os.path.exists(OCR_CACHE_FILE):
+            return
+        image_files = sorted(
+            f for f in os.listdir(input_folder)
+            if f.lower().endswith('_resultado.png') and not 'ERROR' in f.upper()
+        )
+        for image_file in image_files:
+            text = cached_text(os.path.join(input_folder, image_file))
+            if text is None:
+                print(f"   ⚠️  {image_file}: no está en la caché OCR, se omite")
+                continue
+            plate_number = os.path.splitext(image_file)[0].replace('_resultado', '')
+            yield image_file, plate_number, text, None
+        return
+    
+    if os.path.exists(paths['jsonl']):
+        records = iter_jsonl(paths['jsonl'])
+    elif os.path.exists(paths['json']):
+        # El arreglo JSON no se puede leer en streaming con la librería estándar
+        with open(paths['json'], 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    else:
+        return
+    
+    for record in records:
+        source_image = record.pop('source_image', None)
+        if source_image:
+            plate_number = os.path.splitext(source_image)[0].replace('_resultado', '')
+        else:
+            # Registros sin imagen de origen (JSON antiguo): la placa guardada
+            plate_number = record.get('placa', '')
+        yield source_image, plate_number, record.get('raw_text', ''), record
+
+def reparse_outputs(output_file='vehicle_data_extracted.csv', input_folder='output_images',
+                    source='outputs', workers=1, parquet=False, fallback_mode='length'):
+    """
+    Reconstruye las salidas volviendo a aplicar parse_vehicle_data sobre los
+    textos ya extraídos, sin ejecutar OCR
+    
+    Las salidas nuevas se escriben en archivos temporales y reemplazan a las
+    anteriores al terminar, así que la fuente puede ser el mismo JSON Lines.
+    
+    Args:
+        output_file: Archivo CSV principal
+        input_folder: Carpeta con las imágenes (solo para source='cache')
+        source: Origen de los textos ('outputs' o 'cache', ver iter_stored_texts)
+        workers: Número de procesos de parseo en paralelo (1 = en serie)
+        parquet: Si debe escribir también una salida Parquet (requiere pyarrow)
+        fallback_mode: Criterio de pasadas adicionales con el que se llenó la
+            caché ('length' o 'confidence'; solo para source='cache')
+    """
+    global OCR_FALLBACK_MODE
+    OCR_FALLBACK_MODE = fallback_mode
+    
+    print("\n" + "="*60)
+    print("REPARSEO DE DATOS VEHICULARES (SIN OCR)")
+    print("="*60)
+    
+    paths = output_paths(output_file)
+    base = output_file[:-4] if output_file.endswith('.csv') else output_file
+    temp_output = base + '_reparse.csv'
+    temp_paths = output_paths(temp_output)
+    
+    changed_fields = {field: 0 for field in COMPARE_FIELDS}
+    changed = 0
+    
+    def items():
+        # Del registro anterior solo se guardan los campos comparados (para
+        # reportar qué cambió con el parser actual)
+        for source_image, plate_number, raw_text, record in iter_stored_texts(output_file, input_folder, source):
+            previous = None if record is None else {field: record.get(field, '') for field in COMPARE_FIELDS}
+            yield (source_image, plate_number, raw_text), previous
+    
+    def results():
+        stored = items()
+        if pool is None:
+            for item, previous in stored:
+                yield reparse_record(item), previous
+            return
+        # Ventanas de REPARSE_WINDOW_CHUNKS tareas por worker: pool.imap consume
+        # su iterador completo sin esperar, así que se le pasa una ventana a la vez
+        window_size = REPARSE_CHUNK_SIZE * REPARSE_WINDOW_CHUNKS * workers
+        while True:
+            window = list(itertools.islice(stored, window_size))
+            if not window:
+                return
+            parsed = pool.imap(reparse_record, (item for item, _ in window), chunksize=REPARSE_CHUNK_SIZE)
+            yield from zip(parsed, (previous for _, previous in window))
+    
+    pool = None
+    if workers > 1:
+        print(f"⚙️  Modo paralelo: {workers} procesos de parseo")
+        pool = multiprocessing.Pool(workers)
+    
+    writer = VehicleDataWriter(temp_output, parquet_output=parquet)
+    try:
+        with writer:
+            for (source_image, vehicle_data), previous in results():
+                writer.write(vehicle_data, source_image=source_image)
+                
+                if previous is not None:
+                    diff = [field for field in COMPARE_FIELDS if previous[field] != vehicle_data[field]]
+                    for field in diff:
+                        changed_fields[field] += 1
+                    if diff:
+                        changed += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    
+    if not writer.count:
+        print(f"❌ No se encontraron textos para reparsear ({paths['jsonl']}, {paths['json']}"
+              f"{' o la caché OCR' if source == 'cache' else ''})")
+        return
+    
+    # Reemplazar las salidas anteriores
+    for kind, temp_path in temp_paths.items():
+        if os.path.exists(temp_path):
+            os.replace(temp_path, paths[kind])
+    
+    print(f"\n✓ {writer.count} registros reparseados desde "
+          f"{'la caché OCR' if source == 'cache' else 'las salidas existentes'}")
+    print(f"✓ Salidas reescritas: {paths['csv']}, {paths['simple_csv']}, {paths['json']}, {paths['jsonl']}")
+    if writer.parquet_output:
+        print(f"✓ Parquet reescrito: {paths['parquet']}")
+    
+    if source != 'cache':
+        print(f"✓ Registros con cambios: {changed}")
+        for field, count in changed_fields.items():
+            if count:
+                print(f"   {field}: {count}")
+
+def normalize_field(value):
+    """Normaliza un valor para comparar campos (mayúsculas y espacios simples)"""
+    return ' '.join(str(value or '').upper().split())
+
+def compare_inference_modes(labels_file, input_folder='output_images', modes=None, torch_threads=None):
+    """
+    Compara velocidad y precisión de los modos de inferencia sobre una muestra etiquetada
+    
+    El archivo de etiquetas es un JSON Lines (o arreglo JSON) con los valores
+    correctos de cada imagen, con el mismo formato que vehicle_data_extracted.jsonl:
+    cada registro tiene source_image y los campos verificados a mano. Solo se
+    evalúan los campos presentes en cada registro. La caché OCR no se usa.
+    
+    Args:
+        labels_file: Archivo con los registros etiquetados
+        input_folder: Carpeta con las imágenes
+        modes: Modos a comparar (None = todos; el primero es la referencia)
+        torch_threads: Hilos intra-op de torch (None = automático)
+        
+    Returns:
+        Diccionario {modo: {'seconds_per_image', 'load_seconds', 'accuracy', 'fields', 'agreement'}}
+    """
+    global reader, USE_OCR_CACHE, OCR_INFERENCE_MODE, TORCH_THREADS
+    TORCH_THREADS = torch_threads
+    
+    if labels_file.endswith('.jsonl'):
+        labels = list(iter_jsonl(labels_file))
+    else:
+        with open(labels_file, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+    
+    samples = []
+    for record in labels:
+        image_file = record.get('source_image') or f"{record['placa']}_resultado.png"
+        image_path = os.path.join(input_folder, image_file)
+        if not os.path.exists(image_path):
+            print(f"   ⚠️  {image_file}: imagen no encontrada, se omite")
+            continue
+        expected = {field: normalize_field(record[field]) for field in COMPARE_FIELDS if field in record}
+        samples.append((image_path, expected))
+    
+    if not samples:
+        print(f"❌ No hay imágenes etiquetadas para evaluar en {labels_file}")
+        return {}
+    
+    modes = modes or INFERENCE_MODES
+    previous_cache, previous_mode = USE_OCR_CACHE, OCR_INFERENCE_MODE
+    USE_OCR_CACHE = False
+    
+    print(f"\n✓ {len(samples)} imágenes etiquetadas, modos: {', '.join(modes)}")
+    
+    report = {}
+    reference = None
+    try:
+        for mode in modes:
+            OCR_INFERENCE_MODE = mode
+            reader = None
+            start = time.perf_counter()
+            get_reader()
+            load_seconds = time.perf_counter() - start
+            
+            outputs = []
+            start = time.perf_counter()
+            for image_path, _expected in samples:
+                _image_file, _plate, vehicle_data, _error = ocr_image(image_path)
+                outputs.append({field: normalize_field((vehicle_data or {}).get(field)) for field in COMPARE_FIELDS})
+            seconds = time.perf_counter() - start
+            
+            correct = {field: [0, 0] for field in COMPARE_FIELDS}
+            for output, (_image_path, expected) in zip(outputs, samples):
+                for field, value in expected.items():
+                    correct[field][1] += 1
+                    correct[field][0] += output[field] == value
+            total_correct = sum(hits for hits, _ in correct.values())
+            total_fields = sum(count for _, count in correct.values())
+            
+            if reference is None:
+                reference = outputs
+            same = sum(
+                output[field] == ref[field]
+                for output, ref in zip(outputs, reference) for field in COMPARE_FIELDS
+            )
+            
+            report[mode] = {
+                'seconds_per_image': seconds / len(samples),
+                'load_seconds': load_seconds,
+                'accuracy': total_correct / total_fields if total_fields else 0.0,
+                'fields': {field: hits / count for field, (hits, count) in correct.items() if count},
+                'agreement': same / (len(outputs) * len(COMPARE_FIELDS)),
+            }
+    finally:
+        USE_OCR_CACHE, OCR_INFERENCE_MODE = previous_cache, previous_mode
+        reader = None
+    
+    print("\n" + "="*60)
+    print("COMPARACIÓN DE MODOS DE INFERENCIA")
+    print("="*60)
+    print(f"{'Modo':<10}{'Carga (s)':>10}{'s/imagen':>10}{'Precisión':>11}{f'= {modes[0]}':>12}")
+    for mode, result in report.items():
+        print(f"{mode:<10}{result['load_seconds']:>10.1f}{result['seconds_per_image']:>10.2f}"
+              f"{result['accuracy']:>10.1%}{result['agreement']:>12.1%}")
+    print("\nPrecisión por campo:")
+    for field in COMPARE_FIELDS:
+        values = [f"{mode}={result['fields'][field]:.0%}" for mode, result in report.items() if field in result['fields']]
+        if values:
+            print(f"   {field}: {'  '.join(values)}")
+    
+    return report
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Extrae datos vehiculares de las imágenes de SUNARP con OCR")
+    parser.add_argument('--input-folder', default='output_images',
+                        help="Carpeta con las imágenes *_resultado.png")
+    parser.add_argument('--output', default='vehicle_data_extracted.csv',
+                        help="Archivo CSV de salida")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Número de procesos OCR en paralelo (1 = en serie)")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="Imágenes por lote de OCR (solo para GPU; en CPU es más lento, usar 1 = imagen por imagen)")
+    parser.add_argument('--layout', nargs='?', const=LAYOUT_FILE, default=None,
+                        help=f"Usar la plantilla de regiones de campo (por defecto {LAYOUT_FILE})")
+    parser.add_argument('--calibrate', metavar='IMAGEN',
+                        help="Calibrar la plantilla de regiones con una imagen de referencia y salir")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Saltar imágenes ya procesadas y agregar resultados a medida que se obtienen")
+    parser.add_argument('--parquet', action='store_true',
+                        help="Escribir también una salida Parquet por grupos de filas (requiere pyarrow)")
+    parser.add_argument('--fallback', choices=['length', 'confidence'], default='length',
+                        help="Criterio para pasadas de OCR adicionales: largo del texto o confianza por región")
+    parser.add_argument('--inference', choices=INFERENCE_MODES, default=OCR_INFERENCE_MODE,
+                        help="Modo de inferencia de EasyOCR en CPU (fp32, int8 o int8-jit)")
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help="Hilos intra-op de torch por proceso (por defecto: núcleos / workers)")
+    parser.add_argument('--compare-inference', metavar='ETIQUETAS',
+                        help="Comparar velocidad y precisión de los modos de inferencia sobre una "
+                             "muestra etiquetada (JSON Lines con source_image y los campos correctos) y salir")
+    parser.add_argument('--profile-preprocessing', action='store_true',
+                        help="Mostrar tiempo y bytes reservados por etapa de preprocesamiento")
+    parser.add_argument('--reparse', nargs='?', const='outputs', choices=['outputs', 'cache'],
+                        help="Sin OCR: volver a parsear los textos ya extraídos (de las salidas o de la caché OCR) "
+                             "y reescribir las salidas")
+    parser.add_argument('--plate-store', metavar='DB', default=None,
+                        help="Almacén de placas del paso 1 (.db) donde registrar el estado de OCR por placa")
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f"No usar la caché OCR ({OCR_CACHE_FILE})")
+    return parser.parse_args()
+
 def main():
     """Función principal"""
-    process_images()
+    args = parse_args()
+    
+    if args.calibrate:
+        calibrate_layout(args.calibrate, args.layout or LAYOUT_FILE)
+        return
+    
+    if args.compare_inference:
+        compare_inference_modes(args.compare_inference, args.input_folder, torch_threads=args.torch_threads)
+        return
+    
+    if args.reparse:
+        reparse_outputs(args.output, args.input_folder, source=args.reparse,
+                        workers=args.workers, parquet=args.parquet, fallback_mode=args.fallback)
+        return
+    
+    process_images(args.input_folder, args.output, workers=args.workers, use_cache=not args.no_cache,
+                   incremental=args.incremental, parquet=args.parquet,
+                   batch_size=args.batch_size, layout_file=args.layout,
+                   profile=args.profile_preprocessing, fallback_mode=args.fallback,
+                   inference_mode=args.inference, torch_threads=args.torch_threads,
+                   plate_store=args.plate_store)
 
 if __name__ == "__main__":
     main()
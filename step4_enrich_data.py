@@ -0,0 +1,275 @@
+"""
+Paso 4: une los datos extraídos por OCR (paso 3) con los datos de origen de
+cada placa (paso 1) y escribe un dataset enriquecido.
+
+A cada registro de vehicle_data_extracted.jsonl se le agregan TENENCIA, MARCA,
+RUC y ANIO_FAB de la placa consultada (la de la imagen de origen) y estos
+indicadores (vacíos si falta alguno de los dos valores):
+- en_dataset: la placa está en los datos del paso 1
+- placa_coincide: la placa leída por OCR es la consultada
+- marca_coincide: la marca leída por OCR coincide con MARCA
+- anio_diferencia: año_modelo menos ANIO_FAB
+- anio_coincide: la diferencia está dentro de YEAR_TOLERANCE
+- discrepancias: campos que no coinciden, separados por ';'
+
+La unión se hace en streaming y con memoria acotada: los registros OCR se leen
+por lotes y las placas de cada lote se buscan por índice en el almacén de
+plate_store. Si las placas están en .json o .jsonl, primero se copian a un
+almacén temporal en disco, leyéndolas registro por registro (el arreglo .json
+con step1_extract_plates.iter_json_array), así que la memoria no depende del
+número de placas. La copia es una pasada extra sobre el archivo (con .json,
+unas dos veces más lenta que con .jsonl); con un almacén .db no hace falta.
+"""
+import os
+import re
+import csv
+import json
+import shutil
+import argparse
+import tempfile
+from plate_store import PlateStore, is_store_file
+from vehicle_writers import SIMPLE_COLUMNS, output_paths, iter_jsonl
+
+# Registros OCR por lote de búsqueda en el almacén
+BATCH_SIZE = 1000
+
+# Diferencia aceptada entre año_modelo y ANIO_FAB: el año de modelo suele ser
+# el de fabricación o el siguiente
+YEAR_TOLERANCE = 1
+
+# Columnas del paso 1 que se agregan (con su nombre original)
+DATASET_COLUMNS = ['TENENCIA', 'MARCA', 'RUC', 'ANIO_FAB']
+
+FLAG_COLUMNS = ['en_dataset', 'placa_coincide', 'marca_coincide', 'anio_diferencia', 'anio_coincide',
+                'discrepancias']
+
+ENRICHED_COLUMNS = ['placa_consultada'] + SIMPLE_COLUMNS + DATASET_COLUMNS + FLAG_COLUMNS
+
+_PLATE_SEPARATORS = re.compile(r'[\s\-]+')
+_NOT_ALNUM = re.compile(r'[^A-Z0-9]')
+_YEAR = re.compile(r'\d{4}')
+
+def normalize_key(plate):
+    """Normaliza una placa para la unión (mayúsculas, sin espacios ni guiones), igual que el paso 1"""
+    return _PLATE_SEPARATORS.sub('', str(plate or '').upper())
+
+def normalize_brand(value):
+    """Normaliza una marca para comparar (solo letras y dígitos: MERCEDES-BENZ = MERCEDES BENZ)"""
+    return _NOT_ALNUM.sub('', str(value or '').upper())
+
+def parse_year(value):
+    """Retorna el año como entero, o None si no es un año de cuatro dígitos"""
+    value = str(value if value is not None else '').strip()
+    if value.endswith('.0'):
+        value = value[:-2]
+    return int(value) if _YEAR.fullmatch(value) else None
+
+def iter_extracted(input_file):
+    """
+    Lee los registros del paso 3, registro por registro
+
+    Args:
+        input_file: JSON Lines (con la imagen de origen), arreglo JSON o CSV del paso 3
+
+    Yields:
+        Tuplas (placa consultada, registro); sin imagen de origen, la placa
+        consultada es la leída por OCR
+    """
+    def pairs(records):
+        for record in records:
+            source_image = record.pop('source_image', None)
+            if source_image:
+                plate_number = os.path.splitext(source_image)[0].replace('_resultado', '')
+            else:
+                plate_number = record.get('placa', '')
+            yield plate_number, record
+
+    if input_file.endswith('.jsonl'):
+        yield from pairs(iter_jsonl(input_file))
+    elif input_file.endswith('.json'):
+        # El arreglo JSON no se puede leer en streaming con la librería estándar
+        with open(input_file, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        yield from pairs(records)
+    else:
+        with open(input_file, 'r', newline='', encoding='utf-8-sig') as f:
+            yield from pairs(csv.DictReader(f))
+
+def open_plate_store(plates_file, temp_dir):
+    """
+    Abre las placas del paso 1 como almacén indexado
+
+    Args:
+        plates_file: Almacén .db, o plates_data.json/.jsonl (se leen en streaming)
+        temp_dir: Carpeta donde crear el almacén temporal para .json/.jsonl
+
+    Returns:
+        PlateStore
+    """
+    if is_store_file(plates_file):
+        return PlateStore(plates_file)
+
+    from step1_extract_plates import iter_plates
+
+    print(f"Indexando {plates_file} en un almacén temporal...")
+    store = PlateStore(os.path.join(temp_dir, 'plates.db'))
+    store.add_plates(
+        dict(plate_data, PLACA=normalize_key(plate_data.get('PLACA')))
+        for plate_data in iter_plates(plates_file)
+        if normalize_key(plate_data.get('PLACA'))
+    )
+    return store
+
+def compare(plate_key, record, plate_data):
+    """
+    Calcula los indicadores de discrepancia de un registro
+
+    Args:
+        plate_key: Placa consultada, normalizada con normalize_key
+        record: Registro del paso 3
+        plate_data: Registro del paso 1 (None si la placa no está)
+
+    Returns:
+        Diccionario con las columnas FLAG_COLUMNS (None: no se puede comparar)
+    """
+    flags = dict.fromkeys(FLAG_COLUMNS)
+    flags['en_dataset'] = plate_data is not None
+
+    ocr_plate = normalize_key(record.get('placa'))
+    if ocr_plate and plate_key:
+        flags['placa_coincide'] = ocr_plate == plate_key
+
+    if plate_data is not None:
+        ocr_brand = normalize_brand(record.get('marca'))
+        brand = normalize_brand(plate_data.get('MARCA'))
+        if ocr_brand and brand:
+            flags['marca_coincide'] = ocr_brand == brand
+
+        ocr_year = parse_year(record.get('año_modelo'))
+        year = parse_year(plate_data.get('ANIO_FAB'))
+        if ocr_year is not None and year is not None:
+            flags['anio_diferencia'] = ocr_year - year
+            flags['anio_coincide'] = abs(ocr_year - year) <= YEAR_TOLERANCE
+
+    flags['discrepancias'] = ';'.join(
+        field for field, flag in (('placa', 'placa_coincide'), ('marca', 'marca_coincide'), ('anio', 'anio_coincide'))
+        if flags[flag] is False
+    )
+    return flags
+
+def enrich_records(records, store, batch_size=BATCH_SIZE):
+    """
+    Une los registros del paso 3 con las placas del almacén, por lotes
+
+    Args:
+        records: Iterable de tuplas (placa consultada, registro), ver iter_extracted
+        store: PlateStore con las placas del paso 1
+        batch_size: Registros por lote de búsqueda
+
+    Yields:
+        Diccionarios con las columnas ENRICHED_COLUMNS
+    """
+    batch = []
+
+    def flush():
+        keys = [normalize_key(plate_number) for plate_number, _ in batch]
+        found = store.get_many(keys)
+        for key, (plate_number, record) in zip(keys, batch):
+            plate_data = found.get(key)
+            row = {'placa_consultada': plate_number}
+            row.update((column, record.get(column, '')) for column in SIMPLE_COLUMNS)
+            row.update((column, plate_data.get(column, '') if plate_data else '') for column in DATASET_COLUMNS)
+            row.update(compare(key, record, plate_data))
+            yield row
+        batch.clear()
+
+    for item in records:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
+
+def enrich_dataset(input_file='vehicle_data_extracted.jsonl', plates_file='plates_data.json',
+                   output_file='vehicle_data_enriched.csv', batch_size=BATCH_SIZE):
+    """
+    Escribe el dataset enriquecido (CSV, o JSON Lines si output_file termina en .jsonl)
+
+    Args:
+        input_file: Salida del paso 3 (.jsonl, .json o .csv)
+        plates_file: Salida del paso 1 (.json, .jsonl o almacén .db)
+        output_file: Archivo de salida
+        batch_size: Registros por lote de búsqueda
+
+    Returns:
+        Diccionario con los conteos (registros, en el dataset y discrepancias por campo)
+    """
+    stats = {'records': 0, 'in_dataset': 0, 'placa': 0, 'marca': 0, 'anio': 0}
+    temp_dir = tempfile.mkdtemp(prefix='enrich_')
+    temp_file = output_file + '.tmp'
+    jsonl = output_file.endswith('.jsonl')
+
+    store = open_plate_store(plates_file, temp_dir)
+    try:
+        print(f"Uniendo {input_file} con {plates_file} ({len(store):,} placas)")
+        with open(temp_file, 'w', newline='', encoding='utf-8' if jsonl else 'utf-8-sig') as f:
+            writer = None if jsonl else csv.DictWriter(f, fieldnames=ENRICHED_COLUMNS, lineterminator='\n')
+            if writer:
+                writer.writeheader()
+
+            for row in enrich_records(iter_extracted(input_file), store, batch_size):
+                if writer:
+                    writer.writerow(row)
+                else:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+                stats['records'] += 1
+                stats['in_dataset'] += row['en_dataset']
+                for field in row['discrepancias'].split(';') if row['discrepancias'] else []:
+                    stats[field] += 1
+                if stats['records'] % 100_000 == 0:
+                    print(f"   {stats['records']:,} registros")
+        os.replace(temp_file, output_file)
+    finally:
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    return stats
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Une los datos extraídos por OCR con los datos de origen de cada placa")
+    parser.add_argument('--input', default=None,
+                        help="Salida del paso 3: .jsonl (por defecto, el de --ocr-output), .json o .csv")
+    parser.add_argument('--ocr-output', default='vehicle_data_extracted.csv',
+                        help="Archivo CSV principal del paso 3 (se usa su JSON Lines)")
+    parser.add_argument('--plates-file', default='plates_data.json',
+                        help="Salida del paso 1: .json, .jsonl o almacén .db")
+    parser.add_argument('--output', default='vehicle_data_enriched.csv',
+                        help="Dataset enriquecido (.csv o .jsonl)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Registros por lote de búsqueda")
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+
+    input_file = args.input
+    if input_file is None:
+        paths = output_paths(args.ocr_output)
+        input_file = paths['jsonl'] if os.path.exists(paths['jsonl']) else args.ocr_output
+    for path in (input_file, args.plates_file):
+        if not os.path.exists(path):
+            print(f"❌ No se encontró el archivo {path}")
+            return
+
+    stats = enrich_dataset(input_file, args.plates_file, args.output, args.batch_size)
+
+    print(f"\n✓ {stats['records']:,} registros, {stats['in_dataset']:,} con la placa en el dataset")
+    print(f"   Discrepancias: placa {stats['placa']:,}, marca {stats['marca']:,}, año {stats['anio']:,}")
+    print(f"✓ Dataset enriquecido guardado en: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Servidor local que reemplaza al sitio de consulta vehicular de SUNARP.
+
+Sirve una página con el mismo contrato de DOM que usa el paso 2
+(#nroPlaca, div.button-login button, div.container-data-vehiculo img), sin
+CAPTCHA real, y responde cada consulta con la imagen de resultado grabada
+de la placa (los *_resultado.png de output_images/). Permite medir y probar
+el scraper sin acceder al sitio real ni resolver CAPTCHAs.
+
+Uso:
+    python sunarp_replay_server.py --port 8765 --latency 1.5 --error-rate 0.1
+    python step2_scrape_sunarp.py --base-url http://127.0.0.1:8765 --non-interactive
+"""
+import os
+import json
+import time
+import zlib
+import random
+import struct
+import argparse
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Misma ruta que el sitio real (ver step2_scrape_sunarp.CONSULTA_PATH)
+CONSULTA_PATH = '/consulta-vehicular/inicio'
+
+PAGE_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Consulta Vehicular (réplica local)</title>
+<style>
+  body { font-family: sans-serif; margin: 2em; }
+  .captcha { margin: 1em 0; padding: .5em; border: 1px dashed #999; width: 18em; }
+  .container-data-vehiculo img { max-width: 100%; }
+  .error { color: #b00; }
+</style>
+</head>
+<body>
+<h1>Consulta Vehicular</h1>
+<form onsubmit="return false;">
+  <label for="nroPlaca">N° de placa</label>
+  <input id="nroPlaca" name="nroPlaca" maxlength="10" autocomplete="off">
+  <div class="captcha">CAPTCHA simulado: no requiere respuesta</div>
+  <div class="button-login"><button type="button" id="btnBuscar">Realizar búsqueda</button></div>
+</form>
+<div id="mensaje" class="error"></div>
+<div id="resultado"></div>
+<script>
+document.getElementById('btnBuscar').addEventListener('click', function () {
+  var button = this;
+  var plate = document.getElementById('nroPlaca').value.trim().toUpperCase();
+  var message = document.getElementById('mensaje');
+  var result = document.getElementById('resultado');
+  message.textContent = '';
+  result.innerHTML = '';
+  button.disabled = true;
+  fetch('/api/consulta?placa=' + encodeURIComponent(plate))
+    .then(function (response) {
+      return response.json().then(function (body) {
+        if (!response.ok) { throw new Error(body.error || ('HTTP ' + response.status)); }
+        return body;
+      });
+    })
+    .then(function (body) {
+      var container = document.createElement('div');
+      container.className = 'container-data-vehiculo';
+      var img = document.createElement('img');
+      img.src = body.image;
+      container.appendChild(img);
+      result.appendChild(container);
+    })
+    .catch(function (error) { message.textContent = error.message; })
+    .then(function () { button.disabled = false; });
+});
+</script>
+</body>
+</html>
+"""
+
+def blank_png(width=400, height=300):
+    """
+    Genera un PNG en blanco (sin dependencias), para placas sin imagen grabada
+
+    Args:
+        width: Ancho en píxeles
+        height: Alto en píxeles
+
+    Returns:
+        Bytes del PNG
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    row = b'\x00' + b'\xff' * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+class ReplayConfig:
+    """
+    Configuración y contadores del servidor de réplica
+
+    Args:
+        recordings_folder: Carpeta con los *_resultado.png grabados
+        latency: Segundos promedio que tarda cada consulta
+        jitter: Variación máxima (±) de la latencia, en segundos
+        page_latency: Segundos que tarda en servirse la página
+        error_rate: Fracción de consultas que fallan (HTTP 503)
+        strict: Si es True, una placa sin imagen grabada responde 404; si es
+            False, se responde con una de las imágenes grabadas (o una en blanco)
+        seed: Semilla del generador aleatorio (resultados reproducibles)
+    """
+
+    def __init__(self, recordings_folder='output_images', latency=1.0, jitter=0.0, page_latency=0.0,
+                 error_rate=0.0, strict=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.page_latency = page_latency
+        self.error_rate = error_rate
+        self.strict = strict
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'pages': 0, 'queries': 0, 'errors': 0, 'not_found': 0}
+
+        self.recordings = {}
+        if os.path.isdir(recordings_folder):
+            for entry in os.scandir(recordings_folder):
+                if entry.name.lower().endswith('_resultado.png'):
+                    self.recordings[entry.name[:-len('_resultado.png')].upper()] = entry.path
+        self._fallback = sorted(self.recordings.values())
+        self._blank = blank_png()
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def query_delay(self):
+        """Latencia de una consulta (latency ± jitter)"""
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def fails(self):
+        """Sortea si la consulta falla según error_rate"""
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def image_for(self, plate):
+        """
+        Retorna los bytes de la imagen de una placa
+
+        Returns:
+            Bytes del PNG, o None si no hay imagen grabada y strict es True
+        """
+        path = self.recordings.get(plate)
+        if path is None:
+            if self.strict:
+                return None
+            if not self._fallback:
+                return self._blank
+            path = self._fallback[zlib.crc32(plate.encode()) % len(self._fallback)]
+        with open(path, 'rb') as f:
+            return f.read()
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Atiende la página, la API de consulta y las imágenes de resultado"""
+
+    config = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Sin una línea por petición: en un benchmark ensucia la consola
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        self._send(status, 'application/json; charset=utf-8', json.dumps(data).encode('utf-8'))
+
+    def do_GET(self):
+        config = self.config
+        url = urllib.parse.urlsplit(self.path)
+
+        if url.path in ('/', CONSULTA_PATH):
+            config.count('pages')
+            if config.page_latency:
+                time.sleep(config.page_latency)
+            self._send(200, 'text/html; charset=utf-8', PAGE_HTML.encode('utf-8'))
+
+        elif url.path == '/api/consulta':
+            config.count('queries')
+            plate = urllib.parse.parse_qs(url.query).get('placa', [''])[0].strip().upper()
+            time.sleep(config.query_delay())
+            if config.fails():
+                config.count('errors')
+                self._send_json(503, {'error': 'Servicio no disponible, intente nuevamente'})
+            elif not plate or (config.strict and plate not in config.recordings):
+                config.count('not_found')
+                self._send_json(404, {'error': f'No se encontró información para la placa {plate}'})
+            else:
+                self._send_json(200, {'image': f'/resultado/{urllib.parse.quote(plate)}.png'})
+
+        elif url.path.startswith('/resultado/') and url.path.endswith('.png'):
+            plate = urllib.parse.unquote(url.path[len('/resultado/'):-len('.png')])
+            image = config.image_for(plate)
+            if image is None:
+                self._send(404, 'text/plain; charset=utf-8', b'not found')
+            else:
+                self._send(200, 'image/png', image)
+
+        else:
+            self._send(404, 'text/plain; charset=utf-8', b'not found')
+
+def start_server(config, host='127.0.0.1', port=0):
+    """
+    Inicia el servidor de réplica en un hilo en segundo plano
+
+    Args:
+        config: ReplayConfig
+        host: Interfaz donde escuchar
+        port: Puerto (0 para elegir uno libre)
+
+    Returns:
+        Tupla (servidor, URL base); detenerlo con servidor.shutdown()
+    """
+    handler = type('ConfiguredReplayHandler', (ReplayHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def parse_args():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Réplica local del sitio de consulta vehicular de SUNARP")
+    parser.add_argument('--host', default='127.0.0.1', help="Interfaz donde escuchar")
+    parser.add_argument('--port', type=int, default=8765, help="Puerto")
+    parser.add_argument('--recordings', default='output_images',
+                        help="Carpeta con los *_resultado.png grabados por placa")
+    parser.add_argument('--latency', type=float, default=1.0, help="Segundos promedio por consulta")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Variación (±) de la latencia en segundos")
+    parser.add_argument('--page-latency', type=float, default=0.0, help="Segundos para servir la página")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de consultas que fallan")
+    parser.add_argument('--strict', action='store_true',
+                        help="Responder 404 a las placas sin imagen grabada")
+    parser.add_argument('--seed', type=int, default=None, help="Semilla aleatoria")
+    return parser.parse_args()
+
+def main():
+    """Función principal"""
+    args = parse_args()
+    config = ReplayConfig(args.recordings, args.latency, args.jitter, args.page_latency,
+                          args.error_rate, args.strict, args.seed)
+    server, base_url = start_server(config, args.host, args.port)
+
+    print(f"✓ Réplica de SUNARP en {base_url}{CONSULTA_PATH}")
+    print(f"✓ {len(config.recordings)} imágenes grabadas en {args.recordings}/")
+    print(f"⚙️  Latencia: {args.latency:g} ± {args.jitter:g} s, errores: {args.error_rate:.0%}")
+    print(f"   Scraper: python step2_scrape_sunarp.py --base-url {base_url} --non-interactive")
+    print("   Ctrl+C para detener")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(f"\n✓ Páginas: {config.counts['pages']}, consultas: {config.counts['queries']}, "
+              f"errores: {config.counts['errors']}, sin datos: {config.counts['not_found']}")
+
+if __name__ == "__main__":
+    main()
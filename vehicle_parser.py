@@ -0,0 +1,638 @@
+"""
+Parser de los datos vehiculares extraídos por OCR (paso 3).
+
+parse_vehicle_data produce exactamente el mismo diccionario que el parser
+original (parse_vehicle_data_legacy), pero:
+- todas las expresiones regulares se compilan una sola vez al importar
+- una sola búsqueda con la alternativa de palabras clave (PLACA, SERIE,
+  VIN, ...) recorre el texto y da las posiciones candidatas; cada patrón
+  original se evalúa solo en esas posiciones con .match(), en lugar de 25
+  re.search sobre todo el texto
+- el recorrido línea por línea se hace en una sola pasada, y el bloque de
+  PROPIETARIO(S) ya no vuelve a recorrer el resto de las líneas (antes era
+  cuadrático)
+
+Con los textos de OCR típicos (un registro completo) el tiempo es parecido al
+del parser original (medido: 1.0-1.3x); la ganancia está en los textos con
+muchas líneas de propietarios (unas 20x con 200 líneas), donde el original
+es cuadrático. Para medirlo sobre textos propios: --benchmark.
+
+Para verificar la equivalencia sobre textos guardados y textos aleatorios:
+    python vehicle_parser.py --check vehicle_data_extracted.json --fuzz 100000
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+# Patrones mejorados basados en el formato visual de SUNARP
+# Los campos vienen como "ETIQUETA: VALOR" o "ETIQUETA:VALOR"
+PATTERNS = {
+    'placa': [
+        r'N[°º]?\s*PLACA\s*[:\s]+\s*([A-Z0-9\-]+)',
+        r'PLACA\s*[:\s]+\s*([A-Z0-9\-]+)',
+    ],
+    'n_serie': [
+        r'N[°º]?\s*SERIE\s*[:\s]+\s*([A-Z0-9]+)',
+        r'SERIE\s*[:\s]+\s*([A-Z0-9]+)',
+    ],
+    'n_vin': [
+        r'N[°º]?\s*VIN\s*[:\s]+\s*([A-Z0-9]+)',
+        r'VIN\s*[:\s]+\s*([A-Z0-9]+)',
+    ],
+    'n_motor': [
+        r'N[°º]?\s*MOTOR\s*[:\s]+\s*([A-Z0-9]+)',
+        r'MOTOR\s*[:\s]+\s*([A-Z0-9]+)',
+    ],
+    'color': [
+        r'COLOR\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
+    ],
+    'marca': [
+        r'MARCA\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
+    ],
+    'modelo': [
+        r'MODELO\s*[:\s]+\s*([A-Z0-9\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
+    ],
+    'placa_vigente': [
+        r'PLACA\s+VIGENTE\s*[:\s]+\s*([A-Z0-9\-]+)',
+    ],
+    'placa_anterior': [
+        r'PLACA\s+ANTERIOR\s*[:\s]*\s*([A-Z0-9\-]+|NINGUNA)',
+    ],
+    'estado': [
+        r'ESTADO\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
+    ],
+    'anotaciones': [
+        r'ANOTACIONES\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
+    ],
+    'sede': [
+        r'SEDE\s*[:\s]+\s*([A-Z\s]+?)(?=\s*$|\s*[A-Z]+\s*:)',
+    ],
+    'año_modelo': [
+        r'A[ÑN]O\s+DE\s+MODELO\s*[:\s]+\s*(\d{4})',
+        r'A[ÑN]O\s+MODELO\s*[:\s]+\s*(\d{4})',
+    ],
+    'propietarios': [
+        r'PROPIETARIO\s*\(\s*S\s*\)\s*[:\s]+\s*(.+?)(?=\n\n|\Z)',
+        r'PROPIETARIOS\s*[:\s]+\s*(.+?)(?=\n\n|\Z)',
+    ],
+}
+
+# Palabra clave que contiene cada patrón y qué hay antes de ella:
+# - None: el patrón empieza con la palabra clave
+# - 'numero': prefijo N[°º]?\s*
+# - 'anio_de': prefijo A[ÑN]O\s+DE\s+
+# - 'anio': prefijo A[ÑN]O\s+
+_PATTERN_ANCHORS = {
+    'placa': [('PLACA', 'numero'), ('PLACA', None)],
+    'n_serie': [('SERIE', 'numero'), ('SERIE', None)],
+    'n_vin': [('VIN', 'numero'), ('VIN', None)],
+    'n_motor': [('MOTOR', 'numero'), ('MOTOR', None)],
+    'color': [('COLOR', None)],
+    'marca': [('MARCA', None)],
+    'modelo': [('MODELO', None)],
+    'placa_vigente': [('PLACA', None)],
+    'placa_anterior': [('PLACA', None)],
+    'estado': [('ESTADO', None)],
+    'anotaciones': [('ANOTACIONES', None)],
+    'sede': [('SEDE', None)],
+    'año_modelo': [('MODELO', 'anio_de'), ('MODELO', 'anio')],
+    'propietarios': [('PROPIETARIO', None), ('PROPIETARIO', None)],
+}
+
+_COMPILED_PATTERNS = {
+    key: [
+        (re.compile(pattern, re.MULTILINE | re.DOTALL), keyword, prefix)
+        for pattern, (keyword, prefix) in zip(pattern_list, _PATTERN_ANCHORS[key])
+    ]
+    for key, pattern_list in PATTERNS.items()
+}
+
+_KEYWORDS = sorted({keyword for anchors in _PATTERN_ANCHORS.values() for keyword, _ in anchors})
+
+# Alternativa de todas las palabras clave (una sola búsqueda sobre el texto)
+_KEYWORD_REGEX = re.compile('|'.join(_KEYWORDS))
+
+_SPLIT = re.compile(r'[:\s]+')
+_WHITESPACE = re.compile(r'\s+')
+_YEAR = re.compile(r'\d{4}')
+
+FIELDS = [
+    'placa', 'n_serie', 'n_vin', 'n_motor', 'color', 'marca', 'modelo',
+    'placa_vigente', 'placa_anterior', 'estado', 'anotaciones', 'sede',
+    'año_modelo', 'propietarios'
+]
+
+def _skip_whitespace_back(text, pos):
+    """Retorna la posición donde empieza el bloque de espacios que termina en pos"""
+    while pos > 0 and text[pos - 1].isspace():
+        pos -= 1
+    return pos
+
+def _prefix_start(text, pos, prefix):
+    """
+    Calcula dónde tendría que empezar un patrón cuya palabra clave está en pos
+
+    El prefijo ocupa siempre todo el bloque de espacios anterior a la palabra
+    clave, así que hay como máximo un inicio posible.
+
+    Args:
+        text: Texto en mayúsculas
+        pos: Posición de la palabra clave
+        prefix: Tipo de prefijo (ver _PATTERN_ANCHORS)
+
+    Returns:
+        Posición de inicio, o None si el prefijo no puede coincidir
+    """
+    if prefix is None:
+        return pos
+
+    if prefix == 'numero':
+        # N[°º]?\s*
+        j = _skip_whitespace_back(text, pos)
+        if j > 0 and text[j - 1] in '°º':
+            j -= 1
+        if j > 0 and text[j - 1] == 'N':
+            return j - 1
+        return None
+
+    # A[ÑN]O\s+(DE\s+)?
+    j = _skip_whitespace_back(text, pos)
+    if j == pos:
+        return None
+    if prefix == 'anio_de':
+        if j < 2 or text[j - 2:j] != 'DE':
+            return None
+        k = _skip_whitespace_back(text, j - 2)
+        if k == j - 2:
+            return None
+        j = k
+    if j >= 3 and text[j - 1] == 'O' and text[j - 2] in 'ÑN' and text[j - 3] == 'A':
+        return j - 3
+    return None
+
+def parse_vehicle_data(text, plate_number):
+    """
+    Parsea el texto extraído y estructura la información del vehículo
+
+    Args:
+        text: Texto extraído por OCR
+        plate_number: Número de placa para referencia
+
+    Returns:
+        Diccionario con información estructurada
+    """
+    data = {field: '' for field in FIELDS}
+    data['placa'] = plate_number
+    data['raw_text'] = text
+
+    # Normalizar texto para búsqueda
+    text_upper = text.upper()
+
+    # Una sola pasada: posiciones de cada palabra clave
+    positions = {keyword: [] for keyword in _KEYWORDS}
+    for match in _KEYWORD_REGEX.finditer(text_upper):
+        start, end = match.span()
+        positions[match.group()].append(start)
+        # Palabras clave solapadas con esta (por ejemplo "SERIESTADO" contiene
+        # SERIE y ESTADO); finditer no las reporta porque continúa desde end
+        for pos in range(start + 1, end):
+            inner = _KEYWORD_REGEX.match(text_upper, pos)
+            if inner:
+                positions[inner.group()].append(pos)
+
+    for keyword_positions in positions.values():
+        keyword_positions.sort()
+
+    # Buscar patrones solo donde aparece su palabra clave (primer patrón que coincida)
+    for key, pattern_list in _COMPILED_PATTERNS.items():
+        for regex, keyword, prefix in pattern_list:
+            match = None
+            last_start = -1
+            for pos in positions[keyword]:
+                start = _prefix_start(text_upper, pos, prefix)
+                if start is None or start == last_start:
+                    continue
+                last_start = start
+                match = regex.match(text_upper, start)
+                if match:
+                    break
+            if match:
+                value = match.group(1).strip()
+                # Limpiar espacios múltiples
+                data[key] = _WHITESPACE.sub(' ', value)
+                break
+
+    # Método alternativo: buscar línea por línea
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    propietario_text = None  # Bloque de PROPIETARIO(S) en curso
+
+    for line in lines:
+        line_upper = line.upper()
+
+        # N° PLACA:
+        if not data['placa'] and 'PLACA' in line_upper and 'VIGENTE' not in line_upper and 'ANTERIOR' not in line_upper:
+            parts = _SPLIT.split(line_upper, maxsplit=1)
+            if len(parts) > 1:
+                data['placa'] = parts[-1].strip()
+
+        # N° SERIE:
+        if not data['n_serie'] and line_upper.startswith('N') and 'SERIE' in line_upper:
+            parts = _SPLIT.split(line_upper, maxsplit=2)
+            if len(parts) > 1:
+                data['n_serie'] = parts[-1].strip()
+
+        # N° VIN:
+        if not data['n_vin'] and 'VIN' in line_upper:
+            parts = _SPLIT.split(line_upper, maxsplit=2)
+            if len(parts) > 1:
+                data['n_vin'] = parts[-1].strip()
+
+        # N° MOTOR:
+        if not data['n_motor'] and 'MOTOR' in line_upper:
+            parts = _SPLIT.split(line_upper, maxsplit=2)
+            if len(parts) > 1:
+                data['n_motor'] = parts[-1].strip()
+
+        # COLOR:, MARCA:, MODELO:, ESTADO:, ANOTACIONES:, SEDE:
+        for key, label in (('color', 'COLOR'), ('marca', 'MARCA'), ('modelo', 'MODELO'),
+                           ('estado', 'ESTADO'), ('anotaciones', 'ANOTACIONES'), ('sede', 'SEDE')):
+            if not data[key] and line_upper.startswith(label):
+                parts = _SPLIT.split(line_upper, maxsplit=1)
+                if len(parts) > 1:
+                    data[key] = parts[-1].strip()
+
+        # PLACA VIGENTE: / PLACA ANTERIOR:
+        if 'PLACA' in line_upper:
+            for key, label in (('placa_vigente', 'VIGENTE'), ('placa_anterior', 'ANTERIOR')):
+                if not data[key] and label in line_upper:
+                    parts = _SPLIT.split(line_upper, maxsplit=2)
+                    if len(parts) > 1:
+                        data[key] = parts[-1].strip()
+
+        # AÑO DE MODELO:
+        if not data['año_modelo'] and 'AÑO' in line_upper and 'MODELO' in line_upper:
+            parts = _SPLIT.split(line_upper)
+            if len(parts) > 1:
+                # Buscar el año (4 dígitos)
+                for part in parts:
+                    if _YEAR.match(part):
+                        data['año_modelo'] = part.strip()
+                        break
+
+        # PROPIETARIO(S): el bloque sigue en las líneas sin ':' hasta la
+        # siguiente etiqueta. Si un bloque no aporta texto, el siguiente
+        # PROPIETARIO abre otro (igual que el parser original).
+        if not data['propietarios']:
+            if 'PROPIETARIO' in line_upper:
+                if propietario_text is None:
+                    propietario_text = []
+                parts = _SPLIT.split(line, maxsplit=1)
+                if len(parts) > 1:
+                    propietario_text.append(parts[-1])
+            elif propietario_text is not None:
+                if ':' not in line:
+                    propietario_text.append(line)
+                else:
+                    if propietario_text:
+                        data['propietarios'] = ' '.join(propietario_text).strip()
+                    propietario_text = None
+
+    if propietario_text and not data['propietarios']:
+        data['propietarios'] = ' '.join(propietario_text).strip()
+
+    # Si no se encontró la placa en el texto, usar el nombre del archivo
+    if not data['placa'] or data['placa'] == 'N/A':
+        data['placa'] = plate_number
+
+    # Mismo orden de claves que el parser original
+    raw_text = data.pop('raw_text')
+    data['raw_text'] = raw_text
+    return data
+
+def reparse_record(item):
+    """
+    Vuelve a parsear un texto ya extraído (función de los workers de --reparse)
+
+    Args:
+        item: Tupla (source_image, plate_number, raw_text)
+
+    Returns:
+        Tupla (source_image, diccionario con información estructurada)
+    """
+    source_image, plate_number, raw_text = item
+    return source_image, parse_vehicle_data(raw_text, plate_number)
+
+def parse_vehicle_data_legacy(text, plate_number):
+    """
+    Parser original (referencia para verificar la equivalencia)
+
+    Args:
+        text: Texto extraído por OCR
+        plate_number: Número de placa para referencia
+
+    Returns:
+        Diccionario con información estructurada
+    """
+    data = {field: '' for field in FIELDS}
+    data['placa'] = plate_number
+    data['raw_text'] = text
+
+    # Normalizar texto para búsqueda
+    text_upper = text.upper()
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+
+    # Buscar patrones en el texto
+    for key, pattern_list in PATTERNS.items():
+        for pattern in pattern_list:
+            match = re.search(pattern, text_upper, re.MULTILINE | re.DOTALL)
+            if match:
+                value = match.group(1).strip()
+                # Limpiar espacios múltiples
+                value = re.sub(r'\s+', ' ', value)
+                data[key] = value
+                break  # Usar el primer patrón que coincida
+
+    # Método alternativo: buscar línea por línea
+    for i, line in enumerate(lines):
+        line_upper = line.upper()
+
+        # N° PLACA:
+        if 'PLACA' in line_upper and 'VIGENTE' not in line_upper and 'ANTERIOR' not in line_upper:
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['placa']:
+                data['placa'] = parts[-1].strip()
+
+        # N° SERIE:
+        if line_upper.startswith('N') and 'SERIE' in line_upper:
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
+            if len(parts) > 1 and not data['n_serie']:
+                data['n_serie'] = parts[-1].strip()
+
+        # N° VIN:
+        if 'VIN' in line_upper:
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
+            if len(parts) > 1 and not data['n_vin']:
+                data['n_vin'] = parts[-1].strip()
+
+        # N° MOTOR:
+        if 'MOTOR' in line_upper:
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
+            if len(parts) > 1 and not data['n_motor']:
+                data['n_motor'] = parts[-1].strip()
+
+        # COLOR:
+        if line_upper.startswith('COLOR'):
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['color']:
+                data['color'] = parts[-1].strip()
+
+        # MARCA:
+        if line_upper.startswith('MARCA'):
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['marca']:
+                data['marca'] = parts[-1].strip()
+
+        # MODELO:
+        if line_upper.startswith('MODELO'):
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['modelo']:
+                data['modelo'] = parts[-1].strip()
+
+        # PLACA VIGENTE:
+        if 'PLACA' in line_upper and 'VIGENTE' in line_upper:
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
+            if len(parts) > 1 and not data['placa_vigente']:
+                data['placa_vigente'] = parts[-1].strip()
+
+        # PLACA ANTERIOR:
+        if 'PLACA' in line_upper and 'ANTERIOR' in line_upper:
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=2)
+            if len(parts) > 1 and not data['placa_anterior']:
+                data['placa_anterior'] = parts[-1].strip()
+
+        # ESTADO:
+        if line_upper.startswith('ESTADO'):
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['estado']:
+                data['estado'] = parts[-1].strip()
+
+        # ANOTACIONES:
+        if line_upper.startswith('ANOTACIONES'):
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['anotaciones']:
+                data['anotaciones'] = parts[-1].strip()
+
+        # SEDE:
+        if line_upper.startswith('SEDE'):
+            parts = re.split(r'[:\s]+', line_upper, maxsplit=1)
+            if len(parts) > 1 and not data['sede']:
+                data['sede'] = parts[-1].strip()
+
+        # AÑO DE MODELO:
+        if 'AÑO' in line_upper and 'MODELO' in line_upper:
+            parts = re.split(r'[:\s]+', line_upper)
+            if len(parts) > 1 and not data['año_modelo']:
+                # Buscar el año (4 dígitos)
+                for part in parts:
+                    if re.match(r'\d{4}', part):
+                        data['año_modelo'] = part.strip()
+                        break
+
+        # PROPIETARIO(S):
+        if 'PROPIETARIO' in line_upper:
+            # Capturar desde esta línea hasta el final o línea vacía
+            propietario_text = []
+            for j in range(i, len(lines)):
+                if 'PROPIETARIO' in lines[j].upper():
+                    parts = re.split(r'[:\s]+', lines[j], maxsplit=1)
+                    if len(parts) > 1:
+                        propietario_text.append(parts[-1])
+                elif lines[j].strip() and not ':' in lines[j]:
+                    propietario_text.append(lines[j])
+                elif not lines[j].strip() or ':' in lines[j]:
+                    break
+            if propietario_text and not data['propietarios']:
+                data['propietarios'] = ' '.join(propietario_text).strip()
+
+    # Si no se encontró la placa en el texto, usar el nombre del archivo
+    if not data['placa'] or data['placa'] == 'N/A':
+        data['placa'] = plate_number
+
+    return data
+
+# Textos de ejemplo con los casos difíciles del parser (etiquetas pegadas,
+# valores en la línea siguiente, PLACA VIGENTE antes que N° PLACA, bloques
+# de propietarios vacíos, etc.)
+SAMPLE_TEXTS = [
+    "",
+    "N° PLACA: ABC123\nN° SERIE: 9BWZZZ377VT004251\nN° VIN: 9BWZZZ377VT004251\nN° MOTOR: AKL123\n"
+    "COLOR: ROJO\nMARCA: TOYOTA\nMODELO: YARIS\nPLACA VIGENTE: ABC123\nPLACA ANTERIOR: NINGUNA\n"
+    "ESTADO: EN CIRCULACION\nANOTACIONES: NINGUNA\nSEDE: LIMA\nAÑO DE MODELO: 2019\n"
+    "PROPIETARIO(S):\nJUAN PEREZ\nMARIA LOPEZ",
+    "PLACA VIGENTE\nJOL077\nN PLACA\nJOL077\nNSERIE:\nMR0EX\nCOLOR\nBLANCO PERLA\nPROPIETARIO(S)\nEMPRESA SAC",
+    "N°PLACA:A1B-234 MARCA: KIA MODELO:RIO 5 COLOR: GRIS OSCURO ESTADO: ACTIVO",
+    "PROPIETARIO(S):\nPROPIETARIO:\nSEDE: CUSCO\nPROPIETARIOS: ANA\nLUIS",
+    "SERIESTADO: X\nPLACANOTACIONES: Y\nANO MODELO 1999\nAÑO  DE\nMODELO: 2005",
+    "VIGENTE\nMO\nMLVLS\nCOLOR\nI\nI\n'0LW \"\"\"\nV\nIHALIT) CL(:",
+    "n° placa: abc123\nmarca: nissan\nmotor: qg15 123\npropietario(s): maria\n\njose",
+]
+
+# Piezas de los textos aleatorios de fuzz_texts: etiquetas (con las variantes
+# que produce el OCR), valores y separadores
+FUZZ_LABELS = [
+    'N° PLACA', 'Nº PLACA', 'N PLACA', 'NPLACA', 'PLACA', 'N° SERIE', 'NSERIE', 'SERIE', 'N° VIN', 'VIN',
+    'N° MOTOR', 'MOTOR', 'COLOR', 'MARCA', 'MODELO', 'PLACA VIGENTE', 'PLACA ANTERIOR', 'ESTADO',
+    'ANOTACIONES', 'SEDE', 'AÑO DE MODELO', 'ANO DE MODELO', 'AÑO MODELO', 'AÑO  DE', 'PROPIETARIO(S)',
+    'PROPIETARIO ( S )', 'PROPIETARIOS', 'PROPIETARIO', 'VIGENTE', 'ANTERIOR',
+]
+FUZZ_VALUES = [
+    'ABC123', 'A1B-234', 'JOL077', '9BWZZZ377VT004251', 'MR0EX', 'QG15 123', 'ROJO', 'BLANCO PERLA',
+    'TOYOTA', 'MERCEDES BENZ', 'RIO 5', 'YARIS', 'NINGUNA', 'EN CIRCULACION', 'LIMA', 'CUSCO', '2019',
+    '1999', '20055', 'JUAN PEREZ', 'EMPRESA SAC', 'CAÑETE', '', 'I', '0LW', 'IHALIT) CL(',
+]
+FUZZ_SEPARATORS = [': ', ':', ' ', '\n', ':\n', ' : ', '  ', '\n\n', ';', '']
+FUZZ_NOISE = 'AEIOUNSRLCDMPTV0123456789ÑÁ:()°º -\n\'"'
+
+def fuzz_texts(count, seed=0):
+    """
+    Genera textos aleatorios con la forma de los textos de OCR de SUNARP
+
+    Cada texto combina etiquetas, valores y separadores al azar (mayúsculas o
+    minúsculas, etiquetas pegadas, líneas vacías) o es un texto de ejemplo con
+    caracteres insertados, borrados o reemplazados.
+
+    Args:
+        count: Número de textos
+        seed: Semilla (la misma semilla genera los mismos textos)
+
+    Yields:
+        Textos de prueba
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        if rng.random() < 0.25:
+            text = list(rng.choice(SAMPLE_TEXTS))
+            for _ in range(rng.randint(1, 8)):
+                pos = rng.randint(0, len(text))
+                operation = rng.random()
+                if operation < 0.4:
+                    text.insert(pos, rng.choice(FUZZ_NOISE))
+                elif text and pos < len(text):
+                    if operation < 0.7:
+                        del text[pos]
+                    else:
+                        text[pos] = rng.choice(FUZZ_NOISE)
+            text = ''.join(text)
+        else:
+            parts = []
+            for _ in range(rng.randint(0, 20)):
+                if rng.random() < 0.8:
+                    parts.append(rng.choice(FUZZ_LABELS))
+                    parts.append(rng.choice(FUZZ_SEPARATORS))
+                parts.append(rng.choice(FUZZ_VALUES))
+                parts.append(rng.choice(['\n', '\n', ' ', '\n\n', '']))
+            text = ''.join(parts)
+        if rng.random() < 0.1:
+            text = text.lower()
+        yield text
+
+def benchmark(texts, repeat=3):
+    """
+    Mide el tiempo de ambos parsers sobre los mismos textos (mejor de repeat)
+
+    Returns:
+        Tupla (segundos del parser, segundos del parser original)
+    """
+    timings = []
+    for parse in (parse_vehicle_data, parse_vehicle_data_legacy):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                parse(text, 'TEST')
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+    return tuple(timings)
+
+def check_equivalence(texts, plate_number='TEST'):
+    """
+    Compara el parser con el parser original sobre una colección de textos
+
+    Args:
+        texts: Iterable de textos de OCR
+        plate_number: Placa de referencia usada en ambos parsers
+
+    Returns:
+        Tupla (total, lista de (texto, resultado_nuevo, resultado_original) que difieren)
+    """
+    total = 0
+    mismatches = []
+    for text in texts:
+        total += 1
+        new = parse_vehicle_data(text, plate_number)
+        old = parse_vehicle_data_legacy(text, plate_number)
+        if new != old or list(new) != list(old):
+            mismatches.append((text, new, old))
+    return total, mismatches
+
+def iter_raw_texts(path):
+    """
+    Lee los raw_text guardados en un JSON (arreglo) o JSON Lines
+
+    Args:
+        path: Ruta al archivo
+
+    Yields:
+        Texto de cada registro
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line).get('raw_text', '')
+        else:
+            for record in json.load(f):
+                yield record.get('raw_text', '')
+
+def main():
+    """Verifica la equivalencia con el parser original"""
+    parser = argparse.ArgumentParser(description="Verifica que el parser precompilado equivale al original")
+    parser.add_argument('--check', nargs='*', metavar='ARCHIVO', default=[],
+                        help="JSON/JSONL con raw_text a comparar (además de los textos de ejemplo)")
+    parser.add_argument('--fuzz', type=int, default=10_000, metavar='N',
+                        help="Textos aleatorios a comparar (0 = ninguno)")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla de los textos aleatorios")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Medir también el tiempo de ambos parsers sobre los textos")
+    args = parser.parse_args()
+
+    texts = list(SAMPLE_TEXTS)
+    for path in args.check:
+        texts.extend(iter_raw_texts(path))
+    real = len(texts)
+    texts.extend(fuzz_texts(args.fuzz, args.seed))
+    print(f"Comparando {real} textos guardados y de ejemplo y {len(texts) - real} aleatorios (semilla {args.seed})")
+
+    total, mismatches = check_equivalence(texts)
+    for text, new, old in mismatches[:10]:
+        print("❌ Diferencia en el texto:")
+        print(f"   {text[:200]!r}")
+        for key in old:
+            if new.get(key) != old[key]:
+                print(f"   {key}: nuevo={new.get(key)!r} original={old[key]!r}")
+
+    print(f"\n{'✓' if not mismatches else '❌'} {total - len(mismatches)}/{total} textos con resultado idéntico")
+    if args.benchmark:
+        for label, sample in (('guardados y de ejemplo', texts[:real]), ('aleatorios', texts[real:])):
+            if sample:
+                new, old = benchmark(sample)
+                print(f"⏱️  {label}: {new:.3f} s con el parser, {old:.3f} s con el original ({old / new:.2f}x)")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Escritura en streaming de los datos vehiculares extraídos en el paso 3.
+
+Cada registro de parse_vehicle_data se escribe en todas las salidas en cuanto
+se produce, con memoria constante:
+- CSV completo (con raw_text)
+- CSV simplificado (sin raw_text)
+- JSON de respaldo (arreglo, escrito elemento por elemento)
+- JSON Lines (un registro por línea, con la imagen de origen)
+- Parquet opcional (requiere pyarrow), escrito por grupos de filas
+"""
+import os
+import csv
+import json
+
+# Columnas de salida (orden para mejor visualización)
+OUTPUT_COLUMNS = [
+    'placa', 'n_serie', 'n_vin', 'n_motor', 'color', 'marca', 'modelo',
+    'placa_vigente', 'placa_anterior', 'estado', 'anotaciones', 'sede',
+    'año_modelo', 'propietarios', 'raw_text'
+]
+
+SIMPLE_COLUMNS = [col for col in OUTPUT_COLUMNS if col != 'raw_text']
+
+# Filas por grupo en el archivo Parquet
+PARQUET_ROW_GROUP_SIZE = 10000
+
+def output_paths(output_file):
+    """
+    Retorna las rutas de todas las salidas derivadas del CSV principal
+
+    Args:
+        output_file: Archivo CSV principal
+
+    Returns:
+        Diccionario {tipo_salida: ruta}
+    """
+    base = output_file[:-4] if output_file.endswith('.csv') else output_file
+    return {
+        'csv': output_file,
+        'simple_csv': base + '_simple.csv',
+        'json': base + '.json',
+        'jsonl': base + '.jsonl',
+        'parquet': base + '.parquet',
+        'manifest': base + '_manifest.jsonl',
+    }
+
+class VehicleDataWriter:
+    """
+    Escribe registros vehiculares en varias salidas a la vez, sin acumularlos
+
+    Los archivos se abren en la primera escritura, así que una ejecución sin
+    resultados no crea salidas vacías.
+
+    Args:
+        output_file: Archivo CSV principal (las demás rutas se derivan de él)
+        append: Si debe agregar a las salidas existentes en lugar de reescribirlas
+            (el arreglo JSON y el Parquet no admiten agregado y se omiten)
+        csv_output: Si debe escribir el CSV completo y el CSV simplificado
+        json_output: Si debe escribir el arreglo JSON de respaldo
+        jsonl_output: Si debe escribir el JSON Lines
+        parquet_output: Si debe escribir el archivo Parquet (requiere pyarrow)
+    """
+
+    def __init__(self, output_file, append=False, csv_output=True, json_output=True,
+                 jsonl_output=True, parquet_output=False):
+        self.paths = output_paths(output_file)
+        self.append = append
+        self.csv_output = csv_output
+        self.json_output = json_output and not append
+        self.jsonl_output = jsonl_output
+        self.parquet_output = parquet_output and not append
+        self.count = 0
+
+        self._opened = False
+        self._files = []
+        self._csv_writer = None
+        self._simple_writer = None
+        self._json_file = None
+        self._jsonl_file = None
+        self._parquet_writer = None
+        self._parquet_rows = []
+
+        if self.parquet_output:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print("⚠️  pyarrow no está instalado, se omite la salida Parquet")
+                print("   Para instalar: pip install pyarrow")
+                self.parquet_output = False
+
+    def _open_csv(self, path, columns):
+        """Abre un CSV y retorna su DictWriter, con encabezado si el archivo es nuevo"""
+        mode = 'a' if self.append else 'w'
+        is_new = not self.append or not os.path.exists(path) or os.path.getsize(path) == 0
+        f = open(path, mode, newline='', encoding='utf-8-sig')
+        self._files.append(f)
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore', lineterminator='\n')
+        if is_new:
+            writer.writeheader()
+        return writer
+
+    def _open(self):
+        """Abre las salidas activas"""
+        self._opened = True
+
+        if self.csv_output:
+            self._csv_writer = self._open_csv(self.paths['csv'], OUTPUT_COLUMNS)
+            self._simple_writer = self._open_csv(self.paths['simple_csv'], SIMPLE_COLUMNS)
+
+        if self.json_output:
+            self._json_file = open(self.paths['json'], 'w', encoding='utf-8')
+            self._files.append(self._json_file)
+            self._json_file.write('[')
+
+        if self.jsonl_output:
+            self._jsonl_file = open(self.paths['jsonl'], 'a' if self.append else 'w', encoding='utf-8')
+            self._files.append(self._jsonl_file)
+
+    def write(self, record, source_image=None):
+        """
+        Escribe un registro en todas las salidas activas
+
+        Args:
+            record: Diccionario retornado por parse_vehicle_data
+            source_image: Nombre de la imagen de origen (solo se guarda en el JSON Lines)
+        """
+        if not self._opened:
+            self._open()
+
+        row = {col: record.get(col, '') for col in OUTPUT_COLUMNS}
+
+        if self._csv_writer:
+            self._csv_writer.writerow(row)
+            self._simple_writer.writerow(row)
+
+        if self._json_file:
+            # Mismo formato que json.dump(lista, indent=2)
+            item = json.dumps(record, ensure_ascii=False, indent=2)
+            item = '\n'.join('  ' + line for line in item.split('\n'))
+            self._json_file.write((',\n' if self.count else '\n') + item)
+
+        if self._jsonl_file:
+            line_record = dict(record, source_image=source_image) if source_image else record
+            self._jsonl_file.write(json.dumps(line_record, ensure_ascii=False) + '\n')
+
+        if self.parquet_output:
+            self._parquet_rows.append(row)
+            if len(self._parquet_rows) >= PARQUET_ROW_GROUP_SIZE:
+                self._flush_parquet()
+
+        self.count += 1
+
+    def flush(self):
+        """Fuerza la escritura a disco de las salidas de texto"""
+        for f in self._files:
+            f.flush()
+
+    def _flush_parquet(self):
+        """Escribe las filas acumuladas como un grupo de filas Parquet"""
+        if not self._parquet_rows:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(col, pa.string()) for col in OUTPUT_COLUMNS])
+        table = pa.Table.from_pylist(self._parquet_rows, schema=schema)
+
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.paths['parquet'], schema)
+        self._parquet_writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        self._parquet_rows = []
+
+    def close(self):
+        """Cierra todas las salidas"""
+        if self._json_file:
+            self._json_file.write('\n]' if self.count else ']')
+
+        if self.parquet_output:
+            self._flush_parquet()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
+
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def iter_jsonl(jsonl_file):
+    """
+    Lee un archivo JSON Lines registro por registro
+
+    Las líneas truncadas (por ejemplo, por una caída a mitad de escritura) se omiten.
+
+    Args:
+        jsonl_file: Ruta al archivo JSON Lines
+
+    Yields:
+        Diccionarios con cada registro
+    """
+    with open(jsonl_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def consolidate_outputs(output_file, parquet_output=False):
+    """
+    Reconstruye el JSON de respaldo (y el Parquet) a partir del JSON Lines incremental
+
+    Si una imagen se procesó más de una vez (imagen nueva o caída entre la
+    escritura de la fila y el manifiesto), se conserva el último registro y
+    los CSV y el JSON Lines también se reescriben sin duplicados. Se trabaja
+    en streaming: solo se mantiene en memoria el índice de la última línea por imagen.
+
+    Args:
+        output_file: Archivo CSV principal
+        parquet_output: Si debe escribir también el archivo Parquet
+
+    Returns:
+        Número de registros únicos
+    """
+    jsonl_file = output_paths(output_file)['jsonl']
+    if not os.path.exists(jsonl_file):
+        return 0
+
+    # Primera pasada: índice de la última aparición de cada imagen
+    last_index = {}
+    total = 0
+    for idx, record in enumerate(iter_jsonl(jsonl_file)):
+        last_index[record.get('source_image') or record['placa']] = idx
+        total = idx + 1
+
+    has_duplicates = len(last_index) < total
+    compacted_file = jsonl_file + '.tmp'
+
+    # Segunda pasada: escribir el JSON (y los CSV/JSON Lines si había duplicados)
+    writer = VehicleDataWriter(output_file, csv_output=has_duplicates, jsonl_output=False,
+                               parquet_output=parquet_output)
+    compacted = open(compacted_file, 'w', encoding='utf-8') if has_duplicates else None
+
+    with writer:
+        for idx, record in enumerate(iter_jsonl(jsonl_file)):
+            source_image = record.pop('source_image', None)
+            if last_index.get(source_image or record['placa']) != idx:
+                continue
+            writer.write(record)
+            if compacted:
+                compacted.write(json.dumps(dict(record, source_image=source_image), ensure_ascii=False) + '\n')
+
+    if compacted:
+        compacted.close()
+        os.replace(compacted_file, jsonl_file)
+
+    return len(last_index)